@@ -0,0 +1,61 @@
+""" peak per rank memory of the 512x2048x1024 summa example, with the receive buffers allocated in the loops
+  (before) and acquired once from the buffer pool (after, `hoist=True`).
+  mpirun -n 4 python benchmarks/distal_buffer_pool.py [calls]
+"""
+import sys
+import os
+import tracemalloc
+import numpy as np
+from mpi4py import MPI
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.distal import *
+
+M, K, N = 512, 2048, 1024
+P = 2
+
+
+@ctx.parse_program
+def matmul(A: Buffer[float, [512, 2048]], B: Buffer[float, [2048, 1024]], C: Buffer[float, [512, 1024]], m: IterVar, n: IterVar, k: IterVar) -> Buffer[float, [512, 1024]]:
+  C[m, n] = A[m, k] * B[k, n]
+  return C
+
+
+def summa() -> Computation:
+  s0 = polyhedron_extract(matmul)
+  k, m, n = s0.iter_vars
+  x, y = IterVar.range('x', P), IterVar.range('y', P)
+  mo, no, mi, ni = IterVar.symbol('mo no mi ni')
+  ko, ki = IterVar.symbol('ko ki')
+  s = s0.distribute([m, n], [mo, no], [mi, ni], Mesh((x, y))).divide(k, ko, ki, x.extent).reorder(mo, no, ko, mi, ni, ki)
+  s = s.shard('A', m @ x, k @ y).shard('B', k @ x, n @ y).shard('C', m @ x, n @ y)
+  s = s.communicate('A', ko).communicate('B', ko)
+  return s.tensorize([mi, ni, ki], OpKind.MatMul)
+
+
+def peak_memory(program: str, calls: int) -> tuple[int, int]:
+  """ returns the peak bytes allocated while `computation` runs `calls` times, and the bytes held by the pool. """
+  env = {'__name__': 'distal_program'}
+  exec(program, env)
+  a, b, c = np.random.rand(M // P, K // P), np.random.rand(K // P, N // P), np.zeros((M // P, N // P))
+  tracemalloc.start()
+  for _ in range(calls):
+    env['computation'](c, a, b)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return peak, env['POOL'].nbytes
+
+
+if __name__ == "__main__":
+  calls = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+  assert MPI.COMM_WORLD.Get_size() == P * P, f"run with mpirun -n {P * P}"
+  comp = summa()
+  results = {}
+  for overlap in (False, True):
+    for hoist in (False, True):
+      peak, pool = peak_memory(lower_and_codegen_str(comp, overlap, hoist=hoist), calls)
+      results[(overlap, hoist)] = (MPI.COMM_WORLD.allreduce(peak, op=MPI.MAX), pool)
+  if MPI.COMM_WORLD.Get_rank() == 0:
+    print(f"{'overlap':<8} {'hoist':<6} {'peak(MiB)':>10} {'pool(MiB)':>10}")
+    for (overlap, hoist), (peak, pool) in results.items():
+      print(f"{str(overlap):<8} {str(hoist):<6} {peak / 2**20:>10.2f} {pool / 2**20:>10.2f}")
@@ -0,0 +1,90 @@
+""" time the communication runtime emitted by `codegen_setup`, before and after caching the communicators.
+  mpirun -n 4 python benchmarks/distal_comm_runtime.py [iterations] [elements]
+"""
+import sys
+import os
+import time
+import numpy as np
+from mpi4py import MPI
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.distal import COMM_RUNTIME
+
+UNCACHED_RUNTIME = """
+class CommBroadcast:
+  def __init__(self, *axes: int):
+    self.axes: tuple[int] = axes
+
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    comm = COMM_ALL.Sub([True if i in self.axes else False for i in range(len(PIDS))])
+    src_rank = comm.Get_cart_rank(source)
+    if comm.Get_rank() == src_rank:
+      np.copyto(recvbuf, srcbuf)
+    comm.Bcast(recvbuf, root=src_rank)
+
+class CommShift:
+  def __init__(self, axes: tuple[int], delta: int):
+    self.axes: tuple[int] = axes
+    self.delta: int = delta
+
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    diffs = [p[0] - p[1] for p in zip(source, dest)]
+    if not all([diffs[axis] == 0 for axis in self.axes]):
+      src_rank = COMM_ALL.Get_cart_rank(
+          [(cord + self.delta) % MESH[i] if i in self.axes else cord for i, cord in enumerate(dest)])
+      dest_rank = COMM_ALL.Get_cart_rank(
+          [(cord - self.delta) % MESH[i] if i in self.axes else cord for i, cord in enumerate(dest)])
+      COMM_ALL.Sendrecv_replace(srcbuf, dest=dest_rank, source=src_rank)
+    np.copyto(recvbuf, srcbuf)
+
+
+class CommSendrecv:
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    COMM_ALL.Sendrecv(srcbuf, COMM_ALL.Get_cart_rank(dest), 0,
+                      recvbuf, COMM_ALL.Get_cart_rank(source))
+
+def Trans(comm, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+  comm(srcbuf, source, recvbuf, dest)
+"""
+
+
+def load_runtime(code: str, mesh: list[int]) -> dict:
+  comm_all = MPI.COMM_WORLD.Create_cart(mesh)
+  env = {'np': np, 'MESH': mesh, 'COMM_ALL': comm_all,
+         'PIDS': comm_all.Get_coords(MPI.COMM_WORLD.Get_rank())}
+  exec(code, env)
+  return env
+
+
+def bench(env: dict, iterations: int, elements: int) -> dict[str, float]:
+  x, y = env['PIDS']
+  srcbuf = np.random.rand(elements)
+  recvbuf = np.zeros(elements)
+  cases = {
+      # the same calls the generated summa/cannon programs make in their `ko` loop.
+      'broadcast': lambda k: env['Trans'](env['CommBroadcast'](1), srcbuf, [k % 2], recvbuf, [y]),
+      'shift': lambda k: env['Trans'](env['CommShift']((0,), 1), srcbuf, [(x + k) % 2, y], recvbuf, [x, y]),
+      'sendrecv': lambda k: env['Trans'](env['CommSendrecv'](), srcbuf, [x, 1 - y], recvbuf, [x, 1 - y]),
+  }
+  times = {}
+  for name, case in cases.items():
+    MPI.COMM_WORLD.Barrier()
+    start = time.perf_counter()
+    for k in range(iterations):
+      case(k)
+    times[name] = MPI.COMM_WORLD.allreduce(time.perf_counter() - start, op=MPI.MAX)
+  return times
+
+
+if __name__ == "__main__":
+  iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  elements = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+  assert MPI.COMM_WORLD.Get_size() == 4, "run with mpirun -n 4"
+  mesh = [2, 2]
+  before = bench(load_runtime(UNCACHED_RUNTIME, mesh), iterations, elements)
+  after = bench(load_runtime(COMM_RUNTIME, mesh), iterations, elements)
+  if MPI.COMM_WORLD.Get_rank() == 0:
+    print(f"{'pattern':<10} {'before(us)':>12} {'after(us)':>12} {'speedup':>8}")
+    for name in before:
+      b, a = before[name] / iterations * 1e6, after[name] / iterations * 1e6
+      print(f"{name:<10} {b:>12.2f} {a:>12.2f} {b / a:>8.2f}")
@@ -0,0 +1,55 @@
+""" time `polyhedron_extract` of the matmul kernel cold (xdsl build and extraction), warm from the in memory
+  cache and warm from the disk cache.
+  python benchmarks/distal_extract_cache.py [iterations]
+"""
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import utils.distal as distal
+from utils.distal import *
+
+
+@ctx.parse_program
+def matmul(A: Buffer[float, [512, 2048]], B: Buffer[float, [2048, 1024]], C: Buffer[float, [512, 1024]], m: IterVar, n: IterVar, k: IterVar) -> Buffer[float, [512, 1024]]:
+  C[m, n] = A[m, k] * B[k, n]
+  return C
+
+
+def bench(extract, iterations: int) -> float:
+  start = time.perf_counter()
+  for _ in range(iterations):
+    extract()
+  return (time.perf_counter() - start) / iterations
+
+
+def reparse():
+  # a new program wrapper, so xdsl builds the module again.
+  return ctx.parse_program(matmul.func)
+
+
+def cold():
+  polyhedron_extract(reparse(), cache=False)
+
+
+def warm_memory():
+  polyhedron_extract(matmul)
+
+
+def warm_disk():
+  distal.EXTRACT_CACHE.clear()
+  polyhedron_extract(reparse())
+
+
+if __name__ == "__main__":
+  iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  with tempfile.TemporaryDirectory() as cache_dir:
+    distal.EXTRACT_CACHE_DIR = cache_dir
+    polyhedron_extract(matmul)
+    times = {'cold': bench(cold, iterations), 'warm (disk)': bench(warm_disk, iterations),
+             'warm (memory)': bench(warm_memory, iterations)}
+  print(f"{'extraction':<14} {'time(ms)':>10} {'speedup':>8}")
+  for name, t in times.items():
+    print(f"{name:<14} {t * 1e3:>10.3f} {times['cold'] / t:>8.1f}")
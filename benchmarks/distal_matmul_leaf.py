@@ -0,0 +1,55 @@
+""" per rank GFLOP/s of the tensorized matmul leaf of the 512x2048x1024 summa example, before and after `Gemm`.
+  python benchmarks/distal_matmul_leaf.py [iterations]
+"""
+import sys
+import os
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.distal import POOL_RUNTIME, KERNEL_RUNTIME
+
+M, K, N = 512, 2048, 1024
+
+
+def load_runtime(blas: bool) -> dict:
+  env = {'np': np, 'USE_BLAS': blas}
+  if blas:
+    from scipy.linalg.blas import get_blas_funcs
+    env['get_blas_funcs'] = get_blas_funcs
+  exec(POOL_RUNTIME, env)
+  exec(KERNEL_RUNTIME, env)
+  return env
+
+
+def bench(leaf, c: np.ndarray, a: np.ndarray, b: np.ndarray, iterations: int) -> float:
+  leaf(c, a, b)
+  start = time.perf_counter()
+  for _ in range(iterations):
+    leaf(c, a, b)
+  seconds = (time.perf_counter() - start) / iterations
+  return 2 * c.shape[0] * c.shape[1] * a.shape[1] / seconds / 1e9
+
+
+def before(c: np.ndarray, a: np.ndarray, b: np.ndarray):
+  # the leaf the generator used to print: `C[...] += TransA[...] @ TransB[...]`.
+  c += a @ b
+
+
+if __name__ == "__main__":
+  iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  leaves = {'before': before}
+  numpy_gemm = load_runtime(False)['Gemm']
+  leaves['numpy'] = lambda c, a, b: numpy_gemm(c, a, b, True)
+  try:
+    blas_gemm = load_runtime(True)['Gemm']
+    leaves['blas'] = lambda c, a, b: blas_gemm(c, a, b, True)
+  except ImportError:
+    pass
+  print(f"{'mesh':<6} {'leaf (m,k,n)':<18}" + ''.join(f" {name + '(GF/s)':>14}" for name in leaves))
+  for p in (2, 4, 8):
+    # summa on a p x p mesh: each rank owns a (M/p, N/p) block of C and multiplies (M/p, K/p) by (K/p, N/p) per step.
+    m, k, n = M // p, K // p, N // p
+    a, b, c = np.random.rand(m, k), np.random.rand(k, n), np.zeros((m, n))
+    results = [bench(leaf, c, a, b, iterations) for leaf in leaves.values()]
+    print(f"{f'{p}x{p}':<6} {str((m, k, n)):<18}" + ''.join(f" {r:>14.2f}" for r in results))
@@ -0,0 +1,73 @@
+""" scheduling time and outermost band of `pluto_schedule` against `isl.schedule_constraints.compute_schedule` on the
+  kernels of the pluto lesson, with the dependences as validity, coincidence and proximity constraints.
+  python benchmarks/pluto_scheduler.py [iterations]
+"""
+import sys
+import os
+import time
+import isl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.pluto import pluto_schedule
+
+
+def dependences(domain: str, reads: str, writes: str, schedule: str) -> tuple[isl.union_set, isl.union_map]:
+  domain = isl.union_set(domain)
+  reads, writes = isl.union_map(reads).intersect_domain(domain), isl.union_map(writes).intersect_domain(domain)
+  schedule = isl.union_map(schedule).intersect_domain(domain)
+
+  def flow(sink: isl.union_map, source: isl.union_map) -> isl.union_map:
+    info = isl.union_access_info(sink).set_must_source(source).set_schedule_map(schedule)
+    return info.compute_flow().get_must_dependence()
+  return domain, flow(reads, writes).union(flow(writes, reads)).union(flow(writes, writes))
+
+
+KERNELS = {
+    'jacobi-1d': dependences("[T, N] -> { s1[t, i] : 0 <= t < T and 2 <= i < N - 1 }",
+                             "{ s1[t, i] -> a[t - 1, i]; s1[t, i] -> a[t - 1, i - 1]; s1[t, i] -> a[t - 1, i + 1] }",
+                             "{ s1[t, i] -> a[t, i] }", "{ s1[t, i] -> [t, i] }"),
+    'seidel-2d': dependences("[N] -> { S1[i, j] : 0 <= i < N and 1 <= j < N }",
+                             "{ S1[i, j] -> a[i - 1, j]; S1[i, j] -> a[i, j - 1] }",
+                             "{ S1[i, j] -> a[i, j] }", "{ S1[i, j] -> [i, j] }"),
+    'transpose': dependences("[N] -> { S1[i, j] : 0 <= i <= N and 1 <= j <= N }",
+                             "{ S1[i, j] -> a[j, i]; S1[i, j] -> a[i, j - 1] }",
+                             "{ S1[i, j] -> a[i, j] }", "{ S1[i, j] -> [i, j] }"),
+    'fusion': dependences("[N] -> { S1[i, j] : 0 <= i, j < N; S2[k, l] : 0 <= k, l < N }",
+                          "{ S2[k, l] -> A[l, k] }", "{ S1[i, j] -> A[i, j] }",
+                          "{ S1[i, j] -> [0, i, j]; S2[k, l] -> [1, k, l] }"),
+    'matmul': dependences("[N] -> { I[i, j] : 0 <= i, j < N; M[i, j, k] : 0 <= i, j, k < N }",
+                          "{ M[i, j, k] -> C[i, j]; M[i, j, k] -> A[i, k]; M[i, j, k] -> B[k, j] }",
+                          "{ I[i, j] -> C[i, j]; M[i, j, k] -> C[i, j] }",
+                          "{ I[i, j] -> [0, i, j, 0]; M[i, j, k] -> [1, i, j, k] }"),
+}
+
+
+def isl_schedule(domain: isl.union_set, deps: isl.union_map) -> isl.schedule:
+  constraints = isl.schedule_constraints.on_domain(domain)
+  constraints = constraints.set_validity(deps).set_coincidence(deps).set_proximity(deps)
+  return constraints.compute_schedule()
+
+
+def outer_band(schedule: isl.schedule) -> str:
+  """ the members, permutability and coincidence of the outermost band. """
+  node = schedule.get_root().child(0)
+  if not isinstance(node, isl.schedule_node_band):
+    return type(node).__name__[len('schedule_node_'):]
+  coincident = ''.join('c' if node.member_get_coincident(i) else '-' for i in range(node.n_member()))
+  return f"{node.get_partial_schedule()} permutable={int(node.get_permutable())} coincident={coincident}"
+
+
+def bench(scheduler, domain: isl.union_set, deps: isl.union_map, iterations: int) -> tuple[float, isl.schedule]:
+  start = time.perf_counter()
+  for _ in range(iterations):
+    schedule = scheduler(domain, deps)
+  return (time.perf_counter() - start) / iterations, schedule
+
+
+if __name__ == "__main__":
+  iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+  print(f"{'kernel':<10} {'scheduler':<8} {'time(ms)':>9}  outer band")
+  for name, (domain, deps) in KERNELS.items():
+    for label, scheduler in (('pluto', pluto_schedule), ('isl', isl_schedule)):
+      seconds, schedule = bench(scheduler, domain, deps, iterations)
+      print(f"{name:<10} {label:<8} {seconds * 1e3:>9.2f}  {outer_band(schedule)}")
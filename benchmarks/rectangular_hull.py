@@ -0,0 +1,54 @@
+""" time to get the background points of `plot_domain`, the box around a domain widened by one point, with the map
+  based `_get_parametric_rectangular_hull` and points enumerated by isl (before) against the integer bounds read by
+  `get_bounding_box` with the box built by `box_to_set` or enumerated by numpy (after).
+  python benchmarks/rectangular_hull.py [iterations]
+"""
+import sys
+import os
+import time
+import isl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from plot.support import bset_get_points, get_bounding_box, box_to_set, box_get_points
+from plot.support import _get_parametric_rectangular_hull
+
+DOMAINS = {
+    'triangle-16': "{ S[i, j] : 0 <= i < 16 and 0 <= j <= i }",
+    'skewed-64': "{ S[t, i] : 0 <= t < 64 and t <= i < t + 64 }",
+    'strided-128': "{ S[i, j] : 0 <= i < 128 and 0 <= j < 128 and (i + j) mod 2 = 0 }",
+    'cube-3d-12': "{ S[i, j, k] : 0 <= i, j, k < 12 and i + j + k < 24 }",
+}
+
+
+def bench(fn, iterations: int) -> float:
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start) / iterations
+
+
+def before_set(domain: isl.set) -> isl.set:
+  return _get_parametric_rectangular_hull(domain, 1)
+
+
+def after_set(domain: isl.set) -> isl.set:
+  return box_to_set(domain.get_space(), get_bounding_box(domain, 1))
+
+
+if __name__ == "__main__":
+  iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  print(f"{'domain':<12} {'hull before':>12} {'hull after':>11} {'points before':>14} {'points after':>13}  (ms)")
+  for name, text in DOMAINS.items():
+    domain = isl.set(text)
+    # the old hull only bounds the first two dimensions, it cannot be enumerated for more.
+    two_dims = domain.get_space().dim(isl.dim_type.SET) == 2
+    assert after_set(domain).is_subset(before_set(domain))
+    if two_dims:
+      assert before_set(domain).is_equal(after_set(domain))
+      assert bset_get_points(before_set(domain)) == box_get_points(get_bounding_box(domain, 1)).tolist()
+    hull_before = bench(lambda: before_set(domain), iterations)
+    hull_after = bench(lambda: after_set(domain), iterations)
+    points_before = bench(lambda: bset_get_points(before_set(domain)), max(1, iterations // 10)) if two_dims else None
+    points_after = bench(lambda: box_get_points(get_bounding_box(domain, 1)), iterations)
+    points_before = f"{points_before * 1e3:>14.2f}" if points_before is not None else f"{'-':>14}"
+    print(f"{name:<12} {hull_before * 1e3:>12.3f} {hull_after * 1e3:>11.3f} {points_before} {points_after * 1e3:>13.3f}")
@@ -0,0 +1,289 @@
+""" the workloads of the lessons as standalone cases, timed at several problem sizes: point enumeration, dependence
+  analysis, scheduling, ast generation and plotting of the polyhedral kernels, extraction and lowering of the distal
+  matmul. the results are written as json, `--compare` reports the phases that got slower than a previous run.
+  python benchmarks/suite.py [--sizes small,medium] [--cases jacobi-1d,...] [--repeat 3] [--output results.json]
+                             [--compare baseline.json] [--threshold 1.25]
+"""
+import sys
+import os
+import time
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import isl
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from plot.plotter import plot_domain
+
+SIZES = ('small', 'medium', 'large')
+
+
+@dataclass
+class Kernel:
+  """ a polyhedral kernel of the lessons, its strings are parametric in N, fixed to `sizes[size]` when timed. """
+  name: str
+  source: str
+  domain: str
+  reads: str
+  writes: str
+  schedule: str
+  sizes: Dict[str, int]
+  # a map of the statement points to tile ids, the kernel is plotted when it is given (two dimensional kernels).
+  tiling: Optional[str] = None
+
+
+KERNELS = [
+    Kernel('jacobi-1d', '13_pluto.ipynb',
+           "[N] -> { s1[t, i] : 0 <= t < N and 2 <= i < N - 1 }",
+           "{ s1[t, i] -> a[t - 1, i]; s1[t, i] -> a[t - 1, i - 1]; s1[t, i] -> a[t - 1, i + 1] }",
+           "{ s1[t, i] -> a[t, i] }", "{ s1[t, i] -> [t, i] }",
+           {'small': 16, 'medium': 64, 'large': 256}, "{ s1[t, i] -> [floor(t / 4), floor((i - t) / 4)] }"),
+    Kernel('seidel-2d', '13_pluto.ipynb',
+           "[N] -> { S1[i, j] : 0 <= i < N and 0 <= j < N }",
+           "{ S1[i, j] -> a[i - 1, j]; S1[i, j] -> a[i, j - 1] }",
+           "{ S1[i, j] -> a[i, j] }", "{ S1[i, j] -> [i, j] }",
+           {'small': 16, 'medium': 64, 'large': 256}, "{ S1[i, j] -> [floor(i / 4), floor(j / 4)] }"),
+    Kernel('transpose', '13_pluto.ipynb',
+           "[N] -> { S1[i, j] : 0 <= i <= N and 1 <= j <= N }",
+           "{ S1[i, j] -> a[j, i]; S1[i, j] -> a[i, j - 1] }",
+           "{ S1[i, j] -> a[i, j] }", "{ S1[i, j] -> [i, j] }",
+           {'small': 16, 'medium': 64, 'large': 256}, "{ S1[t, i] -> [floor(t / 4), floor(i / 4)] }"),
+    # N = 1000 is the size of the lesson.
+    Kernel('three-statement', '12_schedule_program.ipynb',
+           "[N] -> { s1[i, j] : 1 <= i < N and 1 <= 2j < N; s2[i, j] : 1 <= i < N and 1 <= 2j < N; "
+           "s3[i, j] : 1 <= i < N and 1 <= 2j < N }",
+           "{ s1[i, j] -> a[i, j + 1]; s1[i, j] -> b[i, j]; s2[i, j] -> a[i, j]; s2[i, j] -> d[i + 1, j]; "
+           "s3[i, j] -> e[i, j] }",
+           "{ s1[i, j] -> a[i, j]; s2[i, j] -> c[i, j]; s3[i, j] -> d[i, j] }",
+           "{ s1[i, j] -> [i, j, 0]; s2[i, j] -> [i, j, 1]; s3[i, j] -> [i, j, 2] }",
+           {'small': 32, 'medium': 128, 'large': 512}),
+    # the two batched matmuls of test1.mlir, N = 128 are its sizes (8x128x384 * 8x384x512, then * 8x512x64).
+    Kernel('mlir-fusion', 'test1.mlir',
+           "[N] -> { S0[b, m, n, k] : 0 <= b < 8 and 0 <= m < N and 0 <= n < 4N and 0 <= k < 3N; "
+           "S1[b, m, p, n] : 0 <= b < 8 and 0 <= m < N and 0 <= 2p < N and 0 <= n < 4N }",
+           "{ S0[b, m, n, k] -> A0[b, m, k]; S0[b, m, n, k] -> A1[b, k, n]; S0[b, m, n, k] -> A2[b, m, n]; "
+           "S1[b, m, p, n] -> A2[b, m, n]; S1[b, m, p, n] -> A3[b, n, p]; S1[b, m, p, n] -> A4[b, m, p] }",
+           "{ S0[b, m, n, k] -> A2[b, m, n]; S1[b, m, p, n] -> A4[b, m, p] }",
+           "{ S0[b, m, n, k] -> [0, b, m, n, k]; S1[b, m, p, n] -> [1, b, m, p, n] }",
+           {'small': 4, 'medium': 8, 'large': 16}),
+]
+
+
+@dataclass
+class Result:
+  case: str
+  size: str
+  phase: str
+  # seconds of the fastest and the median run.
+  best: float
+  median: float
+  # the size of the output of the phase (points, dependences, characters), to tell a change of work from a slowdown.
+  items: int = 0
+  # the exception of a phase that failed, its timings are then meaningless.
+  error: Optional[str] = None
+
+
+@dataclass
+class Workload:
+  """ the phases of one case at one size, each phase gets the outputs of the previous ones as inputs. """
+  case: str
+  size: str
+  phases: List[tuple[str, Callable[[], int]]] = field(default_factory=list)
+
+
+def fix(text: str, n: int, kind=isl.union_set):
+  return kind(text).intersect_params(isl.set(f"[N] -> {{ : N = {n} }}"))
+
+
+def kernel_workload(kernel: Kernel, size: str) -> Workload:
+  n = kernel.sizes[size]
+  domain = fix(kernel.domain, n)
+  reads = isl.union_map(kernel.reads).intersect_domain(domain)
+  writes = isl.union_map(kernel.writes).intersect_domain(domain)
+  schedule = isl.union_map(kernel.schedule).intersect_domain(domain)
+  state = {}
+
+  def points() -> int:
+    count = [0]
+
+    def add(point: isl.point):
+      count[0] += 1
+    domain.foreach_point(add)
+    return count[0]
+
+  def dependences() -> int:
+    def flow(sink: isl.union_map, source: isl.union_map) -> isl.union_map:
+      info = isl.union_access_info(sink).set_must_source(source).set_schedule_map(schedule)
+      return info.compute_flow().get_must_dependence()
+    state['deps'] = flow(reads, writes).union(flow(writes, reads)).union(flow(writes, writes))
+    # the number of dependent instance pairs, the parameters are fixed so every count is an integer.
+    pairs = state['deps'].wrap().get_set_list()
+    return sum(pairs.at(k).count_val().get_num_si() for k in range(pairs.size()))
+
+  def scheduling() -> int:
+    deps = state['deps']
+    constraints = isl.schedule_constraints.on_domain(domain)
+    constraints = constraints.set_validity(deps).set_coincidence(deps).set_proximity(deps)
+    state['schedule'] = constraints.compute_schedule()
+    return 0
+
+  def ast() -> int:
+    return len(isl.ast_build().node_from(state['schedule']).to_C_str())
+
+  def plot() -> int:
+    plt.figure()
+    plot_domain(domain.as_set(), state['deps'].as_map(), fix(kernel.tiling, n, isl.map))
+    artists = len(plt.gca().get_children())
+    plt.close()
+    return artists
+
+  phases = [('points', points), ('dependences', dependences), ('schedule', scheduling), ('ast', ast)]
+  if kernel.tiling is not None:
+    phases.append(('plot', plot))
+  return Workload(kernel.name, size, phases)
+
+
+DISTAL_SIZES = {'small': (64, 256, 128), 'medium': (256, 1024, 512), 'large': (512, 2048, 1024)}
+
+
+def distal_workload(size: str) -> Workload:
+  """ the summa matmul of 15_distal.ipynb on a 2x2 mesh, extracted at the buffer shapes of the size. """
+  # xdsl parses the kernel from the source of its module, it is shared with the extraction benchmark.
+  from distal_extract_cache import matmul
+  from utils.distal import IterVar, Mesh, OpKind, polyhedron_extract, lower_and_codegen_str
+
+  M, K, N = DISTAL_SIZES[size]
+  shapes = {'A': [M, K], 'B': [K, N], 'C': [M, N]}
+  state = {}
+
+  def extract() -> int:
+    state['comp'] = polyhedron_extract(matmul, shapes, cache=False)
+    return len(state['comp'].accesses)
+
+  def lower() -> int:
+    k, m, n = state['comp'].iter_vars
+    x, y = IterVar.range('x', 2), IterVar.range('y', 2)
+    mo, no, mi, ni = IterVar.symbol('mo no mi ni')
+    ko, ki = IterVar.symbol('ko ki')
+    comp = state['comp'].distribute([m, n], [mo, no], [mi, ni], Mesh((x, y)))
+    comp = comp.divide(k, ko, ki, x.extent).reorder(mo, no, ko, mi, ni, ki)
+    comp = comp.shard('A', m @ x, k @ y).shard('B', k @ x, n @ y).shard('C', m @ x, n @ y)
+    comp = comp.communicate('A', ko).communicate('B', ko).tensorize([mi, ni, ki], OpKind.MatMul)
+    return len(lower_and_codegen_str(comp))
+
+  return Workload('distal-matmul', size, [('extract', extract), ('lower', lower)])
+
+
+def run(workload: Workload, repeat: int) -> List[Result]:
+  """ time each phase, a phase that raises is reported as an error and ends the workload (the later phases use its
+    output).
+  """
+  results = []
+  for phase, fn in workload.phases:
+    seconds = []
+    try:
+      for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        seconds.append(time.perf_counter() - start)
+    except Exception as e:
+      results.append(Result(workload.case, workload.size, phase, 0.0, 0.0, 0, f"{type(e).__name__}: {e}"))
+      break
+    results.append(Result(workload.case, workload.size, phase, min(seconds), statistics.median(seconds), items))
+  return results
+
+
+def print_result(r: Result):
+  if r.error:
+    print(f"{r.case:<16} {r.size:<7} {r.phase:<12} error, {r.error}")
+  else:
+    print(f"{r.case:<16} {r.size:<7} {r.phase:<12} {r.best * 1e3:>10.2f} {r.median * 1e3:>11.2f} {r.items:>9}")
+
+
+def git_commit() -> Optional[str]:
+  try:
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(results: List[Result], baseline_path: str, threshold: float) -> List[str]:
+  """ print the speed of each phase relative to the baseline, return the phases slower by more than `threshold`. """
+  with open(baseline_path) as f:
+    baseline = {(r['case'], r['size'], r['phase']): r for r in json.load(f)['results']}
+  regressions = []
+  print(f"\n{'case':<16} {'size':<7} {'phase':<12} {'base(ms)':>10} {'now(ms)':>10} {'ratio':>7}")
+  for r in results:
+    old = baseline.get((r.case, r.size, r.phase))
+    if old is None:
+      continue
+    if r.error:
+      print(f"{r.case:<16} {r.size:<7} {r.phase:<12} error, {r.error}")
+      regressions.append(f"{r.case}/{r.size}/{r.phase}")
+      continue
+    if old.get('error'):
+      continue
+    ratio = r.best / old['best'] if old['best'] > 0 else float('inf')
+    flag = ''
+    if old['items'] != r.items:
+      flag = f"  (items {old['items']} -> {r.items})"
+    elif ratio > threshold:
+      flag = '  slower'
+      regressions.append(f"{r.case}/{r.size}/{r.phase}")
+    print(f"{r.case:<16} {r.size:<7} {r.phase:<12} {old['best'] * 1e3:>10.2f} {r.best * 1e3:>10.2f} {ratio:>7.2f}{flag}")
+  return regressions
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--sizes', default='small,medium', help=f"comma separated, out of {','.join(SIZES)}")
+  parser.add_argument('--cases', default=None, help="comma separated case names, all by default")
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--output', default=None, help="write the results to this json file")
+  parser.add_argument('--compare', default=None, help="a json file of a previous run to compare against")
+  parser.add_argument('--threshold', type=float, default=1.25, help="slowdown ratio reported as a regression")
+  args = parser.parse_args()
+
+  sizes = args.sizes.split(',')
+  assert all(s in SIZES for s in sizes), f"unknown size in {sizes}"
+  builders = {k.name: (lambda size, k=k: kernel_workload(k, size)) for k in KERNELS}
+  builders['distal-matmul'] = distal_workload
+  cases = args.cases.split(',') if args.cases else list(builders)
+  assert all(c in builders for c in cases), f"unknown case in {cases}, expected {list(builders)}"
+
+  results: List[Result] = []
+  print(f"{'case':<16} {'size':<7} {'phase':<12} {'best(ms)':>10} {'median(ms)':>11} {'items':>9}")
+  for case in cases:
+    for size in sizes:
+      try:
+        workload = builders[case](size)
+      except ImportError as e:
+        print(f"{case:<16} {size:<7} skipped, {e}")
+        continue
+      except Exception as e:
+        workload = Workload(case, size, [])
+        results.append(Result(case, size, 'setup', 0.0, 0.0, 0, f"{type(e).__name__}: {e}"))
+        print_result(results[-1])
+      for r in run(workload, args.repeat):
+        print_result(r)
+        results.append(r)
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump({'commit': git_commit(), 'python': platform.python_version(), 'machine': platform.machine(),
+                 'repeat': args.repeat, 'results': [r.__dict__ for r in results]}, f, indent=1)
+  if args.compare:
+    regressions = compare(results, args.compare, args.threshold)
+    if regressions:
+      sys.exit(f"slower than the baseline: {', '.join(regressions)}")
+  failed = [f"{r.case}/{r.size}/{r.phase}" for r in results if r.error]
+  if failed:
+    sys.exit(f"failed: {', '.join(failed)}")
@@ -3,18 +3,74 @@ import shutil
 import subprocess
 import shlex
 import os
+import time
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 l = ["01_presburger_sets", "02_iteration-domains", "03_schedules", "04_memory",
      "05_dependences", "06_classical-loop-transformations", "07_ast-generation", "08_c-parser"]
 
-os.chdir("out/")
+# the content hash of each notebook at its last successful export.
+HASHES = ".export_hashes.json"
 
-for f in l:
+
+def notebook_hash(f: str) -> str:
+  h = hashlib.sha256()
+  with open(f"../{f}.ipynb", 'rb') as in_f:
+    for chunk in iter(lambda: in_f.read(1 << 20), b''):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+def convert(f: str) -> tuple[str, int, float]:
+  start = time.perf_counter()
   shutil.copyfile(f"../{f}.ipynb", f"{f}.ipynb")
   ret = subprocess.run(shlex.split(
-      f'jupyter nbconvert {f}.ipynb --to markdown --output {f}.md'))
+      f'jupyter nbconvert {f}.ipynb --to markdown --output {f}.md'), capture_output=True, text=True)
+  if ret.returncode != 0:
+    sys.stderr.write(ret.stderr)
+  return f, ret.returncode, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+  # python export.py [notebook ...], the given notebooks are converted again even when unchanged.
+  requested = sys.argv[1:]
+  os.makedirs("out", exist_ok=True)
+  os.chdir("out/")
+
+  hashes = {}
+  if os.path.exists(HASHES):
+    with open(HASHES) as in_f:
+      hashes = json.load(in_f)
+  notebooks = l + [f for f in requested if f not in l]
+  current = {f: notebook_hash(f) for f in notebooks}
+  stale = [f for f in notebooks
+           if f in requested or hashes.get(f) != current[f] or not os.path.exists(f"{f}.md")]
+  for f in notebooks:
+    if f not in stale:
+      print(f"{f}: unchanged")
+
+  start = time.perf_counter()
+  failed = []
+  # nbconvert runs in its own process, threads are enough to wait on them.
+  with ThreadPoolExecutor() as pool:
+    for future in as_completed([pool.submit(convert, f) for f in stale]):
+      f, ret, seconds = future.result()
+      print(f"{f}: {seconds:.2f}s" + (f" (nbconvert exited with {ret})" if ret else ""))
+      if ret:
+        failed.append(f)
+        hashes.pop(f, None)
+      else:
+        hashes[f] = current[f]
+  print(f"converted {len(stale) - len(failed)}/{len(stale)} notebooks in {time.perf_counter() - start:.2f}s")
+
+  with open(HASHES, 'w') as of:
+    json.dump(hashes, of, indent=1)
+  if failed:
+    sys.exit(f"failed to convert {', '.join(failed)}")
 
-with open("polyherdal_learn.md", 'w') as of:
-  for in_file in l:
-    with open(f'{in_file}.md', 'r') as in_f:
-      of.writelines(in_f.readlines())
+  with open("polyherdal_learn.md", 'w') as of:
+    for in_file in l:
+      with open(f'{in_file}.md', 'r') as in_f:
+        shutil.copyfileobj(in_f, of)
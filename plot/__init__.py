@@ -2,4 +2,4 @@
 islplot
 """
 
-__all__ = ["plotter", "plotter3d", "support"]
+__all__ = ["plotter", "plotter3d", "support", "exporter"]
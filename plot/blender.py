@@ -357,32 +357,61 @@ def print_line(start, end):
 
     curve.data.materials.append(black)
 
-def print_face_borders(vertices, faces):
+def print_lines(segments, name="Lines"):
     """
-    Print lines along the edges of a set of faces.
+    Print lines between pairs of points as the splines of a single curve
+    object.
 
-    :param faces: The faces for which to print the edges.
+    :param segments: The (start, end) pairs of the lines.
+    :param name: The name of the curve object.
+    """
+    draw_curve = bpy.data.curves.new(name, 'CURVE')
+    draw_curve.dimensions = '3D'
+    draw_curve.resolution_u = 64
+    draw_curve.fill_mode = 'FULL'
+    draw_curve.bevel_depth = 0.02
+    draw_curve.bevel_resolution = 0.02
+    for start, end in segments:
+        spline = draw_curve.splines.new('POLY')
+        spline.points.add(1)
+        spline.points[0].co = (start[0], start[1], start[2], 1)
+        spline.points[1].co = (end[0], end[1], end[2], 1)
+    curve = bpy.data.objects.new(name, draw_curve)
+    bpy.context.scene.objects.link(curve)
+    curve.data.materials.append(black)
+    return curve
+
+def face_border_segments(vertices, faces):
+    """
+    The edges of a set of faces, each edge shared by two faces only once.
+
+    :param faces: The faces for which to list the edges.
     :param vertices: The locations of the vertices.
     """
+    edges = set()
     for face in faces:
         for i in range(len(face)):
-            a = vertices[face[i]]
-            b = vertices[face[(i+1)%len(face)]]
-            print_line(a, b)
+            edges.add(tuple(sorted((face[i], face[(i+1)%len(face)]))))
+    return [(vertices[a], vertices[b]) for a, b in sorted(edges)]
 
-def print_sphere(location):
+def print_face_borders(vertices, faces, name="Borders"):
     """
-    Print a sphere at a given location.
-
-    :param location: The location of the sphere.
+    Print lines along the edges of a set of faces.
 
+    :param faces: The faces for which to print the edges.
+    :param vertices: The locations of the vertices.
     """
+    return print_lines(face_border_segments(vertices, faces), name)
 
+def sphere_template():
+    """
+    The sphere every point is an instance of, built once per scene.
+    """
     if not "islplot-tmp-sphere" in bpy.data.objects:
         """
-        We only construct a sphere once and then copy subsequent spheres from
-        this one. This speeds up blender, as we avoid the additional checking
-        normally performed by the bpy.ops.mesh.* functions.
+        We only construct a sphere once and then instance subsequent spheres
+        from this one. This speeds up blender, as we avoid the additional
+        checking normally performed by the bpy.ops.mesh.* functions.
         """
         bpy.ops.mesh.primitive_uv_sphere_add(segments=8, ring_count=8,
             size=0.1, view_align=False, enter_editmode=False,
@@ -394,17 +423,46 @@ def print_sphere(location):
         sphere.name = "islplot-tmp-sphere"
         sphere.select = False
         sphere.data.materials.append(black)
-    else:
-        sphere = bpy.data.objects["islplot-tmp-sphere"]
+    return bpy.data.objects["islplot-tmp-sphere"]
 
+def print_sphere(location):
+    """
+    Print a sphere at a given location, a linked duplicate sharing the mesh
+    of the sphere template.
+
+    :param location: The location of the sphere.
+
+    """
+    sphere = sphere_template()
     l = location
     ob = sphere.copy()
     ob.name = "Sphere (%d, %d, %d)" % (l[0], l[1], l[2])
     ob.location = l
-    ob.data = sphere.data.copy()
     bpy.context.scene.objects.link(ob)
     return ob
 
+def print_spheres(locations, name="Points"):
+    """
+    Print a sphere at each of the locations with two objects, whatever their
+    number: a mesh with one vertex per location, that instances a copy of the
+    sphere template on each of its vertices.
+
+    :param locations: The locations of the spheres.
+    :param name: The name of the point cloud object.
+    """
+    me = bpy.data.meshes.new(name)
+    me.from_pydata([tuple(l) for l in locations], [], [])
+    me.update()
+    cloud = bpy.data.objects.new(name, me)
+    bpy.context.scene.objects.link(cloud)
+    sphere = sphere_template().copy()
+    sphere.name = name + " sphere"
+    sphere.location = (0, 0, 0)
+    sphere.parent = cloud
+    bpy.context.scene.objects.link(sphere)
+    cloud.dupli_type = 'VERTS'
+    return cloud
+
 def plot_bset_shape(bset_data, name, material, borders=True):
     """
     Given an basic set, plot the shape formed by the constraints that define
@@ -417,7 +475,7 @@ def plot_bset_shape(bset_data, name, material, borders=True):
     """
     vertices, faces = get_vertices_and_faces(bset_data)
     if borders:
-        print_face_borders(vertices, faces)
+        print_face_borders(vertices, faces, name + " borders")
     bpy.ops.object.add(type='MESH')
     ob = bpy.context.object
     ob.name = name
@@ -431,10 +489,9 @@ def plot_bset_shape(bset_data, name, material, borders=True):
     bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='MEDIAN')
     return ob
 
-def plot_set_points(set_data):
+def plot_set_points(set_data, name="Points"):
     points = bset_get_points(set_data, only_hull=True)
-    for point in points:
-        s = print_sphere(point)
+    return print_spheres(points, name)
 
 def plot_bset(bset_data, color, name, add_spheres=True, borders=True):
     tile = plot_bset_shape(bset_data, name, color, borders)
@@ -444,10 +501,47 @@ def plot_bset(bset_data, color, name, add_spheres=True, borders=True):
         bpy.context.scene.update()
     return tile
 
+def plot_tiles(tiles, name="Tiles", borders=True):
+    """
+    Plot the shapes of many basic sets as a single mesh, whose faces select
+    the material of their tile with their material index.
+
+    :param tiles: The (basic set, material) pairs to plot.
+    :param name: The name the resulting mesh should have.
+    :param borders: Print the borders of the shapes, as one curve object.
+    """
+    all_vertices, all_faces, face_materials, segments = [], [], [], []
+    materials = []
+    for bset_data, material in tiles:
+        vertices, faces = get_vertices_and_faces(bset_data)
+        if material not in materials:
+            materials.append(material)
+        offset = len(all_vertices)
+        all_vertices.extend(vertices)
+        all_faces.extend([[offset + v for v in face] for face in faces])
+        face_materials.extend([materials.index(material)] * len(faces))
+        if borders:
+            segments.extend(face_border_segments(vertices, faces))
+
+    if borders:
+        print_lines(segments, name + " borders")
+    me = bpy.data.meshes.new(name)
+    me.from_pydata(all_vertices, [], all_faces)
+    for material in materials:
+        me.materials.append(material)
+    for polygon, index in zip(me.polygons, face_materials):
+        polygon.material_index = index
+    me.update()
+    ob = bpy.data.objects.new(name, me)
+    bpy.context.scene.objects.link(ob)
+    return ob
+
 def plot_all(schedule, dimensions_to_visualize, add_spheres=False, borders=True,
              get_color=None):
     """
-    Given a schedule, we print the individual tiles.
+    Given a schedule, we print the individual tiles. All the tiles are one
+    mesh, their borders one curve and their points one instanced point cloud,
+    so the number of objects does not grow with the number of tiles or points.
 
     TODO: This is just a quick hack. This code should be shared between the
           different renderers.
@@ -467,6 +561,8 @@ def plot_all(schedule, dimensions_to_visualize, add_spheres=False, borders=True,
     tileIDSet.foreach_point(tileIDs.append)
     tileIDs = sort_points(tileIDs)
 
+    tiles = []
+    points = []
     for tileID in tileIDs:
         tileIDSet = isl.set.from_point(tileID)
         tileSet = schedule.intersect_range(tileIDSet).domain()
@@ -474,6 +570,12 @@ def plot_all(schedule, dimensions_to_visualize, add_spheres=False, borders=True,
         assert tileSet == tileSet.convex_hull()
         tileSet = tileSet.convex_hull()
 
-        color = get_color(tileID)
-        name = "Tile " + str(get_point_coordinates(tileID))
-        plot_bset(tileSet, color, name, add_spheres, borders)
+        tiles.append((tileSet, get_color(tileID)))
+        if add_spheres:
+            points.extend(bset_get_points(tileSet, only_hull=True))
+
+    ob = plot_tiles(tiles, "Tiles", borders)
+    if add_spheres:
+        print_spheres(points, "Tile points")
+        bpy.context.scene.update()
+    return ob
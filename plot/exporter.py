@@ -0,0 +1,273 @@
+import json
+import struct
+import isl
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple, Union
+from plot.support import set_get_faces, bset_get_points
+
+
+@dataclass
+class Mesh:
+  """
+  Triangles with a single color, ready to be written to disk.
+
+  :param vertices: The (n, 3) float32 coordinates of the vertices.
+  :param triangles: The (m, 3) uint32 vertex indices of the triangles.
+  :param color: The RGBA color of the mesh, each channel between 0 and 1.
+  """
+  vertices: np.ndarray
+  triangles: np.ndarray
+  color: Tuple[float, float, float, float] = (0.5, 0.5, 0.5, 1.0)
+
+
+@dataclass
+class Points:
+  """
+  A point cloud with a single color, e.g. the integer points of a set.
+
+  :param vertices: The (n, 3) float32 coordinates of the points.
+  :param color: The RGBA color of the points, each channel between 0 and 1.
+  """
+  vertices: np.ndarray
+  color: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 1.0)
+
+
+def _coordinates(vertices) -> np.ndarray:
+  """
+  Convert a list of (possibly rational) vertices or points to an (n, 3)
+  float32 array, padding points of lower dimensional sets with zeros.
+  """
+  data = np.asarray(vertices, dtype=np.float32).reshape(len(vertices), -1)
+  if data.shape[1] < 3:
+    data = np.pad(data, ((0, 0), (0, 3 - data.shape[1])))
+  return np.ascontiguousarray(data[:, :3])
+
+
+def triangulate(faces: List[List[int]]) -> np.ndarray:
+  """
+  Split convex polygons, given as lists of vertex indices in the order of
+  their boundary (as produced by get_vertices_and_faces), into a fan of
+  triangles around their first vertex.
+  """
+  triangles = [(face[0], face[k], face[k + 1])
+               for face in faces for k in range(1, len(face) - 1)]
+  return np.asarray(triangles, dtype=np.uint32).reshape(-1, 3)
+
+
+def faces_mesh(vertices, faces: List[List[int]], color=(0.5, 0.5, 0.5, 1.0)) -> Mesh:
+  """
+  Build a mesh from the output of get_vertices_and_faces.
+  """
+  return Mesh(_coordinates(vertices), triangulate(faces), color)
+
+
+def set_mesh(set_data: isl.set, color=(0.5, 0.5, 0.5, 1.0)) -> Mesh:
+  """
+  Build a mesh of the hull of every basic set of a three dimensional set, as
+  given by set_get_faces. Faces shared by two basic sets are kept, so the
+  pieces of the set remain visible.
+  """
+  vertices: List[Tuple] = []
+  faces: List[List[int]] = []
+  for bset_faces in set_get_faces(set_data):
+    index = {}
+    for face in bset_faces:
+      for vertex in face:
+        vertex = tuple(vertex)
+        if vertex not in index:
+          index[vertex] = len(vertices)
+          vertices.append(vertex)
+      faces.append([index[tuple(vertex)] for vertex in face])
+  return faces_mesh(vertices, faces, color)
+
+
+def set_points(set_data: isl.set, only_hull=False, color=(0.0, 0.0, 0.0, 1.0)) -> Points:
+  """
+  Collect the integer points of a set, as given by bset_get_points.
+  """
+  return Points(_coordinates(bset_get_points(set_data, only_hull)), color)
+
+
+Geometry = Union[Mesh, Points]
+
+
+def _rgba8(color) -> np.ndarray:
+  return np.clip(np.round(np.asarray(color, dtype=np.float64) * 255), 0, 255).astype(np.uint8)
+
+
+def write_ply(path: str, geometries: Sequence[Geometry]):
+  """
+  Write meshes and point clouds as a single binary little endian PLY file.
+
+  All vertices, including the points, go into the vertex element together
+  with their color; the triangles of the meshes go into the face element.
+  """
+  vertex_type = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                          ('red', 'u1'), ('green', 'u1'), ('blue', 'u1'), ('alpha', 'u1')])
+  face_type = np.dtype([('n', 'u1'), ('vertex_indices', '<u4', (3,))])
+  n_vertices = sum(len(g.vertices) for g in geometries)
+  n_faces = sum(len(g.triangles) for g in geometries if isinstance(g, Mesh))
+
+  header = ("ply\nformat binary_little_endian 1.0\n"
+            f"element vertex {n_vertices}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            "property uchar red\nproperty uchar green\nproperty uchar blue\nproperty uchar alpha\n"
+            f"element face {n_faces}\n"
+            "property list uchar uint vertex_indices\n"
+            "end_header\n")
+
+  with open(path, 'wb') as f:
+    f.write(header.encode('ascii'))
+    for g in geometries:
+      vertices = np.empty(len(g.vertices), dtype=vertex_type)
+      for axis, name in enumerate('xyz'):
+        vertices[name] = g.vertices[:, axis]
+      for channel, name in zip(_rgba8(g.color), ('red', 'green', 'blue', 'alpha')):
+        vertices[name] = channel
+      vertices.tofile(f)
+    offset = 0
+    for g in geometries:
+      if isinstance(g, Mesh):
+        faces = np.empty(len(g.triangles), dtype=face_type)
+        faces['n'] = 3
+        faces['vertex_indices'] = g.triangles + offset
+        faces.tofile(f)
+      offset += len(g.vertices)
+
+
+def write_obj(path: str, geometries: Sequence[Geometry]):
+  """
+  Write meshes and point clouds as a Wavefront OBJ file. The format has no
+  binary encoding and OBJ colors need a material library, so colors are
+  dropped; prefer glTF or PLY for large scenes.
+  """
+  with open(path, 'w') as f:
+    offset = 1
+    for k, g in enumerate(geometries):
+      f.write(f"o {type(g).__name__.lower()}{k}\n")
+      np.savetxt(f, g.vertices, fmt='v %.9g %.9g %.9g')
+      if isinstance(g, Mesh):
+        np.savetxt(f, g.triangles + offset, fmt='f %d %d %d')
+      elif len(g.vertices):
+        f.write("p " + " ".join(map(str, range(offset, offset + len(g.vertices)))) + "\n")
+      offset += len(g.vertices)
+
+
+_GLB_MAGIC = 0x46546C67
+_GLB_JSON = 0x4E4F534A
+_GLB_BIN = 0x004E4942
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_FLOAT = 5126
+_UNSIGNED_INT = 5125
+_POINTS = 0
+_TRIANGLES = 4
+
+
+def write_glb(path: str, geometries: Sequence[Geometry]):
+  """
+  Write meshes and point clouds as a binary glTF 2.0 file, one node per
+  geometry. Meshes are triangle primitives, point clouds point primitives,
+  each with an unlit material of its color.
+  """
+  gltf = {"asset": {"version": "2.0", "generator": "plot.exporter"},
+          "extensionsUsed": ["KHR_materials_unlit"],
+          "scene": 0, "scenes": [{"nodes": list(range(len(geometries)))}],
+          "nodes": [], "meshes": [], "materials": [],
+          "accessors": [], "bufferViews": []}
+  chunks: List[bytes] = []
+  length = 0
+
+  def add_view(data: np.ndarray, target: int) -> int:
+    nonlocal length
+    data = data.tobytes()
+    gltf["bufferViews"].append({"buffer": 0, "byteOffset": length,
+                                "byteLength": len(data), "target": target})
+    chunks.append(data)
+    length += len(data)
+    # every component is four bytes long, the views stay aligned.
+    return len(gltf["bufferViews"]) - 1
+
+  def add_accessor(view: int, component: int, count: int, kind: str, **bounds) -> int:
+    gltf["accessors"].append({"bufferView": view, "componentType": component,
+                              "count": count, "type": kind, **bounds})
+    return len(gltf["accessors"]) - 1
+
+  for k, g in enumerate(geometries):
+    vertices = np.ascontiguousarray(g.vertices, dtype='<f4')
+    if len(vertices) == 0 or (isinstance(g, Mesh) and len(g.triangles) == 0):
+      # glTF does not allow empty accessors.
+      gltf["nodes"].append({"name": f"{type(g).__name__.lower()}{k}"})
+      continue
+    position = add_accessor(add_view(vertices, _ARRAY_BUFFER), _FLOAT, len(vertices), "VEC3",
+                            min=vertices.min(axis=0).tolist(), max=vertices.max(axis=0).tolist())
+    color = [float(c) for c in g.color]
+    material = {"pbrMetallicRoughness": {"baseColorFactor": color, "metallicFactor": 0.0},
+                "extensions": {"KHR_materials_unlit": {}}}
+    if color[3] < 1.0:
+      material["alphaMode"] = "BLEND"
+    gltf["materials"].append(material)
+    primitive = {"attributes": {"POSITION": position},
+                 "material": len(gltf["materials"]) - 1, "mode": _POINTS}
+    if isinstance(g, Mesh):
+      triangles = np.ascontiguousarray(g.triangles, dtype='<u4').reshape(-1)
+      primitive["indices"] = add_accessor(add_view(triangles, _ELEMENT_ARRAY_BUFFER),
+                                          _UNSIGNED_INT, len(triangles), "SCALAR")
+      primitive["mode"] = _TRIANGLES
+      material["doubleSided"] = True
+    gltf["meshes"].append({"primitives": [primitive]})
+    gltf["nodes"].append({"name": f"{type(g).__name__.lower()}{k}", "mesh": len(gltf["meshes"]) - 1})
+
+  for key in ("meshes", "materials", "accessors", "bufferViews"):
+    if not gltf[key]:
+      del gltf[key]
+  if length:
+    gltf["buffers"] = [{"byteLength": length}]
+
+  text = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+  text += b' ' * (-len(text) % 4)
+  total = 12 + 8 + len(text) + (8 + length if length else 0)
+  with open(path, 'wb') as f:
+    f.write(struct.pack('<III', _GLB_MAGIC, 2, total))
+    f.write(struct.pack('<II', len(text), _GLB_JSON))
+    f.write(text)
+    if length:
+      f.write(struct.pack('<II', length, _GLB_BIN))
+      for chunk in chunks:
+        f.write(chunk)
+
+
+WRITERS = {'glb': write_glb, 'ply': write_ply, 'obj': write_obj}
+
+
+def export_geometries(path: str, geometries: Sequence[Geometry]):
+  """
+  Write meshes and point clouds to `path`, in the format given by its
+  extension (.glb, .ply or .obj).
+  """
+  extension = path.rsplit('.', 1)[-1].lower()
+  if extension not in WRITERS:
+    raise ValueError(f"unknown geometry format .{extension}, expected one of {sorted(WRITERS)}")
+  WRITERS[extension](path, geometries)
+
+
+def export_sets(path: str, sets: Sequence[isl.set], points=True, only_hull=False, colors=None):
+  """
+  Export the hulls of three dimensional isl sets, and optionally their integer
+  points, without Blender.
+
+  :param path: The file to write, its extension (.glb, .ply or .obj) selects the format.
+  :param sets: The sets to export, one mesh per set.
+  :param points: Also export the integer points of each set.
+  :param only_hull: Only export the points on the hull of the sets.
+  :param colors: One RGBA color per set.
+  """
+  if colors is None:
+    colors = [(0.5, 0.5, 0.5, 0.5)] * len(sets)
+  geometries: List[Geometry] = []
+  for set_data, color in zip(sets, colors):
+    geometries.append(set_mesh(set_data, color))
+    if points:
+      geometries.append(set_points(set_data, only_hull))
+  export_geometries(path, geometries)
@@ -1,10 +1,13 @@
 import matplotlib.pyplot as _plt
 from matplotlib import colormaps
 from matplotlib import collections
+from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.path import Path
-from matplotlib.patches import PathPatch, Circle
+from matplotlib.patches import PathPatch, Circle, Rectangle
 from matplotlib.ticker import MaxNLocator
 from matplotlib.transforms import Affine2D
+import math
+import numpy as np
 import isl
 from plot.support import *
 from typing import Tuple, List, Union, Deque
@@ -58,6 +61,131 @@ def plot_set_points(set_datas: Union[isl.set, List[isl.set]], color="black", siz
   ax.yaxis.set_major_locator(MaxNLocator(integer=True))
 
 
+def _set_bounds(set_data: isl.set) -> List[Tuple[int, int]]:
+  """
+  The minimum and maximum of the first two dimensions of a bounded set.
+  """
+  return [(set_data.dim_min_val(i).get_num_si(), set_data.dim_max_val(i).get_num_si())
+          for i in range(2)]
+
+
+def _grid_map(set_data: isl.set, bin_size: int) -> isl.map:
+  """
+  Map each point of a two dimensional set to the square block of `bin_size`
+  times `bin_size` points it lies in.
+  """
+  tuple_name = set_data.get_tuple_name() if set_data.has_tuple_name() else ""
+  return isl.map(f"{{ {tuple_name}[i, j] -> [floor(i / {bin_size}), floor(j / {bin_size})] }}")
+
+
+def _bin_size(set_data: isl.set, bins: int) -> int:
+  (min0, max0), (min1, max1) = _set_bounds(set_data)
+  return max(1, math.ceil((max(max0 - min0, max1 - min1) + 1) / bins))
+
+
+def plot_set_density(set_data: isl.set, bins=64, color="black", alpha=1.0, ax: _plt.Axes = None):
+  """
+  Plot the points of a two dimensional isl set as a density image.
+
+  The points are counted in square blocks, such that the longer side of the
+  set is split into `bins` blocks, and each block is shaded with the fraction
+  of its points that belong to the set. Empty blocks are transparent. The
+  counting is done by isl, so the cost and the size of the image depend on
+  `bins` and not on the number of points.
+
+  :param set_data: The bounded set to plot.
+  :param bins: The number of blocks along the longer side of the set.
+  :param color: The color of a block that is completely filled.
+  :param alpha: The alpha value of the image.
+  """
+  if ax is None:
+    ax = _plt.gca()
+  if set_data.is_empty():
+    return
+
+  size = _bin_size(set_data, bins)
+  (min0, max0), (min1, max1) = _set_bounds(set_data)
+  first0, first1 = min0 // size, min1 // size
+  counts = np.zeros((max0 // size - first0 + 1, max1 // size - first1 + 1))
+
+  # The block ids are parameters, such that each block is a fixed parameter
+  # value of a single set.
+  blocks = set_data.reset_tuple_id().intersect(isl.set(
+      f"[a, b] -> {{ [i, j] : {size}a <= i < {size}a + {size} and {size}b <= j < {size}b + {size} }}"))
+  a = blocks.find_dim_by_name(isl.dim_type.PARAM, "a")
+  b = blocks.find_dim_by_name(isl.dim_type.PARAM, "b")
+  for row in range(counts.shape[0]):
+    band = blocks.fix_si(isl.dim_type.PARAM, a, first0 + row)
+    if band.is_empty():
+      continue
+    for col in range(counts.shape[1]):
+      counts[row, col] = band.fix_si(isl.dim_type.PARAM, b, first1 + col).count_val().get_num_si()
+
+  cmap = LinearSegmentedColormap.from_list("density", ["white", color])
+  extent = (first1 * size - 0.5, (first1 + counts.shape[1]) * size - 0.5,
+            first0 * size - 0.5, (first0 + counts.shape[0]) * size - 0.5)
+  ax.imshow(np.ma.masked_equal(counts / (size * size), 0), cmap=cmap, vmin=0, vmax=1,
+            origin="lower", extent=extent, interpolation="nearest", alpha=alpha, aspect="auto")
+  ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+  ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+
+
+def _point_tuple(point: isl.point) -> Tuple[int, ...]:
+  return tuple(point.get_coordinate_val(isl.dim_type.SET, i).get_num_si()
+               for i in range(point.get_space().dim(isl.dim_type.SET)))
+
+
+def _group_centers(groups: isl.map) -> dict:
+  """
+  The center of the bounding box of each group of a map from points to
+  group ids, in plot coordinates.
+  """
+  centers = {}
+
+  def add(point: isl.point):
+    members = groups.intersect_range(isl.set(point)).domain()
+    (min0, max0), (min1, max1) = _set_bounds(members)
+    centers[_point_tuple(point)] = ((min1 + max1) / 2, (min0 + max0) / 2)
+  groups.range().foreach_point(add)
+  return centers
+
+
+def plot_map_summary(dependences: isl.map, groups: isl.map, color="gray", style="->", width=1,
+                     label_size=8, ax: _plt.Axes = None):
+  """
+  Plot the dependences between groups of points as one arrow per pair of
+  groups, labeled with the number of dependences it stands for.
+
+  :param dependences: The dependences between two dimensional points.
+  :param groups: A map from the points to their group id, e.g. a tiling.
+  :param color: The color of the arrows and labels.
+  :param style: The style used to plot the arrows.
+  :param width: The width used to plot the arrows.
+  :param label_size: The font size of the labels.
+  """
+  if ax is None:
+    ax = _plt.gca()
+  centers = _group_centers(groups)
+
+  # map a dependence [source -> sink] onto the pair [group -> group].
+  pairs = groups.product(groups)
+  wrapped = dependences.wrap()
+  summary = pairs.intersect_domain(wrapped).range()
+  n = groups.dim(isl.dim_type.OUT)
+
+  def add(point: isl.point):
+    ids = _point_tuple(point)
+    if ids[:n] == ids[n:]:
+      return
+    start, end = centers[ids[:n]], centers[ids[n:]]
+    count = pairs.intersect_range(isl.set(point)).domain().intersect(wrapped).count_val()
+    _plot_arrow(start, end, ax, color=color, style=style, width=width, shrink=0)
+    ax.annotate(str(count.get_num_si()), ((start[0] + end[0]) / 2, (start[1] + end[1]) / 2),
+                color=color, fontsize=label_size, ha="center", va="center",
+                bbox=dict(boxstyle="round", fc="white", ec="none", alpha=0.8))
+  summary.foreach_point(add)
+
+
 def _plot_arrow(start, end, graph, *args, **kwargs):
   """
   Plot an arrow from start to end.
@@ -267,7 +395,7 @@ def plot_set_shapes(set_data, *args, **kwargs):
 
 def plot_map_as_groups(bmap: isl.basic_map, processors_mapping: ProcessorMap = None, color="gray", alpha=1.0,
                        vertex_color=None, vertex_marker="o",
-                       vertex_size=10, scale=1, border=0.15, ax: _plt.Axes = None):
+                       vertex_size=10, scale=1, border=0.15, outline=False, ax: _plt.Axes = None):
   """
   Plot a map in groups of convex sets
 
@@ -287,10 +415,16 @@ def plot_map_as_groups(bmap: isl.basic_map, processors_mapping: ProcessorMap = N
   :param border: Increase the size of the area filled with the background
                  by the value given as 'border'.
   :param alpha: The alpha the shapes are plotted.
+  :param outline: Only draw the outline of the shapes, all in a single
+                  collection, which keeps the figure small for many groups.
   """
 
   if not vertex_color and color is str:
     vertex_color = color
+  if ax is None:
+    ax = _plt.gca()
+  outlines: List[np.ndarray] = []
+  outline_colors = []
 
   def plot_group_points(points: List[isl.point], region_color: str):
     for point in points:
@@ -307,6 +441,10 @@ def plot_map_as_groups(bmap: isl.basic_map, processors_mapping: ProcessorMap = N
       # plot_set_points(part_set, color=vertex_color, size=vertex_size,
       #                 marker=vertex_marker, scale=scale)
       part_set = part_set.remove_divs()
+      if outline:
+        outlines.append(bset_get_vertex_coordinates(part_set, scale=scale))
+        outline_colors.append(region_color)
+        continue
       plot_bset_shape(part_set, color=region_color, alpha=alpha,
                       vertex_color=vertex_color,
                       vertex_size=vertex_size, vertex_marker=vertex_marker,
@@ -326,6 +464,11 @@ def plot_map_as_groups(bmap: isl.basic_map, processors_mapping: ProcessorMap = N
       processor_range.foreach_point(points.append)
       plot_group_points(points, colorbars(processor_id))
 
+  if outlines:
+    ax.add_collection(collections.PolyCollection(outlines, closed=True, facecolors="none",
+                                                 edgecolors=outline_colors, alpha=alpha))
+    ax.autoscale_view()
+
 
 def plot_domain(domain, dependences=None, tiling=None, space=None, processors_mapping: ProcessorMap = None,
                 tile_color="skyblue", tile_alpha=1,
@@ -334,7 +477,8 @@ def plot_domain(domain, dependences=None, tiling=None, space=None, processors_ma
                 bg_vertex_color="lightgray", bg_vertex_size=10,
                 bg_vertex_marker="o",
                 dep_color="gray", dep_style="->", dep_width=1,
-                shrink=6, border=0.15
+                shrink=6, border=0.15,
+                lod_budget=10000, lod_bins=64, lod_dep_bins=8
                 ):
   """
   Plot an iteration space domain and related information.
@@ -362,6 +506,14 @@ def plot_domain(domain, dependences=None, tiling=None, space=None, processors_ma
                  around which is not plotted.
   :param border: Increase the size of the area filled with the background
                  by the value given as 'border'.
+  :param lod_budget: The number of domain points above which the plot
+                     switches to a level of detail that does not depend on
+                     the size of the domain: the points are drawn as density
+                     images of 'lod_bins' blocks per side, the dependences are
+                     summarized as one arrow per pair of tiles labeled with
+                     the number of dependences (per pair of blocks of a
+                     'lod_dep_bins' grid without tiling) and the tiles are
+                     only outlined. None never switches.
   """
 
   if space:
@@ -372,10 +524,22 @@ def plot_domain(domain, dependences=None, tiling=None, space=None, processors_ma
     if tiling:
       tiling = tiling.apply_domain(space)
 
+  if lod_budget is not None and domain.count_val().get_num_si() > lod_budget:
+    _plot_domain_lod(domain, dependences, tiling, processors_mapping, tile_color, tile_alpha,
+                     vertex_color, background, bg_vertex_color, dep_color, dep_style, dep_width,
+                     lod_bins, lod_dep_bins)
+    return
+
   if background:
-    hull = get_rectangular_hull(domain, 1)
-    plot_set_points(hull, color=bg_vertex_color, size=bg_vertex_size,
-                    marker=bg_vertex_marker)
+    box = get_bounding_box(domain, 1)
+    if box is not None and len(box) == 2:
+      points = box_get_points(box)
+      _plt.plot(points[:, 1], points[:, 0], bg_vertex_marker,
+                markersize=bg_vertex_size, color=bg_vertex_color, lw=0)
+    else:
+      hull = get_rectangular_hull(domain, 1)
+      plot_set_points(hull, color=bg_vertex_color, size=bg_vertex_size,
+                      marker=bg_vertex_marker)
 
   plot_set_points(domain, color=vertex_color, size=vertex_size,
                   marker=vertex_marker)
@@ -396,5 +560,35 @@ def plot_domain(domain, dependences=None, tiling=None, space=None, processors_ma
                        alpha=tile_alpha, border=border)
 
 
+
+def _plot_domain_lod(domain, dependences, tiling, processors_mapping, tile_color, tile_alpha,
+                     vertex_color, background, bg_vertex_color, dep_color, dep_style, dep_width,
+                     bins, dep_bins):
+  """
+  The level of detail of plot_domain for domains above the point budget.
+  """
+  ax: _plt.Axes = _plt.gca()
+  if background:
+    (min0, max0), (min1, max1) = _set_bounds(domain)
+    ax.add_patch(Rectangle((min1 - 1.5, min0 - 1.5), max1 - min1 + 3, max0 - min0 + 3,
+                           color=bg_vertex_color, linewidth=0, zorder=-1))
+
+  plot_set_density(domain, bins, color=vertex_color, ax=ax)
+
+  if dependences:
+    dependences = dependences.intersect_range(domain)
+    dependences = dependences.intersect_domain(domain)
+    groups = tiling if tiling else _grid_map(domain, _bin_size(domain, dep_bins))
+    plot_map_summary(dependences, groups.intersect_domain(domain), color=dep_color,
+                     style=dep_style, width=dep_width, ax=ax)
+
+  if tiling:
+    tiling = tiling.intersect_domain(domain)
+    plot_map_as_groups(tiling, processors_mapping, color=tile_color,
+                       alpha=tile_alpha, border=0, outline=True, ax=ax)
+  ax.autoscale_view()
+
+
 __all__ = ['plot_set_points', 'plot_bset_shape', 'plot_set_shapes',
-           'plot_map', 'plot_map_as_groups', 'plot_domain']
+           'plot_map', 'plot_map_as_groups', 'plot_domain',
+           'plot_set_density', 'plot_map_summary']
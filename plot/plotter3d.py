@@ -1,9 +1,10 @@
 import isl
-from typing import Tuple, Union, List
+from typing import Literal, Tuple, Union, List
 from plot.support import *
 import matplotlib.pyplot as _plt
 from mpl_toolkits.mplot3d import Axes3D
-from matplotlib.patches import FancyArrowPatch
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.transforms import IdentityTransform
 from mpl_toolkits.mplot3d.proj3d import proj_transform
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 import numpy as np
@@ -68,88 +69,101 @@ def plot_bset_shape_3d(ax: Axes3D, bset_data: isl.basic_set, show_vertices=False
     ax.add_collection3d(Poly3DCollection([vertices], color=color, alpha=alpha))
 
 
-class Arrow3D(FancyArrowPatch):
+class Arrows3D(LineCollection):
+    """
+    All the edges of a 3D plot as one artist. Every redraw projects the end
+    points of all edges in a single NumPy pass, then shrinks the shafts and
+    builds the arrow heads in display space, the way `FancyArrowPatch` does
+    for a single arrow.
+    """
 
-    def __init__(self, xyz, dxdydz, *args, **kwargs):
-        super().__init__((0, 0), (0, 0), *args, **kwargs)
-        self._xyz = xyz
-        self._dxdydz = dxdydz
-
-    def draw(self, renderer):
-        x1, y1, z1 = self._xyz
-        dx, dy, dz = self._dxdydz
-        x2, y2, z2 = (x1 + dx, y1 + dy, z1 + dz)
-
-        xs, ys, zs = proj_transform((x1, x2), (y1, y2), (z1, z2), self.axes.M)
-        self.set_positions((xs[0], ys[0]), (xs[1], ys[1]))
-        super().draw(renderer)
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, shrink=6, head_length=6, head_width=3,
+                 color="black", linewidth=1, **kwargs):
+        super().__init__([], colors=color, linewidths=linewidth, transform=IdentityTransform(), **kwargs)
+        self._xyz = np.concatenate([starts, ends]).reshape(-1, 3).T
+        self._projected = np.zeros((2, self._xyz.shape[1]))
+        self._shrink = shrink
+        self._head_length = head_length
+        self._head_width = head_width
+        self._heads = PolyCollection([], facecolors=color, edgecolors=color, linewidths=linewidth,
+                                     transform=IdentityTransform())
 
     def do_3d_projection(self, renderer=None):
-        x1, y1, z1 = self._xyz
-        dx, dy, dz = self._dxdydz
-        x2, y2, z2 = (x1 + dx, y1 + dy, z1 + dz)
-
-        xs, ys, zs = proj_transform((x1, x2), (y1, y2), (z1, z2), self.axes.M)
-        self.set_positions((xs[0], ys[0]), (xs[1], ys[1]))
+        xs, ys, zs = proj_transform(*self._xyz, self.axes.M)
+        self._projected = np.array([xs, ys])
+        return np.min(zs) if len(zs) else np.nan
 
-        return np.min(zs)
+    def draw(self, renderer):
+        n = self._projected.shape[1] // 2
+        points = self.axes.transData.transform(self._projected.T)
+        starts, ends = points[:n], points[n:]
+        delta = ends - starts
+        length = np.hypot(delta[:, 0], delta[:, 1])[:, None]
+        unit = np.divide(delta, length, out=np.zeros_like(delta), where=length > 0)
+        normal = unit[:, ::-1] * [-1, 1]
+        pixels = renderer.points_to_pixels(1)
+        starts = starts + unit * self._shrink * pixels
+        tips = ends - unit * self._shrink * pixels
+        base = tips - unit * self._head_length * pixels
+        half = normal * self._head_width * pixels
+        self.set_segments(np.stack([starts, base], axis=1))
+        super().draw(renderer)
+        self._heads.set_figure(self.figure)
+        self._heads.set_verts(np.stack([tips, base + half, base - half], axis=1))
+        self._heads.draw(renderer)
 
 
-def _plot_arrow(ax, xyz: Tuple[int, int, int], dxdydz: Tuple[int, int, int], *args, **kwargs):
-    arrow = Arrow3D(xyz, dxdydz, *args, **kwargs)
-    ax.add_artist(arrow)
+def _map_edges(bmap: isl.basic_map, scale=1) -> Tuple[np.ndarray, np.ndarray]:
+    """ the (range point, domain point) pairs of `bmap`, as reversed coordinates like `get_point_coordinates`. """
+    n_in = bmap.dim(isl.dim_type.IN)
+    pairs: List[List[int]] = []
+    bmap.wrap().foreach_point(lambda point: pairs.append(get_point_coordinates(point, scale)))
+    pairs = np.array(pairs, dtype=float).reshape(-1, n_in + bmap.dim(isl.dim_type.OUT))
+    return pairs[:, n_in:][:, ::-1], pairs[:, :n_in][:, ::-1]
 
 
-def plot_map_3d(map: Union[isl.map, isl.basic_map], edge_style="-|>", edge_width=1,
+def plot_map_3d(map: Union[isl.map, isl.basic_map], edge_style: Literal["-", "-|>"] = "-|>", edge_width=1,
                 start_color="blue", end_color="orange", line_color="black", marker_size=7,
                 scale=1, shrink=6, ax: Axes3D = None) -> Axes3D:
     """
-    Given a map from a two dimensional set to another two dimensional set this
-    functions prints the relations in this map as arrows going from the input
-    to the output element.
+    Given a map from a three dimensional set to another three dimensional set
+    this functions prints the relations in this map as arrows going from the
+    output to the input element. All the arrows of a map are one `Arrows3D`.
 
     :param map_datas: The islpy.Map to plot.
     :param color: The color of the arrows.
-    :param edge_style: The style used to plot the arrows.
+    :param edge_style: The style used to plot the arrows, '-' for no heads or
+                       '-|>' for filled heads at the end.
     :param edge_width: The width used to plot the arrows.
     :param shrink: The distance before around the start/end which is not plotted
                    to.
     :param scale: Scale the values.
     """
+    if edge_style not in ("-", "-|>"):
+        raise ValueError(f"unsupported edge_style {edge_style!r}, expected '-' or '-|>'")
     if ax is None:
         ax = _plt.subplot(projection='3d')
+    bmaps: List[isl.basic_map] = []
     if isinstance(map, isl.basic_map):
-        all_start: List[Tuple[int, int, int]] = []
-        all_ends: List[Tuple[int, int, int]] = []
-        start_points: List[isl.point] = []
-        map_datas: List[isl.basic_map] = []
-        map.foreach_basic_map(lambda bmap: map_datas.append(bmap))
-        for map_data in map_datas:
-            map_data.range().foreach_point(start_points.append)
-            for start in start_points:
-                end_points: List[isl.point] = []
-                limited = map_data.intersect_range(isl.set(start))
-                limited.domain().foreach_point(end_points.append)
-                s = get_point_coordinates(start, scale)
-                s.reverse()
-                all_start.append(s)
-                for end in end_points:
-                    e = get_point_coordinates(end, scale)
-                    e.reverse()
-                    all_ends.append(e)
-                    _plot_arrow(ax, s, [p[0] - p[1] for p in zip(e, s)],
-                                arrowstyle=edge_style, linewidth=edge_width, color=line_color, mutation_scale=edge_width*10,
-                                shrinkA=shrink, shrinkB=shrink)
-            ax.scatter([x[0] for x in all_start], [x[1] for x in all_start], [
-                       x[2] for x in all_start], color=start_color, marker="o", s=marker_size)
-            ax.scatter([x[0] for x in all_ends], [x[1] for x in all_ends], [
-                       x[2] for x in all_ends], color=end_color, marker="o", s=marker_size)
+        bmaps.append(map)
     elif isinstance(map, isl.map):
-        map.foreach_basic_map(lambda bmap: plot_map_3d(
-            bmap, edge_style, edge_width, start_color, end_color, line_color, marker_size, scale, shrink, ax))
+        map.foreach_basic_map(bmaps.append)
     elif isinstance(map, isl.union_map):
-        map.foreach_map(lambda bmap: plot_map_3d(
-            bmap, edge_style, edge_width, start_color, end_color, line_color, marker_size, scale, shrink, ax))
+        map.foreach_map(lambda m: m.foreach_basic_map(bmaps.append))
+    edges = [_map_edges(bmap, scale) for bmap in bmaps]
+    edges = [(starts, ends) for starts, ends in edges if len(starts)]
+    if not edges:
+        return ax
+    starts = np.concatenate([starts for starts, _ in edges])
+    ends = np.concatenate([ends for _, ends in edges])
+
+    head = edge_width * 10 if edge_style == "-|>" else 0
+    ax.add_collection(Arrows3D(starts, ends, shrink=shrink, head_length=head * 0.4, head_width=head * 0.2,
+                               color=line_color, linewidth=edge_width))
+    unique_starts = np.unique(starts, axis=0)
+    unique_ends = np.unique(ends, axis=0)
+    ax.scatter(*unique_starts.T, color=start_color, marker="o", s=marker_size)
+    ax.scatter(*unique_ends.T, color=end_color, marker="o", s=marker_size)
     return ax
 
 
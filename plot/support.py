@@ -360,7 +360,72 @@ def bset_get_points(uset: isl.union_set, only_hull=False, scale=1) -> List[List[
   return points
 
 
+def get_bounding_box(set_data: isl.set, offset=0) -> List[Tuple[int, int]]:
+  """
+  Get the integer minimum and maximum of each dimension of a set, widened by
+  'offset' on both sides.
+
+  Returns None if a bound is not a constant, e.g. if it depends on a
+  parameter.
+
+  :param set_data: The set to bound.
+  :param offset: The number of points added on each side of the box.
+  """
+  box = []
+  for dim in range(set_data.get_space().dim(isl.dim_type.SET)):
+    low = set_data.dim_min_val(dim)
+    high = set_data.dim_max_val(dim)
+    if not (low.is_int() and high.is_int()):
+      return None
+    box.append((low.get_num_si() - offset, high.get_num_si() + offset))
+  return box
+
+
+def box_to_set(space: isl.space, box: List[Tuple[int, int]]) -> isl.set:
+  """
+  Build the set of points of 'space' within the bounds of a box.
+  """
+  ls = isl.local_space.from_space(space)
+  bset_data = isl.basic_set.universe(space)
+  for dim, (low, high) in enumerate(box):
+    c = isl.constraint.alloc_inequality(ls)
+    c = c.set_coefficient_si(isl.dim_type.SET, dim, 1).set_constant_si(-low)
+    bset_data = bset_data.add_constraint(c)
+    c = isl.constraint.alloc_inequality(ls)
+    c = c.set_coefficient_si(isl.dim_type.SET, dim, -1).set_constant_si(high)
+    bset_data = bset_data.add_constraint(c)
+  return isl.set(bset_data)
+
+
+def box_get_points(box: List[Tuple[int, int]]) -> np.ndarray:
+  """
+  Get the points of a box as an (n, d) integer array, sorted in
+  lexicographic order like the points returned by bset_get_points.
+  """
+  axes = [np.arange(low, high + 1) for low, high in box]
+  grid = np.meshgrid(*axes, indexing="ij")
+  return np.stack(grid, -1).reshape(-1, len(box))
+
+
 def get_rectangular_hull(set_data: isl.set, offset=0):
+  """
+  Get the smallest box that contains a set, widened by 'offset' on each side.
+
+  The box is read from the integer minimum and maximum of each dimension. If
+  the bounds depend on the parameters, the box is built from the parametric
+  bounds of the first two dimensions instead.
+
+  :param set_data: The set to bound.
+  :param offset: The number of points added on each side of the box.
+  """
+  box = get_bounding_box(set_data, offset)
+  if box is None:
+    return _get_parametric_rectangular_hull(set_data, offset)
+  # the box has no parameters, keep the context of the set so fixed parameters stay fixed.
+  return box_to_set(set_data.get_space(), box).intersect_params(set_data.params())
+
+
+def _get_parametric_rectangular_hull(set_data: isl.set, offset=0):
   uset_data = isl.set.universe(set_data.get_space())
 
   for dim in range(0, 2):
@@ -439,4 +504,5 @@ def sort_points(points):
 
 __all__ = ['bset_get_vertex_coordinates', 'bset_get_faces', 'set_get_faces',
            'get_vertices_and_faces', 'get_point_coordinates', 'bset_get_points',
-           'get_rectangular_hull', 'sort_points']
+           'get_rectangular_hull', 'get_bounding_box', 'box_to_set',
+           'box_get_points', 'sort_points']
@@ -0,0 +1,13 @@
+import isl
+from utils.cache_sim import address_trace, array_layout, execution_order
+
+DOMAIN = "[N] -> { S[i] : 0 <= i < N and N = 8 }"
+
+
+def test_address_trace_with_fixed_params():
+  domain = isl.union_set(DOMAIN)
+  reads = isl.union_map("[N] -> { S[i] -> A[N - 1 - i] }")
+  layout = array_layout(domain, reads)
+  trace = address_trace(execution_order(domain, isl.union_map("{ S[i] -> [i] }")), reads, layout=layout,
+                        domain=domain)
+  assert trace.address.tolist() == [layout.base['A'] + 8 * (7 - i) for i in range(8)]
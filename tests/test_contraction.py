@@ -0,0 +1,37 @@
+import isl
+from utils.contraction import contract_arrays, storage_pullback
+
+DOMAIN = "{ S[i] : 0 <= i < 100; T[i] : 0 <= i < 100 }"
+SCHEDULE = "{ S[i] -> [i, 0]; T[i] -> [i, 1] }"
+# t[i] is written by S[i] and read by T[i] and T[i + 1], two elements are live at a time.
+READS = "{ S[i] -> x[i]; T[i] -> t[i]; T[i] -> t[i - 1] : i > 0 }"
+WRITES = "{ S[i] -> t[i]; T[i] -> y[i] }"
+
+
+def contractions():
+  return contract_arrays(isl.union_set(DOMAIN), isl.union_map(SCHEDULE), isl.union_map(READS),
+                         isl.union_map(WRITES), live_out=['y'])
+
+
+def test_contract_temporary():
+  c = contractions()
+  assert list(c) == ['t']
+  assert c['t'].contracted_shape == (2,)
+  assert c['t'].saved_bytes == 98 * 8
+
+
+def test_storage_pullback_on_ids_with_user_data():
+  # like the array ids of pet, which hold the declaration of the array.
+  array = isl.id("t", object())
+  index = isl.multi_pw_aff("{ T[i] -> t[i - 1] }").set_range_tuple(array)
+  iterator_map = isl.pw_multi_aff("{ [c0, c1] -> T[c0] }")
+  result = storage_pullback(contractions())(index, isl.id("ref"), iterator_map)
+  assert result.get_range_tuple_id().ptr == array.ptr
+  expected = isl.multi_pw_aff("{ [c0, c1] -> t[(c0 + 1) mod 2] }").set_range_tuple(array)
+  assert result.as_map().is_equal(expected.as_map())
+
+
+def test_storage_pullback_keeps_other_arrays():
+  index = isl.multi_pw_aff("{ T[i] -> y[i] }").set_range_tuple(isl.id("y", object()))
+  result = storage_pullback(contractions())(index, isl.id("ref"), isl.pw_multi_aff("{ [c0, c1] -> T[c0] }"))
+  assert result.as_map().is_equal(index.pullback(isl.pw_multi_aff("{ [c0, c1] -> T[c0] }")).as_map())
@@ -0,0 +1,32 @@
+import isl
+from utils.isl_util import insert_parallel_marks, parallel_pragmas
+
+
+def to_c(schedule: isl.schedule) -> str:
+  ast = isl.ast_build.from_context(isl.set("{ : }")).node_from(schedule)
+  printer = isl.printer.to_str().set_output_format(isl.format.C)
+  return parallel_pragmas(ast.print(printer, isl.ast_print_options.alloc()).get_str())
+
+
+def schedule(domain: str, validity: str = "{}") -> isl.schedule:
+  return isl.schedule_constraints.on_domain(isl.union_set(domain)) \
+      .set_validity(isl.union_map(validity)).set_coincidence(isl.union_map(validity)).compute_schedule()
+
+
+def test_unmarked_code_is_unchanged():
+  s = isl.schedule.from_domain(isl.union_set("{ S[i, j] : 0 <= i, j < 10; T[i] : 0 <= i < 10 }"))
+  s = s.insert_partial_schedule(isl.multi_union_pw_aff("[{ S[i, j] -> [(i)]; T[i] -> [(i)] }]"))
+  assert to_c(s) == isl.ast_build.from_context(isl.set("{ : }")).node_from(s).to_C_str()
+
+
+def test_parallel_simd():
+  code = to_c(insert_parallel_marks(schedule("{ S[i] : 0 <= i < 10 }"), isl.union_map("{ S[i] -> A[i] }")))
+  assert code.splitlines()[0] == "#pragma omp parallel for simd"
+
+
+def test_nested_marks_every_coincident_member():
+  # matmul, the reduction over k is carried by the innermost loop.
+  reduction = "{ S[i, j, k] -> S[i, j, k + 1] : 0 <= i, j < 8 and 0 <= k < 7 }"
+  s = schedule("{ S[i, j, k] : 0 <= i, j, k < 8 }", reduction)
+  assert to_c(insert_parallel_marks(s)).count("#pragma omp parallel for") == 1
+  assert to_c(insert_parallel_marks(s, nested=True)).count("#pragma omp parallel for") == 2
@@ -0,0 +1,9 @@
+import isl
+from plot.support import bset_get_points, get_rectangular_hull
+
+
+def test_rectangular_hull_keeps_fixed_params():
+  s = isl.set("[T, N] -> { S[t, i] : T = 5 and N = 10 and 0 <= t < T and t <= i < t + N }")
+  hull = get_rectangular_hull(s)
+  assert hull.params().is_equal(s.params())
+  assert len(bset_get_points(hull)) == 5 * 14
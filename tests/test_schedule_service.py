@@ -0,0 +1,43 @@
+import isl
+import pytest
+from utils.schedule_service import ScheduleService, identity_schedule, respects
+
+DOMAIN = "{ S1[i] : 0 <= i < 10; S2[i] : 0 <= i < 10 }"
+# S1 and S2 form a cycle carried by the shared loop.
+VALIDITY = "{ S1[i] -> S2[i] : 0 <= i < 10; S2[i] -> S1[i + 1] : 0 <= i < 9 }"
+
+
+def test_identity_schedule_keeps_cyclic_scc_in_shared_loop():
+  validity = isl.union_map(VALIDITY)
+  schedule = identity_schedule(isl.union_set(DOMAIN), validity)
+  assert respects(schedule, validity)
+
+
+def test_identity_schedule_orders_components():
+  validity = isl.union_map("{ S2[i] -> S1[j] : 0 <= i, j < 10 }")
+  schedule = identity_schedule(isl.union_set(DOMAIN), validity)
+  assert respects(schedule, validity)
+
+
+def test_identity_schedule_raises_when_illegal():
+  # a reversed loop cannot be expressed by the original loop order.
+  validity = isl.union_map("{ S1[i] -> S1[i - 1] : 0 < i < 10 }")
+  with pytest.raises(ValueError):
+    identity_schedule(isl.union_set("{ S1[i] : 0 <= i < 10 }"), validity)
+
+
+def test_timeout_falls_back_to_a_legal_schedule():
+  constraints = isl.schedule_constraints.on_domain(isl.union_set(DOMAIN)).set_validity(isl.union_map(VALIDITY))
+  result = ScheduleService(timeout=0).compute(constraints)
+  assert result.status == 'timeout'
+  assert respects(result.schedule, isl.union_map(VALIDITY))
+
+
+def test_illegal_fallback_raises():
+  constraints = isl.schedule_constraints.on_domain(isl.union_set(DOMAIN)).set_validity(isl.union_map(VALIDITY))
+  # S1 entirely before S2, which breaks S2[i] -> S1[i + 1].
+  sequential = isl.union_map("{ S1[i] -> [0, i]; S2[i] -> [1, i] }")
+  fallback = isl.schedule.from_domain(isl.union_set(DOMAIN)).insert_partial_schedule(
+      isl.multi_union_pw_aff.from_union_map(sequential))
+  with pytest.raises(ValueError):
+    ScheduleService(timeout=0).compute(constraints, fallback=fallback)
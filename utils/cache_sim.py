@@ -0,0 +1,370 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import isl
+from utils.isl_util import isl_mat_to_numpy
+
+
+@dataclass(frozen=True)
+class CacheModel:
+  """ a set associative cache with lru replacement, all sizes in bytes.
+    writes allocate a line like reads, so both count as accesses.
+  """
+  size: int = 32 * 1024
+  line: int = 64
+  ways: int = 8
+
+  @property
+  def sets(self) -> int:
+    assert self.size % (self.line * self.ways) == 0, "the size must be a multiple of line * ways"
+    return self.size // (self.line * self.ways)
+
+
+@dataclass
+class ExecutionOrder:
+  """ the statement instances of a domain in the order of a schedule.
+    row k is the k-th executed instance: `statement[k]` indexes `statements`, `instances[k]` holds its iterators
+    and `times[k]` its schedule time (both padded with zeros for statements of fewer dimensions).
+  """
+  statements: List[str]
+  statement: np.ndarray
+  instances: np.ndarray
+  times: np.ndarray
+
+  def __len__(self) -> int:
+    return len(self.statement)
+
+
+@dataclass
+class ArrayLayout:
+  """ row major arrays spanning the accessed elements, placed one after the other at line aligned addresses. """
+  base: Dict[str, int]
+  lower: Dict[str, np.ndarray]
+  strides: Dict[str, np.ndarray]
+  element_bytes: Dict[str, int]
+
+
+@dataclass
+class AddressTrace:
+  """ the accessed byte addresses in execution order, `array[k]` indexes `arrays` for the k-th access and
+    `instance[k]` is the row of the accessing instance in the execution order.
+  """
+  arrays: List[str]
+  array: np.ndarray
+  address: np.ndarray
+  instance: np.ndarray
+
+  def __len__(self) -> int:
+    return len(self.address)
+
+
+@dataclass
+class CacheReport:
+  accesses: Dict[str, int] = field(default_factory=dict)
+  misses: Dict[str, int] = field(default_factory=dict)
+
+  @property
+  def total_accesses(self) -> int:
+    return sum(self.accesses.values())
+
+  @property
+  def total_misses(self) -> int:
+    return sum(self.misses.values())
+
+  @property
+  def miss_ratio(self) -> float:
+    return self.total_misses / self.total_accesses if self.total_accesses else 0.0
+
+  def __str__(self) -> str:
+    lines = [f"{'array':<10} {'accesses':>10} {'misses':>10} {'ratio':>7}"]
+    for name, n in self.accesses.items():
+      lines.append(f"{name:<10} {n:>10} {self.misses[name]:>10} {self.misses[name] / n if n else 0:>7.3f}")
+    lines.append(f"{'total':<10} {self.total_accesses:>10} {self.total_misses:>10} {self.miss_ratio:>7.3f}")
+    return '\n'.join(lines)
+
+
+def _wrapped_points(m: isl.map) -> np.ndarray:
+  """ the [in..., out...] coordinates of every pair of a bounded map. """
+  n = m.dim(isl.dim_type.IN) + m.dim(isl.dim_type.OUT)
+  points: List[Tuple[int, ...]] = []
+  m.wrap().foreach_point(lambda p: points.append(
+      tuple(p.get_coordinate_val(isl.dim_type.SET, i).get_num_si() for i in range(n))))
+  return np.array(points, dtype=np.int64).reshape(len(points), n)
+
+
+def _maps(umap: isl.union_map) -> List[isl.map]:
+  maps = umap.map_list()
+  return [maps.at(k) for k in range(maps.size())]
+
+
+def _sets(uset: isl.union_set) -> List[isl.set]:
+  sets = uset.get_set_list()
+  return [sets.at(k) for k in range(sets.size())]
+
+
+def _sets_basic(s: isl.set) -> List[isl.basic_set]:
+  bsets = s.get_basic_set_list()
+  return [bsets.at(k) for k in range(bsets.size())]
+
+
+def _fix_params(s: isl.set) -> Optional[isl.set]:
+  """ `s` without its parameters if they have a single value, None otherwise. """
+  n = s.dim(isl.dim_type.PARAM)
+  if n == 0:
+    return s
+  params = s.params()
+  if not params.is_singleton():
+    return None
+  point = params.sample_point()
+  for i in range(n):
+    s = s.fix_si(isl.dim_type.PARAM, i, point.get_coordinate_val(isl.dim_type.PARAM, i).get_num_si())
+  return s.project_out(isl.dim_type.PARAM, 0, n)
+
+
+def _param_values(s: isl.set) -> Dict[str, int]:
+  """ the value of each parameter of `s` if they have a single value, as `_fix_params` fixes them. """
+  params = s.params()
+  if params.dim(isl.dim_type.PARAM) == 0 or not params.is_singleton():
+    return {}
+  point = params.sample_point()
+  return {params.get_dim_name(isl.dim_type.PARAM, i): point.get_coordinate_val(isl.dim_type.PARAM, i).get_num_si()
+          for i in range(params.dim(isl.dim_type.PARAM))}
+
+
+def set_points(s: isl.set) -> np.ndarray:
+  """ the (n, dims) points of a bounded set in lexicographic order.
+    the points of each disjoint basic set are selected from its bounding box by its constraints with numpy, sets with
+    existentially quantified variables or free parameters are enumerated point by point by isl.
+  """
+  n = s.dim(isl.dim_type.SET)
+  fixed = _fix_params(s)
+  bsets = _sets_basic(fixed.make_disjoint()) if fixed is not None else []
+  if fixed is None or any(bset.dim(isl.dim_type.DIV) for bset in bsets):
+    points = _wrapped_points(isl.map.from_domain(s))
+    return points[np.lexsort(points.T[::-1])] if n else points
+  parts = []
+  for bset in bsets:
+    if bset.is_empty():
+      continue
+    axes = [np.arange(bset.dim_min_val(i).get_num_si(), bset.dim_max_val(i).get_num_si() + 1) for i in range(n)]
+    points = np.stack(np.meshgrid(*axes, indexing='ij'), -1).reshape(-1, n)
+    keep = np.ones(len(points), dtype=bool)
+    order = (isl.dim_type.SET, isl.dim_type.PARAM, isl.dim_type.DIV, isl.dim_type.CST)
+    for matrix, equal in ((bset.inequalities_matrix(*order), False), (bset.equalities_matrix(*order), True)):
+      rows = isl_mat_to_numpy(matrix).reshape(matrix.rows(), matrix.cols())
+      if len(rows):
+        values = points @ rows[:, :n].T + rows[:, -1]
+        keep &= (values == 0).all(axis=1) if equal else (values >= 0).all(axis=1)
+    parts.append(points[keep])
+  if not parts:
+    return np.zeros((0, n), dtype=np.int64)
+  points = np.concatenate(parts)
+  return points[np.lexsort(points.T[::-1])] if n else points
+
+
+def execution_order(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule]) -> ExecutionOrder:
+  """ enumerate the instances of `domain` and sort them by their schedule time (lexicographically, ties are broken
+    by statement name then iterators, like the order of the statements in a sequence).
+  """
+  if isinstance(schedule, isl.schedule):
+    schedule = schedule.get_map()
+  maps = {m.get_tuple_name(isl.dim_type.IN): m for m in _maps(schedule.intersect_domain(domain))}
+  sets = sorted((s for s in _sets(domain) if s.get_tuple_name() in maps), key=lambda s: s.get_tuple_name())
+  n_in = max((s.dim(isl.dim_type.SET) for s in sets), default=0)
+  n_out = max((m.dim(isl.dim_type.OUT) for m in maps.values()), default=0)
+
+  statements, statement, instances, times = [], [], [], []
+  for s in sets:
+    m = maps[s.get_tuple_name()]
+    d_in = s.dim(isl.dim_type.SET)
+    affine = _affine_access(m, s)
+    if affine is not None:
+      points = set_points(s)
+      matrix, offset = affine
+      pairs = np.concatenate([points, points @ matrix.T + offset], axis=1)
+    else:
+      pairs = _wrapped_points(m)
+    statements.append(s.get_tuple_name())
+    statement.append(np.full(len(pairs), len(statements) - 1, dtype=np.int64))
+    instances.append(np.pad(pairs[:, :d_in], ((0, 0), (0, n_in - d_in))))
+    times.append(np.pad(pairs[:, d_in:], ((0, 0), (0, n_out - pairs.shape[1] + d_in))))
+  if not statements:
+    return ExecutionOrder([], np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.int64),
+                          np.zeros((0, 0), dtype=np.int64))
+  statement, instances, times = np.concatenate(statement), np.concatenate(instances), np.concatenate(times)
+
+  # lexsort sorts by its last key first.
+  keys = [instances[:, k] for k in reversed(range(n_in))] + [statement] + [times[:, k] for k in reversed(range(n_out))]
+  order = np.lexsort(keys) if keys else np.arange(len(statement))
+  return ExecutionOrder(statements, statement[order], instances[order], times[order])
+
+
+def array_layout(domain: isl.union_set, accesses: isl.union_map, element_bytes: Union[int, Dict[str, int]] = 8,
+                 line: int = 64) -> ArrayLayout:
+  """ a row major layout of each array of `accesses` covering the box of the elements accessed from `domain`. """
+  footprint = accesses.intersect_domain(domain).range()
+  set_list = footprint.get_set_list()
+  layout = ArrayLayout({}, {}, {}, {})
+  address = 0
+  for k in range(set_list.size()):
+    s = set_list.at(k)
+    name = s.get_tuple_name()
+    n = s.dim(isl.dim_type.SET)
+    lower = np.array([s.dim_min_val(i).get_num_si() for i in range(n)], dtype=np.int64)
+    upper = np.array([s.dim_max_val(i).get_num_si() for i in range(n)], dtype=np.int64)
+    extents = upper - lower + 1
+    size = element_bytes if isinstance(element_bytes, int) else element_bytes.get(name, 8)
+    layout.base[name] = address
+    layout.lower[name] = lower
+    layout.strides[name] = np.array([int(np.prod(extents[i + 1:])) for i in range(n)], dtype=np.int64) * size
+    layout.element_bytes[name] = size
+    address += -(-int(np.prod(extents)) * size // line) * line
+  return layout
+
+
+def _affine_access(access: isl.map, domain: isl.set) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+  """ the integer matrix and offset of `access` as a single affine function on `domain`, if it is one. """
+  if not access.is_single_valued():
+    return None
+  pieces = []
+  access.as_pw_multi_aff().foreach_piece(lambda s, ma: pieces.append((s, ma)))
+  if len(pieces) != 1 or not domain.is_subset(pieces[0][0]):
+    return None
+  ma = pieces[0][1]
+  n_in = access.dim(isl.dim_type.IN)
+  params = _param_values(domain)
+  matrix = np.zeros((ma.size(), n_in), dtype=np.int64)
+  offset = np.zeros(ma.size(), dtype=np.int64)
+  for i in range(ma.size()):
+    aff = ma.at(i)
+    if aff.dim(isl.dim_type.DIV) or not aff.get_denominator_val().is_one():
+      return None
+    for j in range(n_in):
+      matrix[i, j] = aff.get_coefficient_val(isl.dim_type.IN, j).get_num_si()
+    offset[i] = aff.get_constant_val().get_num_si()
+    # the parameters are fixed on the domain, their terms are constants.
+    for k in range(aff.dim(isl.dim_type.PARAM)):
+      coefficient = aff.get_coefficient_val(isl.dim_type.PARAM, k).get_num_si()
+      if coefficient:
+        name = aff.get_dim_name(isl.dim_type.PARAM, k)
+        if name not in params:
+          return None
+        offset[i] += coefficient * params[name]
+  return matrix, offset
+
+
+def _accessed_elements(access: isl.map, domain: isl.set, instances: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+  """ the elements each of `instances` accesses, one (elements, valid) pair per element of the most accessing
+    instance, `valid` marks the instances accessing that many elements.
+  """
+  affine = _affine_access(access, domain)
+  if affine is not None:
+    matrix, offset = affine
+    return [(instances @ matrix.T + offset, np.ones(len(instances), dtype=bool))]
+
+  # a piecewise, quasi affine or multi valued access, enumerated pair by pair.
+  n_in = access.dim(isl.dim_type.IN)
+  elements: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+  for pair in _wrapped_points(access.intersect_domain(domain)):
+    elements.setdefault(tuple(pair[:n_in]), []).append(pair[n_in:])
+  width = max((len(v) for v in elements.values()), default=0)
+  result = [(np.zeros((len(instances), access.dim(isl.dim_type.OUT)), dtype=np.int64),
+             np.zeros(len(instances), dtype=bool)) for _ in range(width)]
+  for row, instance in enumerate(instances):
+    for k, element in enumerate(elements.get(tuple(instance), [])):
+      result[k][0][row] = element
+      result[k][1][row] = True
+  return result
+
+
+def address_trace(order: ExecutionOrder, reads: isl.union_map, writes: Optional[isl.union_map] = None,
+                  layout: Optional[ArrayLayout] = None, domain: Optional[isl.union_set] = None) -> AddressTrace:
+  """ replay the accesses of the instances in execution order, each instance reads before it writes.
+    the accesses of one statement follow the order of the maps in `reads` and `writes`.
+  """
+  accesses = reads if writes is None else reads.union(writes)
+  relations = _maps(reads) + (_maps(writes) if writes is not None else [])
+  if domain is None:
+    domain = accesses.domain()
+  if layout is None:
+    layout = array_layout(domain, accesses)
+  arrays = list(layout.base)
+
+  columns: Dict[str, List[isl.map]] = {name: [] for name in order.statements}
+  for access in relations:
+    stmt = access.get_tuple_name(isl.dim_type.IN)
+    if stmt in columns:
+      columns[stmt].append(access)
+  set_list = domain.get_set_list()
+  statement_domains = {set_list.at(k).get_tuple_name(): set_list.at(k) for k in range(set_list.size())}
+
+  # one column per accessed element of each statement, the other statements leave it empty (-1).
+  address_columns: List[np.ndarray] = []
+  array_columns: List[np.ndarray] = []
+  for stmt_id, stmt in enumerate(order.statements):
+    rows = np.nonzero(order.statement == stmt_id)[0]
+    for access in columns[stmt]:
+      d_in = access.dim(isl.dim_type.IN)
+      name = access.get_tuple_name(isl.dim_type.OUT)
+      for elements, valid in _accessed_elements(access, statement_domains[stmt], order.instances[rows, :d_in]):
+        address = np.full(len(order), -1, dtype=np.int64)
+        address[rows[valid]] = layout.base[name] + (elements[valid] - layout.lower[name]) @ layout.strides[name]
+        array = np.full(len(order), -1, dtype=np.int64)
+        array[rows[valid]] = arrays.index(name)
+        address_columns.append(address)
+        array_columns.append(array)
+  if not address_columns:
+    return AddressTrace(arrays, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+  # row major, the accesses of an instance stay together and in column order.
+  address = np.stack(address_columns, axis=1).reshape(-1)
+  array = np.stack(array_columns, axis=1).reshape(-1)
+  instance = np.repeat(np.arange(len(order)), len(address_columns))
+  valid = array >= 0
+  return AddressTrace(arrays, array[valid], address[valid], instance[valid])
+
+
+def simulate_cache(trace: AddressTrace, cache: CacheModel = CacheModel()) -> CacheReport:
+  """ feed an address trace through `cache`, counting the accesses and misses of each array. """
+  lines = trace.address // cache.line
+  sets = cache.sets
+  miss = np.zeros(len(lines), dtype=bool)
+
+  # an access to the line of the previous access always hits, only the others need the lru state.
+  candidates = np.ones(len(lines), dtype=bool)
+  candidates[1:] = lines[1:] != lines[:-1]
+  state = [OrderedDict() for _ in range(sets)]
+  for k in np.nonzero(candidates)[0]:
+    line = int(lines[k])
+    ways = state[line % sets]
+    if line in ways:
+      ways.move_to_end(line)
+    else:
+      miss[k] = True
+      ways[line] = None
+      if len(ways) > cache.ways:
+        ways.popitem(last=False)
+
+  accesses = np.bincount(trace.array, minlength=len(trace.arrays))
+  misses = np.bincount(trace.array[miss], minlength=len(trace.arrays))
+  return CacheReport({name: int(accesses[i]) for i, name in enumerate(trace.arrays)},
+                     {name: int(misses[i]) for i, name in enumerate(trace.arrays)})
+
+
+def simulate(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule], reads: isl.union_map,
+             writes: Optional[isl.union_map] = None, cache: CacheModel = CacheModel(),
+             element_bytes: Union[int, Dict[str, int]] = 8) -> CacheReport:
+  """ the cache misses of executing `domain` in the order of `schedule`, without compiling it. """
+  accesses = reads if writes is None else reads.union(writes)
+  layout = array_layout(domain, accesses, element_bytes, cache.line)
+  order = execution_order(domain, schedule)
+  return simulate_cache(address_trace(order, reads, writes, layout, domain), cache)
+
+
+def rank_schedules(domain: isl.union_set, schedules: Dict[str, Union[isl.union_map, isl.schedule]],
+                   reads: isl.union_map, writes: Optional[isl.union_map] = None,
+                   cache: CacheModel = CacheModel()) -> List[Tuple[str, CacheReport]]:
+  """ the schedules sorted by their total number of misses, the one with the best locality first. """
+  reports = [(name, simulate(domain, schedule, reads, writes, cache)) for name, schedule in schedules.items()]
+  return sorted(reports, key=lambda r: r[1].total_misses)
@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import math
+import isl
+from utils.cache_sim import _maps
+
+
+@dataclass
+class Contraction:
+  """ the modular storage of an array, element `e` lives at `mapping(e)`, that is `e[k] mod moduli[k]`
+    (a modulus of None keeps the dimension as is). `shape` is the box of the accessed elements before the
+    contraction and `contracted_shape` the size of the new storage.
+  """
+  array: str
+  shape: Tuple[int, ...]
+  moduli: Tuple[Optional[int], ...]
+  mapping: isl.multi_aff
+  element_bytes: int = 8
+
+  @property
+  def contracted_shape(self) -> Tuple[int, ...]:
+    return tuple(n if m is None else m for n, m in zip(self.shape, self.moduli))
+
+  @property
+  def bytes(self) -> int:
+    return math.prod(self.shape) * self.element_bytes
+
+  @property
+  def contracted_bytes(self) -> int:
+    return math.prod(self.contracted_shape) * self.element_bytes
+
+  @property
+  def saved_bytes(self) -> int:
+    return self.bytes - self.contracted_bytes
+
+  def __str__(self) -> str:
+    shape = 'x'.join(map(str, self.shape))
+    contracted = 'x'.join(map(str, self.contracted_shape))
+    return f"{self.array}: {shape} -> {contracted}, saved {self.saved_bytes} bytes ({self.mapping})"
+
+
+def _time_map(schedule: Union[isl.union_map, isl.schedule]) -> isl.union_map:
+  """ the schedule as a union map into a single anonymous time space, shorter times are padded with zeros. """
+  if isinstance(schedule, isl.schedule):
+    schedule = schedule.get_map()
+  maps = _maps(schedule)
+  n_out = max((m.dim(isl.dim_type.OUT) for m in maps), default=0)
+  result = isl.union_map.empty()
+  for m in maps:
+    n = m.dim(isl.dim_type.OUT)
+    m = m.add_dims(isl.dim_type.OUT, n_out - n)
+    for k in range(n, n_out):
+      m = m.fix_si(isl.dim_type.OUT, k, 0)
+    result = result.union(isl.union_map(m.reset_tuple_id(isl.dim_type.OUT)))
+  return result
+
+
+def _array_accesses(accesses: isl.union_map) -> Dict[str, isl.union_map]:
+  arrays: Dict[str, isl.union_map] = {}
+  for m in _maps(accesses):
+    name = m.get_tuple_name(isl.dim_type.OUT)
+    arrays[name] = isl.union_map(m) if name not in arrays else arrays[name].union(isl.union_map(m))
+  return arrays
+
+
+def _has_live_in(reads: isl.union_map, writes: isl.union_map, times: isl.union_map) -> bool:
+  """ whether some read of the array may see a value from before the scop. """
+  info = isl.union_access_info(reads).set_must_source(writes).set_schedule_map(times)
+  return not info.compute_flow().get_may_no_source().is_empty()
+
+
+def live_elements(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule], reads: isl.union_map,
+                  writes: isl.union_map) -> isl.union_map:
+  """ { A[e] -> S[i] } the elements of each array live at each statement instance, from the first write of the
+    element to its last access (bounds included). an element written again in between stays live, which may keep
+    apart elements that could share storage but is always safe.
+  """
+  times = _time_map(schedule).intersect_domain(domain)
+  reads, writes = reads.intersect_domain(domain), writes.intersect_domain(domain)
+  first = writes.reverse().apply_range(times).lexmin()
+  last = reads.union(writes).reverse().apply_range(times).lexmax()
+  return first.lex_le_union_map(times).intersect(last.lex_ge_union_map(times))
+
+
+def _max_val(s: isl.set, k: int) -> Optional[int]:
+  value = s.dim_max_val(k)
+  return value.get_num_si() if value.is_int() else None
+
+
+def successive_moduli(differences: isl.set) -> List[Optional[int]]:
+  """ the moduli of the successive modulo storage mapping for the differences of conflicting elements.
+    dimension k gets 1 + the largest distance along k between conflicting elements equal on the first k
+    dimensions, so two distinct conflicting elements always differ modulo the first dimension they differ on.
+    None keeps a dimension whose distances are unbounded.
+  """
+  n = differences.dim(isl.dim_type.SET)
+  zero = isl.set.universe(differences.get_space())
+  for k in range(n):
+    zero = zero.fix_si(isl.dim_type.SET, k, 0)
+  prefix = differences.subtract(zero)
+  moduli: List[Optional[int]] = []
+  for k in range(n):
+    if prefix.is_empty():
+      moduli.append(1)
+      continue
+    distance = _max_val(prefix, k)
+    moduli.append(None if distance is None else distance + 1)
+    prefix = prefix.fix_si(isl.dim_type.SET, k, 0)
+  return moduli
+
+
+def _mapping(name: str, moduli: List[Optional[int]]) -> isl.multi_aff:
+  """ { A[e] -> A[e mod moduli] } """
+  iterators = [f"e{k}" for k in range(len(moduli))]
+  indices = [e if m is None else f"({e}) mod {m}" for e, m in zip(iterators, moduli)]
+  return isl.multi_aff(f"{{ {name}[{', '.join(iterators)}] -> {name}[{', '.join(indices)}] }}")
+
+
+def contract_arrays(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule], reads: isl.union_map,
+                    writes: isl.union_map, live_out: Iterable[str] = (),
+                    element_bytes: Union[int, Dict[str, int]] = 8) -> Dict[str, Contraction]:
+  """ the modular storage of every array written in the scop that can be smaller than its accessed box under
+    `schedule`. arrays of `live_out`, arrays whose initial values are read and arrays of parametric size
+    keep their storage. two elements may share a location unless they are live at the same instance.
+  """
+  times = _time_map(schedule)
+  array_reads = _array_accesses(reads.intersect_domain(domain))
+  array_writes = _array_accesses(writes.intersect_domain(domain))
+  live_out = set(live_out)
+  contractions: Dict[str, Contraction] = {}
+  for name, array_write in array_writes.items():
+    array_read = array_reads.get(name, isl.union_map.empty())
+    if name in live_out or _has_live_in(array_read, array_write, times):
+      continue
+    footprint = array_read.union(array_write).range().get_set_list().at(0)
+    n = footprint.dim(isl.dim_type.SET)
+    lower = [footprint.dim_min_val(k) for k in range(n)]
+    upper = [footprint.dim_max_val(k) for k in range(n)]
+    if not all(v.is_int() for v in lower + upper):
+      continue
+    shape = tuple(upper[k].get_num_si() - lower[k].get_num_si() + 1 for k in range(n))
+
+    live = live_elements(domain, times, array_read, array_write)
+    differences = live.apply_range(live.reverse()).deltas().get_set_list().at(0)
+    moduli = successive_moduli(differences)
+    # a modulus as large as the dimension saves nothing, keep the index as is.
+    moduli = [None if m is None or m >= extent else m for m, extent in zip(moduli, shape)]
+    if all(m is None for m in moduli):
+      continue
+    size = element_bytes if isinstance(element_bytes, int) else element_bytes.get(name, 8)
+    contractions[name] = Contraction(name, shape, tuple(moduli), _mapping(name, moduli), size)
+  return contractions
+
+
+def contract_accesses(accesses: isl.union_map, contractions: Dict[str, Contraction]) -> isl.union_map:
+  """ the accesses to the contracted storage. """
+  result = isl.union_map.empty()
+  for m in _maps(accesses):
+    name = m.get_tuple_name(isl.dim_type.OUT)
+    if name in contractions:
+      m = m.apply_range(contractions[name].mapping.as_map())
+    result = result.union(isl.union_map(m))
+  return result
+
+
+def storage_pullback(contractions: Dict[str, Contraction]) -> Callable[[isl.multi_pw_aff, isl.id, isl.pw_multi_aff],
+                                                                      isl.multi_pw_aff]:
+  """ a `custom_pullback` for `CodeGenerator` that also rewrites the index expressions of contracted arrays.
+    the declarations of the temporaries are outside the scop, they must be resized to `contracted_shape`.
+  """
+  def pullback(index: isl.multi_pw_aff, id: isl.id, iterator_map: isl.pw_multi_aff) -> isl.multi_pw_aff:
+    index = index.pullback(iterator_map)
+    if index.has_range_tuple_id():
+      array = index.get_range_tuple_id()
+      if array.name() in contractions:
+        # pet gives the array ids the declaration as user data, the mapping must be on the very same id.
+        mapping = contractions[array.name()].mapping
+        mapping = mapping.set_tuple_id(isl.dim_type.IN, array).set_range_tuple(array)
+        return isl.multi_pw_aff(mapping).pullback(index)
+    return index
+  return pullback
+
+
+def contraction_report(contractions: Dict[str, Contraction]) -> str:
+  """ the storage saved per array and in total. """
+  rows = [str(c) for c in contractions.values()]
+  rows.append(f"total saved {sum(c.saved_bytes for c in contractions.values())} bytes")
+  return '\n'.join(rows)
@@ -0,0 +1,1798 @@
+from abc import abstractmethod
+from typing import Tuple, Union, TextIO, List, Dict, Optional, Any, Callable, Sequence, cast, NamedTuple
+
+from io import FileIO
+from dataclasses import dataclass, replace, field
+from functools import reduce
+from itertools import chain, product
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import json
+import hashlib
+import inspect
+import more_itertools as itertools
+from enum import IntEnum
+from xdsl.dialects import arith, builtin, tensor, linalg, func
+from xdsl.frontend.pyast.context import PyASTContext, TypeRegistry
+from xdsl.frontend.pyast.code_generation import CodeGeneration, CodeGenerationVisitor
+from xdsl import ir
+from xdsl.irdl import irdl_op_definition, IRDLOperation, prop_def, result_def, operand_def, var_operand_def, attr_def
+from xdsl import passes
+import dowhen
+import isl
+
+
+class ParameterizedTypeRegistry(TypeRegistry):
+  def __init__(self):
+    super().__init__()
+    self._generic_mapping: dict[type, type] = {}
+
+  def resolve_attribute(
+      self, annotation_name: str, globals: dict[str, Any]
+  ) -> ir.TypeAttribute | None:
+    """Get an IR type attribute from a string annotation."""
+    annotation = cast(
+        type,
+        eval(annotation_name, globals, None),
+    )
+    if isinstance(annotation, ir.TypeAttribute):
+      return annotation
+    return self._mapping.get(annotation, None)
+
+  def get_annotation(self, attribute: ir.TypeAttribute) -> type | None:
+    anno = super().get_annotation(attribute)
+    if anno is None:
+      for key, value in self._generic_mapping.items():
+        if value == type(attribute):
+          return key
+    return anno
+
+  def register_param_type(self, annotation: type,
+                          attributeType: type):
+    self._generic_mapping[annotation] = attributeType
+
+
+class MyCodeGenVisitor(CodeGenerationVisitor):
+  def parse_op(self, ir_type, func_name, args: tuple):
+    ir_type = cast(ir.TypeAttribute, ir_type)
+    source_type = self.type_converter.type_registry.get_annotation(ir_type)
+    assert source_type
+    function_name = f"{source_type.__qualname__}.{func_name}"
+    op = self.type_converter.function_registry.resolve_operation(
+        module_name=source_type.__module__,
+        method_name=function_name,
+        args=args,
+    )
+    assert op
+    self.inserter.insert_op(op)
+
+  def visit_Subscript(self, node):
+    self.visit(node.slice)
+    elts = [self.inserter.get_operand() for i in range(len(node.slice.elts))]
+    self.visit(node.value)
+    value = self.inserter.get_operand()
+    self.parse_op(value.type, '__getitem__', (value, elts[::-1]))
+
+  def visit_Tuple(self, node):
+    for elt in node.elts:
+      self.visit(elt)
+
+  def visit_Assign(self, node) -> None:
+    self.visit(node.targets[0])
+    target = self.inserter.get_operand()
+    self.visit(node.value)
+    value = self.inserter.get_operand()
+    self.inserter.insert_op(AssignOp(target, value))
+
+
+dowhen.when(CodeGeneration.run_with_type_converter, "+9").do(
+    lambda type_converter, module, file:
+    {"visitor": MyCodeGenVisitor(type_converter, module, file)})
+
+
+class IterKind(IntEnum):
+  Serial = 0
+  Distributed = 1
+  Tensorize = 2
+
+
+class UsageKind(IntEnum):
+  Input = 0
+  Output = 1
+  Const = 2
+
+
+@dataclass(frozen=True)
+class Expr:
+
+  def __add__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('+', self, other)
+
+  def __sub__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('-', self, other)
+
+  def __mul__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('*', self, other)
+
+  def __floordiv__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('//', self, other)
+
+  def __truediv__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('/', self, other)
+
+  def __mod__(self, other: 'Expr') -> 'Expr':
+    return Binary.create('%', self, other)
+
+  @abstractmethod
+  def walk(fn: Callable[['Expr'], None]):
+    pass
+
+
+@dataclass(frozen=True)
+class Const(Expr):
+  value: int
+
+  def __str__(self):
+    return str(self.value)
+
+  def walk(self, fn: Callable[['Expr'], None]):
+    fn(self)
+
+
+@dataclass(frozen=True)
+class IterVar(Expr):
+  name: str
+  lower_bound: int | None
+  upper_bound: int | None
+  step: int = 1
+
+  @property
+  def extent(self) -> int:
+    return self.upper_bound - self.lower_bound
+
+  @staticmethod
+  def range(name: str, extent: int):
+    return IterVar(name, 0, extent, 1)
+
+  @staticmethod
+  def symbol(name: str):
+    vars = tuple(map(lambda s: IterVar(s, None, None, 1), name.split(' ')))
+    return vars[0] if len(vars) == 1 else vars
+
+  def __hash__(self):
+    return hash((self.name, self.lower_bound, self.upper_bound, self.step))
+
+  def __str__(self):
+    return self.name
+
+  def walk(self, fn: Callable[['Expr'], None]):
+    fn(self)
+
+
+@dataclass(frozen=True)
+class Binary(Expr):
+  op: str
+  lhs: Expr
+  rhs: Expr
+
+  @staticmethod
+  def create(op: str, lhs: Expr, rhs: Expr):
+    match lhs:
+      case int():
+        lhs = Const(lhs)
+      case Expr():
+        pass
+      case _:
+        raise TypeError(f"Unsupported left-hand side operand type: {type(lhs)}")
+    match rhs:
+      case int():
+        rhs = Const(rhs)
+      case Expr():
+        pass
+      case _:
+        raise TypeError(f"Unsupported right-hand side operand type: {type(rhs)}")
+
+    return Binary(op=op, lhs=lhs, rhs=rhs)
+
+  def __str__(self):
+    return f"({self.lhs} {self.op} {self.rhs})"
+
+  def walk(self, fn: Callable[['Expr'], None]):
+    self.lhs.walk(fn)
+    self.rhs.walk(fn)
+    fn(self)
+
+
+@dataclass(frozen=True)
+class Buffer:
+  name: str
+  dims: tuple[int | IterVar, ...]
+  dtype: type = float
+  sharding: None | isl.map = None
+  usage: UsageKind = UsageKind.Input
+
+  @property
+  def shape(self) -> tuple[int | IterVar, ...]:
+    return tuple(d for d in self.dims)
+
+  @property
+  def domain(self) -> isl.set:
+    def render(i): return f'0 <= d{i} < {self.dims[i]}' if isinstance(
+        self.dims[i], int) else f'{self.dims[i].lower_bound} <= d{i} < {self.dims[i].upper_bound}'
+    return isl.set(f"{{ {self.name}[{','.join([f'd{i}' for i in range(len(self.dims))])}] : {' and '.join([render(i) for i in range(len(self.dims))])} }}")
+
+  def __hash__(self):
+    return hash((self.name, self.dims, self.dtype, str(self.sharding)))
+
+  @classmethod
+  def __class_getitem__(cls, args):
+    elem_type = None
+    if issubclass(args[0], float):
+      elem_type = builtin.f32
+    elif issubclass(args[0], int):
+      elem_type = builtin.i32
+    else:
+      raise TypeError(f"Unsupported element type: {args[0]}")
+    return builtin.MemRefType(elem_type, [builtin.IntAttr(arg) for arg in args[1]])
+
+  def __setitem__(cls, args):
+    raise NotImplementedError()
+
+  def __getitem__(cls, args):
+    raise NotImplementedError()
+
+  def __iadd__(self, value):
+    raise NotImplementedError()
+
+  def __matmul__(self, value):
+    raise NotImplementedError()
+
+
+@irdl_op_definition
+class AccessOp(IRDLOperation):
+  name = "buffer.access"
+
+  buffer = operand_def(builtin.MemRefType)
+  indices = var_operand_def(builtin.IndexType)
+  result = result_def(builtin.Attribute)
+
+  def __init__(
+      self,
+      buffer: ir.SSAValue,
+      indices: Sequence[ir.SSAValue] | ir.SSAValue,
+      result_type: ir.Attribute,
+  ):
+    return super().__init__(operands=[buffer, indices], result_types=[result_type])
+
+
+@irdl_op_definition
+class AssignOp(IRDLOperation):
+  name = "tensor.assign"
+
+  target = operand_def(ir.TypeAttribute)
+  value = operand_def(ir.TypeAttribute)
+
+  def __init__(
+      self,
+      target: ir.SSAValue,
+      value: ir.SSAValue,
+  ):
+    return super().__init__(operands=[target, value],
+                            result_types=[])
+
+
+type_registry = ParameterizedTypeRegistry()
+type_registry.register_param_type(Buffer, builtin.MemRefType)
+ctx = PyASTContext(type_registry)
+ctx.register_type(float, builtin.f32)
+ctx.register_type(IterVar, builtin.IndexType())
+ctx.register_function(Buffer.__getitem__, lambda *args:
+                      AccessOp(args[0], args[1], args[0].type.element_type))
+ctx.register_function(Buffer.__setitem__, lambda *args:
+                      AssignOp(args[0], args[1]))
+ctx.register_function(float.__mul__, arith.MulfOp)
+
+
+@dataclass(frozen=True)
+class Mesh:
+  dims: tuple[IterVar, ...]
+
+  @property
+  def shape(self) -> tuple[int, ...]:
+    return tuple(var.extent for var in self.dims)
+
+  @property
+  def domain(self) -> isl.set:
+    return isl.set(f"{{ Mesh[{','.join(map(str, self.dims))}] : {' and '.join([f'{dim.lower_bound} <= {dim} < {dim.upper_bound}' for dim in self.dims])} }}")
+
+
+@dataclass(frozen=True)
+class Access:
+  buffer: Buffer
+  relation: isl.map
+
+  def __hash__(self):
+    return hash((self.buffer, str(self.relation)))
+
+@dataclass(frozen=True)
+class Transfer:
+  access: Access
+  schedule: isl.map
+
+class AccessDimIndex(NamedTuple):
+  access_idx: int
+  buffer_dim: int
+
+@dataclass(frozen=True)
+class Computation:
+  op: str
+  domain: isl.set
+  schedule: isl.map
+  accesses: List[Access]
+  iter_vars: tuple[IterVar]
+  mesh: Mesh | None = None
+  iter_kinds: dict[IterVar, IterKind] = field(default_factory=dict)
+  dim_bindings: dict[int, List[AccessDimIndex]] = field(default_factory=dict)
+  transfers: dict[IterVar, Tuple[Transfer, ...]] = field(default_factory=dict)
+
+  def name(self):
+    return self.domain.get_tuple_name()
+
+
+class IndexCollector:
+  def __init__(self, iter_set: set[IterVar]):
+    self.iter_set: set[IterVar] = iter_set
+
+  def collect(self, node: ir.IRWithUses):
+    # todo support complex index pattern
+    match node:
+      case ir.BlockArgument():
+        match node.type:
+          case builtin.IndexType():
+            iter_var = IterVar.symbol(node.name_hint)
+            self.iter_set.add(iter_var)
+            return iter_var
+      case _:
+        raise NotImplementedError("Unsupported index node")
+
+
+class StmtCollector:
+  def __init__(self, stmt_name: str, shapes: Dict[str, Sequence[int]] = {}):
+    self.stmt_name = stmt_name
+    self.shapes = shapes
+    self.iter_set: set[IterVar] = set()
+    self.access_dict: dict[AccessOp, (Buffer, list[ir.Operation])] = {}
+    self.op: str = None
+    self.on_value = False
+
+  def visit(self, node: ir.IRWithUses):
+    match node:
+      case ir.BlockArgument():
+        match node.type:
+          case builtin.MemRefType():
+            dims = tuple(self.shapes.get(node.name_hint, [dim.data for dim in node.type.shape]))
+            return Buffer(node.name_hint, dims, node.type.element_type, usage=UsageKind.Input if self.on_value else UsageKind.Output)
+          case _:
+            return
+      case ir.SSAValue() | ir.Operation():
+        op = node if isinstance(node, ir.Operation) else node.owner
+        match op:
+          case AssignOp():
+            self.on_value = False
+            self.visit(op.target)
+            self.on_value = True
+            self.visit(op.value)
+            self.on_value = False
+          case AccessOp():
+            b: Buffer = self.visit(op.buffer)
+            indices = [IndexCollector(self.iter_set).collect(i) for i in op.indices]
+            self.access_dict[op] = (b, indices)
+          case arith.MulfOp():
+            assert self.op is None
+            self.op = op.name
+            self.visit(op.lhs)
+            self.visit(op.rhs)
+
+
+class PolyhedronExtractPass(passes.ModulePass):
+  name = "polyhedron_analysis"
+
+  def __init__(self, shapes: Dict[str, Sequence[int]] = {}):
+    self.computations: list[Computation] = []
+    self.shapes = shapes
+    return super().__init__()
+
+  def analysis_stmt(self, op: AssignOp):
+    assert len(self.computations) == 0, "not support stmts more than 1"
+    stmt_name = f's{len(self.computations)}'
+    c = StmtCollector(stmt_name, self.shapes)
+    c.visit(op)
+    accesses = []
+    iters = sorted(c.iter_set, key=lambda i: i.name)
+    domain_dims = list(map(lambda x: x.name, iters))
+    domain = isl.set(f"{{ {stmt_name}[{','.join(domain_dims)}] }}")
+    bounded_iters: dict[str, IterVar] = {}
+    dim_bindings: dict[int, List[Tuple[int, int]]] = {}
+    for (bf, indices) in c.access_dict.values():
+      relation = isl.map(
+          f"{{ {stmt_name}[{','.join(domain_dims)}] -> {bf.name}[{','.join(map(lambda x: x.name, indices))}]}}")
+      domain = domain.intersect(relation.intersect_range(bf.domain).domain())
+      for i, idx in enumerate(indices):
+        if idx.name not in bounded_iters:
+          bounded_iters[idx.name] = replace(idx, lower_bound=bf.domain.dim_min_val(
+              i).num_si(), upper_bound=bf.domain.dim_max_val(i).num_si() + 1)
+      access = Access(replace(bf, dims=tuple(
+          [bounded_iters[idx.name] for idx in indices])), relation)
+      accesses.append(access)
+      for i, idx in enumerate(indices):
+        j = iters.index(idx)
+        binding = dim_bindings.get(j, [])
+        binding.append(AccessDimIndex(len(accesses) - 1, i))
+        dim_bindings[j] = binding
+
+    comp = Computation(c.op, domain, domain.identity(), accesses,
+                       tuple([bounded_iters[v.name] for v in iters]), dim_bindings=dim_bindings)
+    self.computations.append(comp)
+
+  def analysis_op(self, op: ir.Operation):
+    if isinstance(op, AssignOp):
+      self.analysis_stmt(op)
+
+  def apply(self, ctx, op: builtin.ModuleOp) -> dict[str, Computation]:
+    for sub in op.walk():
+      self.analysis_op(sub)
+    return self.computations
+
+
+EXTRACT_CACHE_VERSION = 1
+EXTRACT_CACHE_DIR = os.environ.get('DISTAL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'distal'))
+# key -> extracted computation, see `extract_cache_key`.
+EXTRACT_CACHE: Dict[str, Computation] = {}
+_ELEMENT_TYPES = {str(t): t for t in (builtin.f32, builtin.i32)}
+
+
+def extract_cache_key(func, shapes: Dict[str, Sequence[int]] = {}) -> str:
+  """ hash of the kernel source, its evaluated annotations (a size may come from a global) and `shapes`. """
+  key = {
+      'version': EXTRACT_CACHE_VERSION,
+      'source': inspect.getsource(func.func),
+      'annotations': {name: str(anno) for name, anno in func.func.__annotations__.items()},
+      'shapes': {name: list(shape) for name, shape in sorted(shapes.items())},
+  }
+  return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _iter_var_to_json(var: IterVar) -> list:
+  return [var.name, var.lower_bound, var.upper_bound, var.step]
+
+
+def computation_to_json(comp: Computation) -> dict:
+  """ only the fields set by `polyhedron_extract`, a scheduled computation is not cached. """
+  assert comp.mesh is None and not comp.transfers and not comp.iter_kinds
+  return {
+      'op': comp.op,
+      'domain': str(comp.domain),
+      'schedule': str(comp.schedule),
+      'accesses': [{'name': a.buffer.name, 'dims': [_iter_var_to_json(d) for d in a.buffer.dims],
+                    'dtype': str(a.buffer.dtype), 'usage': a.buffer.usage.name,
+                    'relation': str(a.relation)} for a in comp.accesses],
+      'iter_vars': [_iter_var_to_json(v) for v in comp.iter_vars],
+      'dim_bindings': {str(dim): [list(index) for index in indices] for dim, indices in comp.dim_bindings.items()},
+  }
+
+
+def computation_from_json(data: dict) -> Computation:
+  accesses = [Access(Buffer(a['name'], tuple(IterVar(*d) for d in a['dims']), _ELEMENT_TYPES[a['dtype']],
+                            usage=UsageKind[a['usage']]), isl.map(a['relation'])) for a in data['accesses']]
+  return Computation(data['op'], isl.set(data['domain']), isl.map(data['schedule']), accesses,
+                     tuple(IterVar(*v) for v in data['iter_vars']),
+                     dim_bindings={int(dim): [AccessDimIndex(*index) for index in indices]
+                                   for dim, indices in data['dim_bindings'].items()})
+
+
+def polyhedron_extract(func, shapes: Dict[str, Sequence[int]] = {}, cache: bool = True) -> Computation:
+  """ `shapes` overrides the shape annotated on some buffers, so a kernel parsed once can be extracted for any size.
+    with `cache`, the result is looked up in `EXTRACT_CACHE`, then in `EXTRACT_CACHE_DIR`, before the kernel is
+    built by xdsl; unchanged kernels are never parsed again across runs.
+  """
+  if not cache:
+    return PolyhedronExtractPass(shapes).apply(passes.Context(allow_unregistered=True), func.module)[0]
+  key = extract_cache_key(func, shapes)
+  if key in EXTRACT_CACHE:
+    return EXTRACT_CACHE[key]
+  path = os.path.join(EXTRACT_CACHE_DIR, f'{key}.json')
+  try:
+    with open(path) as f:
+      comp = computation_from_json(json.load(f))
+  except (OSError, ValueError, KeyError, isl.Error):
+    comp = PolyhedronExtractPass(shapes).apply(passes.Context(allow_unregistered=True), func.module)[0]
+    try:
+      os.makedirs(EXTRACT_CACHE_DIR, exist_ok=True)
+      with open(f'{path}.{os.getpid()}', 'w') as f:
+        json.dump(computation_to_json(comp), f)
+      os.replace(f'{path}.{os.getpid()}', path)  # atomic, for concurrent runs
+    except OSError:
+      pass  # a read only cache directory only disables the disk cache.
+  EXTRACT_CACHE[key] = comp
+  return comp
+
+
+def split(self: Computation, parent_var: str, outer_var: str, inner_var: str, factor: int) -> 'Computation':
+  """ factor = extend(inner_var) """
+  dim_index = self.iter_vars.index(parent_var)
+  assert dim_index != -1
+  new_iter_vars = tuple([*self.iter_vars[:dim_index],
+                         outer_var, inner_var, *self.iter_vars[dim_index + 1:]])
+
+  constraints_str = f' {outer_var} = {parent_var} // {factor} and {inner_var} = {parent_var} - {outer_var} * {factor}'
+  mapping_str = f"{{ {self.name()}[{str.join(',', map(str, self.iter_vars))}] -> {self.name()}[{str.join(',', map(str, new_iter_vars))}]: {constraints_str} }}"
+  split_map = isl.map(mapping_str)
+
+  new_schedule = self.schedule.apply_range(split_map)
+  new_schedule = reduce(lambda sche, p: sche.set_dim_name(
+      isl.dim_type.OUT, p[0], str(p[1])), enumerate(new_iter_vars), new_schedule)
+  return replace(self, iter_vars=tuple(new_iter_vars), schedule=new_schedule)
+
+
+Computation.split = split
+
+
+def dim_bounds(self: Computation, dim_var: str) -> tuple[isl.val, isl.val]:
+  domain = self.schedule.intersect_domain(self.domain).range()
+  return (domain.dim_min_val(self.iter_vars.index(dim_var)), domain.dim_max_val(self.iter_vars.index(dim_var)))
+
+
+Computation.dim_bounds = dim_bounds
+
+
+def divide(self: Computation, parent_var: str, outer_var: str, inner_var: str, factor: int) -> 'Computation':
+  (min_val, max_val) = self.dim_bounds(parent_var)
+  return split(self, parent_var, outer_var, inner_var, (max_val.num_si() - min_val.num_si() + 1) // factor)
+
+
+Computation.divide = divide
+
+
+def reorder(self: Computation, *vars: List[int]):
+  assert len(set(vars)) == len(vars)
+  g = iter(vars)
+  new_iter_vars = [var if var not in vars else next(g) for var in self.iter_vars]
+  name = self.domain.get_tuple_name()
+  transform = isl.map(
+      f"{{ {name}[{','.join(map(str,self.iter_vars))}] -> {name}[{','.join(map(str,new_iter_vars))}] }}")
+  new_schedule = self.schedule.apply_range(transform)
+  new_schedule = reduce(lambda sche, p: sche.set_dim_name(
+      isl.dim_type.OUT, p[0], str(p[1])), enumerate(new_iter_vars), new_schedule)
+  return replace(self, iter_vars=tuple(new_iter_vars), schedule=new_schedule)
+
+
+Computation.reorder = reorder
+
+
+def distribute(self: Computation, parent_vars: List[IterVar], outer_vars: List[IterVar], inner_vars: List[IterVar], mesh: Mesh):
+  assert self.mesh is None
+  assert len(parent_vars) == len(outer_vars) == len(inner_vars)
+  assert all(map(lambda k: k != IterKind.Distributed, self.iter_kinds.values()))
+  for i, mesh_dim in enumerate(mesh.dims):
+    self = self.divide(parent_vars[i], outer_vars[i], inner_vars[i], mesh_dim.extent)
+  self = self.reorder(chain(outer_vars, inner_vars))
+  new_iter_kinds = self.iter_kinds.copy()
+  new_iter_kinds.update({v: IterKind.Distributed for v in outer_vars})
+  return replace(self, iter_kinds=new_iter_kinds, mesh=mesh)
+
+
+Computation.distribute = distribute
+
+
+@dataclass
+class ShardAxis:
+  lhs: IterVar
+  rhs: Tuple[Expr]
+
+
+def var_shard_op(self: Expr, other: Expr | List[Expr]):
+  return ShardAxis(self, (other,) if isinstance(other, Expr) else tuple(other))
+
+
+IterVar.__matmul__ = var_shard_op
+
+
+def shard(self: Computation, buffer_name: str, *shard_axes: ShardAxis):
+  shard_axis_vars = set()
+
+  def collect_fn(e: Expr):
+    if isinstance(e, IterVar):
+      shard_axis_vars.add(e)
+
+  for shard_axis in shard_axes:
+    for rhs in shard_axis.rhs:
+      rhs.walk(collect_fn)
+    assert all(map(lambda v: v in self.mesh.dims, shard_axis_vars)
+               ), "rhs must be in mesh dimensions"
+    shard_axis_vars.clear()
+
+  access = next(filter(lambda acc: acc.buffer.name == buffer_name, self.accesses))
+  assert access
+  assert all([shard_axis.lhs in access.buffer.dims for shard_axis in shard_axes]
+             ), "lhs must be in buffer dimensions"
+  buffer = access.buffer
+  assert buffer.sharding == None, "Buffer must not be sharded"
+
+  def bound_fn(v): return f'{v.lower_bound} <= {v} < {v.upper_bound}'
+  sharding_map = isl.map(
+      f"{{ {buffer.name}[{','.join(map(str, buffer.dims))}] -> {buffer.name}[{','.join(map(str, self.mesh.dims))},{','.join(map(str, buffer.dims))}] : {' and '.join(map(bound_fn, chain(self.mesh.dims, buffer.dims)))} }}")
+
+  local = 'local_'
+  space_dims = list(map(str, chain(self.mesh.dims, buffer.dims)))
+  for shard_axis in shard_axes:
+    lhs = shard_axis.lhs
+    dim_extent = lhs.extent
+    for rhs in shard_axis.rhs:
+      match rhs:
+        # todo support expr.
+        case Expr():
+          # assert (dim_extent % rhs.extent) == 0, "Dimension can't divide evenly"
+          # isl.map( rhs)
+          sched_space = str(self.mesh.domain.space())[1:-1]
+          factor_map = isl.map(f'{{ {sched_space} -> [{rhs}] }}').intersect_domain(self.mesh.domain)
+          factor = factor_map.max_multi_pw_aff().at(0).max_val().num_si() - factor_map.min_multi_pw_aff().at(0).min_val().num_si() + 1
+          # .size().at(0).num_si()
+          assert dim_extent % factor == 0, "Dimension must be divisible by sharding factor"
+          local_dim_extent = dim_extent // factor
+          # rhs.extent
+          constraints = f'{rhs} = {lhs} // {local_dim_extent} and {local + str(lhs)} = {lhs} - {rhs} * {local_dim_extent}'
+          lhs_space = f"{buffer.name}[{','.join(space_dims)}]"
+          rhs_space = f"{buffer.name}[{','.join([local + str(lhs) if dim == str(lhs) else dim for dim in space_dims])}]"
+          sharding_map = sharding_map.apply_range(
+              isl.map(f'{{ {lhs_space} -> {rhs_space} : {constraints} }}'))
+          dim_extent = dim_extent // local_dim_extent  # update extent
+        case _:
+          raise NotImplementedError()
+  sharding_map = reduce(lambda sche, p: sche.set_dim_name(
+      isl.dim_type.OUT, p[0], str(p[1])), enumerate(self.mesh.dims), sharding_map)
+  n_access = replace(access, buffer=replace(buffer, sharding=sharding_map))
+  return replace(self, accesses=tuple([n_access if o_access.buffer.name == buffer.name else o_access for o_access in self.accesses]))
+
+
+Computation.shard = shard
+
+
+def communicate(self: Computation, buffer_name: str, var: IterVar, rotate_factors: List[IterVar] = []):
+  access = next(filter(lambda acc: acc.buffer.name == buffer_name, self.accesses))
+  assert access.buffer.sharding
+  assert IterKind.Serial == self.iter_kinds.get(var, IterKind.Serial)
+  new_transfers = self.transfers.copy()
+  transed = new_transfers.get(var, ())
+  assert access not in transed
+
+  i = self.iter_vars.index(var)
+
+  access_schedule = None
+  if len(rotate_factors) > 0:
+    name = self.name()
+    extent = self.schedule.range().dim_max_val(i).num_si() + 1
+    nvar = str(var) + '_r'
+    niter_vars = tuple([*self.iter_vars[:i], nvar, *self.iter_vars[i + 1:]])
+    constraints = [f"{nvar} = ({' + '.join(map(str, rotate_factors))} + {var}) mod {extent}"]
+    for factor in rotate_factors + [var]:
+      i = self.iter_vars.index(factor)
+      min = self.schedule.range().dim_min_val(i).num_si()
+      max = self.schedule.range().dim_max_val(i).num_si()
+      constraints.append(f"{min} <= {str(factor)} <= {max}")
+    access_schedule = isl.map(
+        f"{{ {name}[{','.join(map(str, self.iter_vars))}] -> {name}[{','.join(map(str, niter_vars))}] : {' and '.join(constraints)} }}")
+  else:
+    access_schedule = self.schedule.range().identity()
+
+  # check validity
+  schedule_to_sharding = self.schedule.apply_range(access_schedule).apply_domain(
+      access.relation).apply_domain(access.buffer.sharding).reverse()  # schedule -> buffer
+  dist_to_shard = schedule_to_sharding.project_out(isl.dim_type.IN, i + 1, len(self.iter_vars) - i - 1). \
+      project_out(isl.dim_type.OUT, len(self.mesh.dims),
+                  access.buffer.sharding.dim(isl.dim_type.OUT) - len(self.mesh.dims))
+  assert dist_to_shard.is_single_valued(), "transfer can't read/write data cross multi nodes."
+
+  new_transfers[var] = (Transfer(access, access_schedule), *transed)
+  return replace(self, transfers=new_transfers)
+
+
+Computation.communicate = communicate
+
+
+class OpKind(IntEnum):
+  # call(Assign, dest, src)
+  Assign = 0
+  # call(Access, buffer, *(int | slice))
+  Access = 1
+  # call(Trans, commPattern, sendbuf, dest, recvbuf, source)
+  Trans = 2
+  # call(Alloc, name, *dims)
+  Alloc = 3
+  # call(Rank, *ids)
+  Rank = 4
+  # call(CommSendrecv)
+  CommSendrecv = 5
+  # call(CommBroadcast, *commGroups)
+  CommBroadcast = 6
+  # call(CommShift, *commGroups, direction)
+  CommShift = 7
+  # call(AssertEqual, a, b)
+  AssertEqual = 8
+  # call(AugAssign, dest, src)
+  AugAssign = 9
+  # call(ITrans, commPattern, sendbuf, dest, recvbuf, source, buffer, slot)
+  ITrans = 10
+  # call(Wait, buffer, slot)
+  Wait = 11
+  # call(Acquire, name, *dims)
+  Acquire = 12
+  # call(Release, name)
+  Release = 13
+
+  # call(Slice, begin, end)
+  Slice = 128
+  Add = 129
+  Mul = 130
+  MatMul = 131
+  MatMulTransA = 132
+
+
+def call_from(build: isl.ast_build, op: OpKind, *args: List[isl.ast_expr | str]):
+  assert isinstance(op, OpKind)
+  l = isl.ast_expr_list(len(args))
+  for i in range(len(args)):
+    match args[i]:
+      case isl.ast_expr():
+        l = l.add(args[i])
+      case int() | isl.val():
+        l = l.add(isl.ast_expr.from_val(args[i]))
+      case str():
+        l = l.add(isl.ast_expr.from_id(args[i]))
+      case isl.pw_aff():
+        l = l.add(build.expr_from(isl.pw_aff(str(args[i]))))
+      case _:
+        raise ValueError(f"Unsupported argument type: {type(args[i])}")
+  return isl.ast_expr.call(isl.ast_expr.from_id(op.name), l)
+
+
+def get_kelly_map(self: Computation, *tps: Tuple[int, int]):
+  ndim = self.schedule.dim(isl.dim_type.OUT)
+  sche = self.schedule.range().identity()
+  d = {p[0] + 1: p[1] for p in tps}
+  for i in range(ndim):
+    sche = sche.insert_dims(isl.dim_type.OUT, i * 2,
+                            1).fix_val(isl.dim_type.OUT, i * 2, d.get(i, 0))
+  return sche.set_tuple_name(isl.dim_type.OUT, sche.get_tuple_name(isl.dim_type.IN))
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class TransferScheduleInfo:
+  dim: int
+  access_map: isl.map
+  access_shard_map: isl.map  # schedule -> buffer
+  access_schedule: isl.map  # schedule -> new schedule
+  access_adapt_schedule: isl.map | None
+  box_hull: isl.fixed_box
+  alloc_schedule: isl.map
+  trans_schedule: isl.map
+  redundancies: Tuple[int, ...]
+
+  @property
+  def alloc_name(self):
+    return self.alloc_schedule.tuple_name(isl.dim_type.IN)
+
+  @property
+  def trans_name(self):
+    return self.trans_schedule.tuple_name(isl.dim_type.IN)
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class ComputationScheduleInfo:
+  comp_schedule: isl.map
+  assign_kind: OpKind
+  op_kind: OpKind
+
+  @property
+  def comp_name(self):
+    return self.comp_schedule.tuple_name(isl.dim_type.IN)
+
+
+def get_transfer_schedule_info(self: Computation, transfer: Transfer, dim: int, order: int):
+  sched_domain = self.schedule.range()
+  ndim = sched_domain.n_dim()
+  access_map = self.schedule.apply_domain(transfer.access.relation).reverse()
+  access_shard_map = access_map.apply_range(transfer.access.buffer.sharding)
+  box_hull = access_map. \
+      eliminate(isl.dim_type.IN, dim + 1, ndim - dim - 1). \
+      range_simple_fixed_box_hull()
+
+  trans_name = OpKind.Trans.name + transfer.access.buffer.name
+  alloc_name = OpKind.Alloc.name + trans_name
+  alloc_schedule = get_kelly_map(self, (dim, order)). \
+      intersect_domain(sched_domain). \
+      project_out(isl.dim_type.IN, dim + 1, ndim - (dim + 1)). \
+      set_domain_tuple(alloc_name)
+  for drop_dim in range(dim + 1, ndim):
+    alloc_schedule = alloc_schedule.fix_si(isl.dim_type.OUT, drop_dim * 2 + 1, 0)
+  order += 1
+
+  trans_schedule = get_kelly_map(self, (dim, order)). \
+      intersect_domain(sched_domain). \
+      set_domain_tuple(trans_name)
+
+  # find dropped dimensions
+  redundancies = []
+  cons_free_map = access_map.drop_constraints_not_involving_dims(
+      isl.dim_type.OUT, 0, len(transfer.access.buffer.dims))
+  for i in range(dim, ndim):
+    if not cons_free_map.involves_dims(isl.dim_type.IN, i, 1):
+      trans_schedule = trans_schedule.fix_si(isl.dim_type.IN, i, 0)
+      redundancies.append(i)
+
+  order += 1
+
+  return TransferScheduleInfo(dim, access_map, access_shard_map, transfer.schedule,
+                              None, box_hull, alloc_schedule, trans_schedule,
+                              tuple(redundancies))
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class CommPattern:
+  def build_call(self, build):
+    pass
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class SendRecv(CommPattern):
+  def build_call(self, build):
+    return call_from(build, OpKind.CommSendrecv)
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class Broadcast(CommPattern):
+  axes: tuple[int, ...]
+
+  def build_call(self, build):
+    return call_from(build, OpKind.CommBroadcast, *self.axes)
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class Shift(CommPattern):
+  axes: tuple[int, ...]
+  direction: int
+
+  def build_call(self, build):
+    return call_from(build, OpKind.CommShift, *self.axes, self.direction)
+
+
+def drop_dims(sche: isl.map | isl.aff, redundancies: Tuple[int] = ()):
+  dims = list(redundancies)
+  dims.sort()
+  j = 0
+  for i in range(len(dims)):
+    if isinstance(sche, isl.map):
+      sche = sche.project_out(isl.dim_type.IN, dims[i] - j, 1)
+    elif isinstance(sche, isl.pw_aff):
+      sche = sche.drop_dims(isl.dim_type.IN, dims[i] - j, 1)
+    else:
+      raise NotImplementedError
+    j += 1
+  return sche
+
+
+def detect_communication_pattern(self: Computation, info: TransferScheduleInfo):
+  domain_ndim = info.access_map.dim(isl.dim_type.IN)
+  shard_ndim = info.access_shard_map.dim(isl.dim_type.OUT)
+  mesh_ndim = len(self.mesh.dims)
+  comm_dim = info.dim
+  access_shard_map = info.access_shard_map.apply_domain(info.access_schedule)
+  access_src_rank = access_shard_map. \
+      project_out(isl.dim_type.OUT, mesh_ndim, shard_ndim - mesh_ndim).\
+      project_out(isl.dim_type.IN, info.dim + 1, domain_ndim - info.dim - 1)
+
+
+  access_src_pma = access_src_rank.as_pw_multi_aff()
+  delta_vals = ','.join(
+    ['1' if i == comm_dim else '0' for i in range(access_src_pma.dim(isl.dim_type.IN))])
+  access_next_src_pma = isl.pw_multi_aff.identity_on_domain(
+      access_src_pma.domain_space()).add_constant(isl.multi_val(f'{{[{delta_vals}]}}'))
+  src_rank_deltas = access_src_pma.pullback(access_next_src_pma).sub(access_src_pma).coalesce()
+  comm_patterns = []
+  for i in range(mesh_ndim):
+    pa = src_rank_deltas.at(i)
+    if pa.is_cst():
+      match pa.max_val().num_si():
+        case 0:  # not involved
+          comm_patterns.append(SendRecv())
+        case 1:  # changed with time.
+          if not access_src_rank.is_bijective():  # detect broadcast
+            unbounded = access_src_rank.drop_constraints_not_involving_dims(
+                isl.dim_type.OUT, 0, mesh_ndim)
+            if not unbounded.involves_dims(isl.dim_type.IN, i, 1):
+              comm_patterns.append(Broadcast((i,)))
+            else:
+              comm_patterns.append(SendRecv())
+          else:
+            comm_patterns.append(SendRecv())
+    else:
+      points = []
+      pa.as_map().range().foreach_point(lambda x: points.append(isl.set(x)))
+      points = reduce(lambda acc, x: acc.union(x), points, isl.set.empty(
+          isl.space.unit().add_dims(isl.dim_type.SET, 1)))
+      extent = self.schedule.range().dim_max_val(info.dim).num_si()
+      cw_set = isl.set(f'{{[1]; [-{extent}]}}')
+      ccw_set = isl.set(f'{{[-1]; [{extent}]}}')
+      if points.is_equal(cw_set):
+        comm_patterns.append(Shift((i,), 1))
+      elif points.is_equal(ccw_set):
+        comm_patterns.append(Shift((i,), -1))
+
+  special = sum([isinstance(p, (Broadcast, Shift)) for p in comm_patterns])
+  assert special <= 1
+  return SendRecv() if special == 0 else next(filter(lambda p: not isinstance(p, SendRecv), comm_patterns))
+
+
+@dataclass(frozen=True, unsafe_hash=True)
+class ScheduleInfo:
+  trans_infos: Tuple[TransferScheduleInfo]
+  comp_infos: Tuple[ComputationScheduleInfo]
+
+
+def get_schedule_info(self: Computation):
+  transfer_sche_infos: List[TransferScheduleInfo] = []
+  used_orders = []
+  for (var, accesses) in self.transfers.items():
+    dim = self.iter_vars.index(var)
+    order = 0
+    for access in accesses:
+      transfer_sche_infos.append(get_transfer_schedule_info(self, access, dim, order))
+      order += 2
+      used_orders.append((dim, order))
+  # check dim bindings
+  for dim, dim_indices in self.dim_bindings.items():
+    worklist: List[Tuple[int, TransferScheduleInfo, AccessDimIndex]] = []
+    for dim_index in dim_indices:
+      for var, trans_infos in self.transfers.items():
+        for i, trans in enumerate(trans_infos):
+          if self.accesses[dim_index.access_idx] == trans.access:
+            worklist.append((i, transfer_sche_infos[i], dim_index))
+    # process worklist
+    if len(worklist) > 1:
+      access_dim_maps: List[isl.map] = []
+      for workitem in worklist:
+        _, trans_info, dim_index = workitem
+        access_dim_map: isl.map = trans_info.access_map.apply_domain(trans_info.access_schedule)
+        access_dim_map = access_dim_map.project_out(isl.dim_type.OUT, 0, dim_index.buffer_dim)
+        access_dim_map = access_dim_map.project_out(
+            isl.dim_type.OUT, 1, access_dim_map.dim(isl.dim_type.OUT) - 1)
+        access_dim_maps.append(access_dim_map)
+      for i in range(len(access_dim_maps) - 1):
+        # when dim not equal, add index schedule
+        if not access_dim_maps[i].is_equal(access_dim_maps[i + 1]):
+          a = worklist[i][1]
+          b = worklist[i + 1][1]
+          if a.access_schedule.is_identity():
+            assert a.access_adapt_schedule is None
+            transfer_sche_infos[worklist[i][0]] = replace(a, access_adapt_schedule=b.access_schedule)
+          elif b.access_schedule.is_identity():
+            assert b.access_adapt_schedule is None
+            transfer_sche_infos[worklist[i + 1][0]] = replace(b, access_adapt_schedule=a.access_schedule)
+          else:
+            raise ValueError("Incompatible access schedules")
+
+  in_iters = set(itertools.flatten(
+      [acc.buffer.dims for acc in self.accesses if acc.buffer.usage is UsageKind.Input]))
+  out_iters = set(itertools.flatten(
+      [acc.buffer.dims for acc in self.accesses if acc.buffer.usage is UsageKind.Output]))
+
+  op_kind = None
+  match self.op:
+    case OpKind():
+      op_kind = self.op
+    case 'arith.mulf':
+      op_kind = OpKind.Mul
+    case _:
+      raise NotImplementedError()
+
+  comp_schedule = ComputationScheduleInfo(get_kelly_map(
+      self, *used_orders).intersect_domain(self.schedule.range()),
+      OpKind.AugAssign if len(in_iters) > len(out_iters) else OpKind.Assign,
+      op_kind)
+  return ScheduleInfo(tuple(transfer_sche_infos), (comp_schedule,))
+
+
+def lower_computation(self: Computation, overlap: bool = False, hoist: bool = False):
+  """ when `overlap` is set, transfers that move one tensor per step of their loop are issued one step ahead
+    into a double buffer with `ITrans`, and waited by `Wait` just before the step that uses them.
+    when `hoist` is set, the receive buffers, whose shape is the fixed box of `get_box`, are acquired from the
+    buffer pool once outside of the serial loops with `Acquire`, and given back by `Release` after them.
+  """
+  schedule_info = get_schedule_info(self)
+  # process tensorized
+  sched_domain = self.schedule.range()
+  sched_domain_min = self.schedule.range()
+  sched_domain_max = self.schedule.range()
+  tensorized_dims = []
+  for i, v in enumerate(self.iter_vars):
+    if self.iter_kinds.get(v) is IterKind.Tensorize:
+      sched_domain_min = sched_domain_min.fix_val(isl.dim_type.SET, i, sched_domain.dim_min_val(i))
+      sched_domain_max = sched_domain_max.fix_val(isl.dim_type.SET, i, sched_domain.dim_max_val(i))
+      tensorized_dims.append(i)
+
+  def fix_dims(sche: isl.map):
+    for d in tensorized_dims:
+      sche = sche.fix_si(isl.dim_type.OUT, (2 * d) + 1, 0)
+    return sche
+
+  def drop_dims1(sche: isl.map | isl.aff, redundancies: Tuple[int] = ()):
+    dims = list(set([*redundancies, *tensorized_dims]))
+    dims.sort()
+    j = 0
+    for i in range(len(dims)):
+      if isinstance(sche, isl.map):
+        sche = sche.project_out(isl.dim_type.IN, dims[i] - j, 1)
+      elif isinstance(sche, isl.pw_aff):
+        sche = sche.drop_dims(isl.dim_type.IN, dims[i] - j, 1)
+      else:
+        raise NotImplementedError
+      j += 1
+    return sche
+
+  def get_box(map: isl.map) -> isl.multi_val:
+    min = drop_dims1(map.intersect_domain(sched_domain_min))
+    max = drop_dims1(map.intersect_domain(sched_domain_max))
+    diff = max.as_pw_multi_aff().sub(min.as_pw_multi_aff())
+    assert diff.is_cst()
+    return diff.max_multi_val()
+
+  ndim = len(self.iter_vars)
+  sched_name = self.name()
+  n_distributed = 0
+  while n_distributed < ndim and self.iter_kinds.get(self.iter_vars[n_distributed]) is IterKind.Distributed:
+    n_distributed += 1
+  overlapped = set()
+  if overlap:
+    for info in schedule_info.trans_infos:
+      if all(i in tensorized_dims or i in info.redundancies for i in range(info.dim + 1, ndim)):
+        overlapped.add(info.trans_name)
+
+  def get_prefetch_map(dim: int, nout: int, delta: int) -> isl.map:
+    """ { name[..., i_dim, ...] -> name[..., i_dim + delta, ...] } """
+    ins = [f'i{i}' for i in range(nout)]
+    outs = [f'i{i} + {delta}' if i == dim else f'i{i}' for i in range(nout)]
+    return isl.map(f"{{ {sched_name}[{','.join(ins)}] -> {sched_name}[{','.join(outs)}] }}")
+
+  def get_slot(domain: isl.set, dim: int) -> isl.pw_aff:
+    return domain.identity().as_pw_multi_aff().at(dim).mod(isl.val(2))
+
+  def get_outer_schedule(dim: int, order: int, name: str) -> isl.map:
+    """ schedule `name` once per iteration of the loops before `dim`, at `order` among the statements of loop `dim - 1`. """
+    outer_schedule = get_kelly_map(self, (dim - 1, order)). \
+        intersect_domain(sched_domain). \
+        project_out(isl.dim_type.IN, dim, ndim - dim). \
+        set_domain_tuple(name)
+    for drop_dim in range(dim, ndim):
+      outer_schedule = outer_schedule.fix_si(isl.dim_type.OUT, drop_dim * 2 + 1, 0)
+    return outer_schedule
+
+  full_sche_map = isl.union_map.empty()
+  for info in schedule_info.comp_infos:
+    full_sche_map = full_sche_map.union(fix_dims(info.comp_schedule))
+  for info in schedule_info.trans_infos:
+    if hoist:
+      full_sche_map = full_sche_map.union(fix_dims(get_outer_schedule(n_distributed, -1, info.alloc_name)))
+      full_sche_map = full_sche_map.union(fix_dims(get_outer_schedule(
+          n_distributed, 1, OpKind.Release.name + info.trans_name)))
+    if info.trans_name in overlapped:
+      # allocate the double buffer before the transfer loop, wait where the allocation was,
+      # and issue the transfer of step k + 1 during step k.
+      if not hoist:
+        full_sche_map = full_sche_map.union(fix_dims(get_outer_schedule(info.dim, -1, info.alloc_name)))
+      full_sche_map = full_sche_map.union(
+          fix_dims(info.alloc_schedule.set_domain_tuple(OpKind.Wait.name + info.trans_name)))
+      full_sche_map = full_sche_map.union(fix_dims(info.trans_schedule.apply_range(
+          get_prefetch_map(2 * info.dim + 1, 2 * ndim, -1))))
+    else:
+      if not hoist:
+        full_sche_map = full_sche_map.union(fix_dims(info.alloc_schedule))
+      full_sche_map = full_sche_map.union(fix_dims(info.trans_schedule))
+  alloc_info_map = {info.alloc_name: info for info in schedule_info.trans_infos}
+  release_info_map = {OpKind.Release.name + info.trans_name: info for info in schedule_info.trans_infos}
+  trans_info_map = {info.trans_name: info for info in schedule_info.trans_infos}
+  wait_info_map = {OpKind.Wait.name + info.trans_name: info for info in schedule_info.trans_infos}
+  comp_info_map = {info.comp_name: info for info in schedule_info.comp_infos}
+
+  def at_each_domain(node: isl.ast_node_user, build: isl.ast_build) -> isl.ast_node:
+    origin_expr = node.expr()
+    if not isinstance(origin_expr, isl.ast_expr_op_call):
+      return node
+
+    call_id: isl.ast_expr_id = origin_expr.op_arg(0)
+    call_id_name = call_id.id().name()
+    # alloc
+    if call_id_name in alloc_info_map:
+      info = alloc_info_map[call_id_name]
+      box_shape = info.box_hull.get_size()
+      rank = box_shape.size()
+      slots = [2] if info.trans_name in overlapped else []
+      alloc = call_from(build, OpKind.Acquire if hoist else OpKind.Alloc, info.trans_name,
+                        *slots, *[box_shape.at(i) for i in range(rank)])
+      return isl.ast_node_user(alloc)
+
+    # release
+    if call_id_name in release_info_map:
+      info = release_info_map[call_id_name]
+      return isl.ast_node_user(call_from(build, OpKind.Release, info.trans_name))
+
+    # wait
+    if call_id_name in wait_info_map:
+      info = wait_info_map[call_id_name]
+      slot = get_slot(info.alloc_schedule.domain(), info.dim)
+      return isl.ast_node_user(call_from(build, OpKind.Wait, info.trans_name, slot))
+
+    # trans
+    if call_id_name in trans_info_map:
+      info = trans_info_map[call_id_name]
+      pattern = detect_communication_pattern(self, info)
+      select_ranks = list(range(len(self.mesh.dims)))
+      match pattern:
+        case Broadcast():
+          select_ranks = list(filter(lambda i: i in pattern.axes, select_ranks))
+
+      def drop_dims2(x): return drop_dims1(x, info.redundancies)
+
+      prefetch = info.trans_name in overlapped
+      src_shard_pma = info.access_shard_map.as_pw_multi_aff()
+      access_sche_pma = info.access_schedule.as_pw_multi_aff()
+      src_shard_pma = src_shard_pma.pullback(access_sche_pma)
+      if info.access_adapt_schedule:
+        src_shard_pma = src_shard_pma.pullback(info.access_adapt_schedule.as_pw_multi_aff())
+      if prefetch:
+        # the instance of step k + 1 runs at step k.
+        access_sche_pma = access_sche_pma.pullback(
+            get_prefetch_map(info.dim, ndim, 1).as_pw_multi_aff())
+        src_shard_pma = src_shard_pma.pullback(get_prefetch_map(info.dim, ndim, 1).as_pw_multi_aff())
+      src_rank = call_from(build, OpKind.Rank, *[drop_dims2(src_shard_pma.at(i))
+                           for i in select_ranks])
+
+      dest_rank_pma = info.access_map.domain().identity().as_pw_multi_aff()
+      dest_rank_pma = dest_rank_pma.pullback(access_sche_pma)
+      dest_rank = call_from(build, OpKind.Rank, *
+                            [drop_dims2(dest_rank_pma.at(i)) for i in select_ranks])
+
+      src_tensor_box = get_box(info.access_shard_map)
+      src_slice = call_from(build, OpKind.Access, info.access_shard_map.tuple_name(isl.dim_type.OUT),
+                            *[call_from(build, OpKind.Slice, drop_dims2(src_shard_pma.at(i)),
+                                        drop_dims2(src_shard_pma.at(i)).add_constant(src_tensor_box.at(i)).add_constant(1))
+                              for i in range(len(self.mesh.dims), src_shard_pma.dim(isl.dim_type.OUT))])
+
+      dest_start_pma = info.box_hull.get_offset().as_pw_multi_aff()
+      dest_origin_pma = info.access_map.as_pw_multi_aff()
+      dest_tensor_box = get_box(info.access_map)
+      dest_pma = dest_origin_pma.sub(dest_start_pma)
+      dest_pma = dest_pma.pullback(access_sche_pma)
+      slots = []
+      if prefetch:
+        slots = [drop_dims2(get_slot(sched_domain, info.dim).pullback(
+            get_prefetch_map(info.dim, ndim, 1).as_pw_multi_aff()))]
+      dest_slice = call_from(build, OpKind.Access, info.trans_name, *slots,
+                             *[call_from(build, OpKind.Slice, drop_dims2(dest_pma.at(i)),
+                                         drop_dims2(dest_pma.at(i)).add_constant(dest_tensor_box.at(i)).add_constant(1))
+                               for i in range(dest_pma.size())])
+
+      if prefetch:
+        trans = call_from(build, OpKind.ITrans, pattern.build_call(build),
+                          src_slice, src_rank, dest_slice, dest_rank, info.trans_name, slots[0])
+      else:
+        trans = call_from(build, OpKind.Trans, pattern.build_call(build),
+                          src_slice, src_rank, dest_slice, dest_rank)
+      return isl.ast_node_user(trans)
+    if call_id_name in comp_info_map:
+      info = comp_info_map[call_id_name]
+      access_exprs = []
+      for access in self.accesses:
+        trans_name = OpKind.Trans.name + access.buffer.name
+        if trans_name in trans_info_map:
+          trans_info = trans_info_map[trans_name]
+          access_sche_pma = trans_info.access_schedule.as_pw_multi_aff()
+          dest_start_pma = trans_info.box_hull.get_offset().as_pw_multi_aff()
+          dest_origin_pma = trans_info.access_map.as_pw_multi_aff()
+          dest_tensor_box = get_box(trans_info.access_map)
+          dest_pma = dest_origin_pma.sub(dest_start_pma)
+          dest_pma = dest_pma.pullback(access_sche_pma)
+          slots = [drop_dims1(get_slot(sched_domain, trans_info.dim))] if trans_name in overlapped else []
+          access_exprs.append(call_from(build, OpKind.Access, trans_name, *slots, *
+                              [call_from(build, OpKind.Slice, drop_dims1(dest_pma.at(i)), drop_dims1(dest_pma.at(i)).add_constant(dest_tensor_box.at(i)).add_constant(1))
+                               for i in range(dest_pma.size())]))
+        else:
+          access_shard_map = self.schedule.reverse().apply_range(
+              access.relation).apply_range(access.buffer.sharding)
+          dest_shard_pma = access_shard_map.as_pw_multi_aff()
+          dest_tensor_box = get_box(access_shard_map)
+          dest_slice = call_from(build, OpKind.Access, access.buffer.name, *[
+              call_from(build, OpKind.Slice, drop_dims1(dest_shard_pma.at(i)),
+                        drop_dims1(dest_shard_pma.at(i)).add_constant(dest_tensor_box.at(i)).add_constant(1))
+              for i in range(len(self.mesh.dims), dest_shard_pma.dim(isl.dim_type.OUT))])
+          access_exprs.append(dest_slice)
+      call_expr = call_from(build, info.assign_kind,
+                            access_exprs[0],
+                            call_from(build, info.op_kind, access_exprs[1], access_exprs[2]))
+      return isl.ast_node_user(call_expr)
+    return node
+
+  builtin_iters = list(map(str, self.mesh.dims))
+
+  def at_each_for(node: isl.ast_node_for, build: isl.ast_build) -> isl.ast_node:
+    it = node.get_iterator()
+    if isinstance(it, isl.ast_expr_id) and it.id().name() in builtin_iters:
+      node = node.set_annotation(IterKind.Distributed.name)
+    return node
+
+  ast_build = isl.ast_build()
+  ast_build = ast_build.set_at_each_domain(at_each_domain)
+  ast_build = ast_build.set_after_each_for(at_each_for)
+  iter_ids = []
+  comp_schedule = schedule_info.comp_infos[0].comp_schedule
+  iter_kinds = {k.name: v for (k, v) in self.iter_kinds.items()}
+  for i in range(ndim):
+    iter_ids.append(f'c{i}')
+    name = comp_schedule.dim_name(isl.dim_type.OUT, 2 * i + 1)
+    if iter_kinds.get(name) is IterKind.Distributed:
+      name = str(self.mesh.dims[i])
+    iter_ids.append(name)
+  ast_build = ast_build.set_iterators('(' + ','.join(iter_ids) + ')')
+  ast_node = ast_build.node_from_schedule_map(full_sche_map)
+  return ast_node
+
+
+def tensorize(self: Computation, vars: List[IterVar], new_op: OpKind = None):
+  new_kinds = self.iter_kinds.copy()
+  for var in vars:
+    assert new_kinds.get(var, None) in (None, IterKind.Serial)
+    new_kinds[var] = IterKind.Tensorize
+  if new_op:
+    self = replace(self, op=new_op)
+  return replace(self, iter_kinds=new_kinds)
+
+
+Computation.tensorize = tensorize
+
+
+def lower_shard(self: Computation, access: Access) -> Tuple[isl.ast_build, isl.ast_build]:
+  sharding = access.buffer.sharding
+  assert sharding
+  builtin_iters = list(map(str, self.mesh.dims))
+
+  access_global_map = sharding.reverse().set_tuple_id(
+      isl.dim_type.OUT, 'Global' + access.buffer.name)
+
+  redundancies = []
+  cons_free_map = access_global_map.drop_constraints_not_involving_dims(
+      isl.dim_type.OUT, 0, access_global_map.dim(isl.dim_type.OUT))
+  for i in range(0, access_global_map.dim(isl.dim_type.IN)):
+    if not cons_free_map.involves_dims(isl.dim_type.IN, i, 1):
+      redundancies.append(i)
+
+  access_global_pma = access_global_map.as_pw_multi_aff()
+  access_global_domain = sharding.reverse().domain()
+  buffer_local_shape = access_global_domain.project_out(
+      isl.dim_type.SET, 0, len(self.mesh.dims)).simple_fixed_box_hull().size()
+  access_local_map = sharding.reverse().domain().identity().project_out(
+      isl.dim_type.OUT, 0, len(self.mesh.dims)).set_range_tuple(access.buffer.name)
+  access_local_pma = access_local_map.as_pw_multi_aff()
+
+  ast_build = isl.ast_build()
+
+  def at_each_domain(node: isl.ast_node_user, build: isl.ast_build) -> isl.ast_node:
+
+    access_global = call_from(build, OpKind.Access, access_global_pma.tuple_name(
+        isl.dim_type.OUT), *[drop_dims(access_global_pma.at(i), redundancies) for i in range(access_global_pma.size())])
+    access_local = call_from(build, OpKind.Access, access_local_pma.tuple_name(
+        isl.dim_type.OUT), *[drop_dims(access_local_pma.at(i), redundancies) for i in range(access_local_pma.size())])
+
+    call = call_from(build, OpKind.Assign if access.buffer.usage ==
+                     UsageKind.Input else OpKind.AssertEqual, access_local, access_global)
+    return isl.ast_node_user(call)
+
+  def at_each_for(node: isl.ast_node_for, build: isl.ast_build) -> isl.ast_node:
+    it = node.get_iterator()
+    if isinstance(it, isl.ast_expr_id) and it.id().name() in builtin_iters:
+      node = node.set_annotation(IterKind.Distributed.name)
+    return node
+
+  ast_build = ast_build.set_at_each_domain(at_each_domain)
+  ast_build = ast_build.set_after_each_for(at_each_for)
+  ast_build = ast_build.set_iterators(
+      '(' + ', '.join(map(str, chain(self.mesh.dims, access.buffer.dims))) + ')')
+  ast_node = ast_build.node_from_schedule_map(sharding.range().identity())
+  alloc = isl.ast_node_user(call_from(ast_build, OpKind.Alloc, access.buffer.name, *
+                                      [buffer_local_shape.at(i) for i in range(buffer_local_shape.size())]))
+  return (alloc, ast_node)
+
+
+def is_matmul(expr: isl.ast_expr) -> bool:
+  """ a tensorized leaf, see `tensorize`. """
+  return isinstance(expr, isl.ast_expr_op_call) and \
+      expr.get_op_arg(0).id().name() in (OpKind.MatMul.name, OpKind.MatMulTransA.name)
+
+
+def print_python_style_item(printer: isl.printer, item: isl.ast_expr | str):
+  match item:
+    case str():
+      printer.print_str(item)
+    case isl.ast_expr():
+      expr = item
+      match expr:
+        case isl.ast_expr_op_call():
+          op_name = expr.get_op_arg(0).id().name()
+          match op_name:
+            case OpKind.Access.name:
+              print_python_style_item(printer, expr.get_op_arg(1))  # buffer name
+              printer.print_str("[")
+              for i in range(2, expr.op_n_arg()):
+                print_python_style_item(printer, expr.get_op_arg(i))
+                printer.print_str(", "[i - expr.op_n_arg():-1])
+              printer.print_str("]")
+            case OpKind.Rank.name:
+              printer.print_str("[")
+              for i in range(1, expr.op_n_arg()):
+                print_python_style_item(printer, expr.get_op_arg(i))
+                printer.print_str(", "[i - expr.op_n_arg():-1])
+              printer.print_str("]")
+            case OpKind.Assign.name | OpKind.AugAssign.name if is_matmul(expr.get_op_arg(2)):
+              value = expr.get_op_arg(2)
+              print_python_style_items(printer, "Gemm(", expr.get_op_arg(1), ", ", value.get_op_arg(1))
+              if value.get_op_arg(0).id().name() == OpKind.MatMulTransA.name:
+                printer.print_str(".T")
+              print_python_style_items(printer, ", ", value.get_op_arg(2),
+                                       f", {op_name == OpKind.AugAssign.name})")
+            case OpKind.Assign.name:
+              print_python_style_items(printer, expr.get_op_arg(1), " = ", expr.get_op_arg(2))
+            case OpKind.AugAssign.name:
+              print_python_style_items(printer, expr.get_op_arg(1), " += ", expr.get_op_arg(2))
+            case OpKind.Slice.name:
+              print_python_style_items(printer, expr.get_op_arg(1), ":", expr.get_op_arg(2))
+              if expr.op_n_arg() > 3:
+                printer.print_str(":")
+                print_python_style_item(printer, expr.get_op_arg(3))
+            case OpKind.Alloc.name:
+              print_python_style_item(printer, expr.get_op_arg(1))
+              printer.print_str(" = np.zeros([")
+              for i in range(2, expr.op_n_arg()):
+                print_python_style_item(printer, expr.get_op_arg(i))
+                printer.print_str(", "[i - expr.op_n_arg():-1])
+              printer.print_str("])")
+            case OpKind.Acquire.name:
+              print_python_style_items(printer, expr.get_op_arg(1), " = POOL.acquire([")
+              for i in range(2, expr.op_n_arg()):
+                print_python_style_item(printer, expr.get_op_arg(i))
+                printer.print_str(", "[i - expr.op_n_arg():-1])
+              printer.print_str("])")
+            case OpKind.Release.name:
+              print_python_style_items(printer, "POOL.release(", expr.get_op_arg(1), ")")
+            case OpKind.AssertEqual.name:
+              print_python_style_items(printer, "assert np.allclose(", expr.get_op_arg(1), ", ", expr.get_op_arg(2), ")")
+            case OpKind.Trans.name | OpKind.ITrans.name:
+              printer.print_str(op_name)
+              printer.print_str('(')
+              for i in range(1, expr.op_n_arg()):
+                print_python_style_item(printer, expr.get_op_arg(i))
+                printer.print_str(", "[i - expr.op_n_arg():-1])
+              printer.print_str(')')
+            case OpKind.Mul.name:
+              print_python_style_items(printer, expr.get_op_arg(1), " * ", expr.get_op_arg(2))
+            case OpKind.MatMul.name:
+              print_python_style_items(printer, expr.get_op_arg(1), " @ ", expr.get_op_arg(2))
+            case OpKind.MatMulTransA.name:
+              print_python_style_items(printer, expr.get_op_arg(1), ".T", " @ ", expr.get_op_arg(2))
+            case OpKind.CommShift.name:
+              print_python_style_items(printer, expr.get_op_arg(0), "(")
+              print_python_style_item(printer, '(')
+              for i in range(1, expr.op_n_arg() - 1):
+                print_python_style_items(printer, expr.get_op_arg(i), ',')
+              print_python_style_item(printer, '),')
+              print_python_style_item(printer, expr.get_op_arg(expr.op_n_arg() - 1))
+              print_python_style_item(printer, ')')
+            case _:
+              printer.print_ast_expr(expr)
+        case isl.ast_expr_op_and() | isl.ast_expr_op_and_then():
+          print_python_style_items(printer, "(", expr.get_op_arg(0), " and ", expr.get_op_arg(1), ")")
+        case isl.ast_expr_op_or() | isl.ast_expr_op_or_else():
+          print_python_style_items(printer, "(", expr.get_op_arg(0), " or ", expr.get_op_arg(1), ")")
+        case _:
+          printer.print_ast_expr(expr)
+    case _:
+      raise NotImplementedError()
+
+
+def print_python_style_items(printer: isl.printer, *items: List[isl.ast_expr | str]):
+  for item in items:
+    print_python_style_item(printer, item)
+
+
+def print_python_style_user(printer: isl.printer, options: isl.ast_print_options, node: isl.ast_node):
+  expr: isl.ast_expr = node.get_expr()
+  printer.start_line()
+  print_python_style_item(printer, expr)
+  printer.end_line()
+  return printer
+
+
+def print_python_style_for(printer: isl.printer, options: isl.ast_print_options, node: isl.ast_node_for):
+  (it, init, cond, inc) = node.get_iterator(), node.get_init(), node.get_cond(), node.get_inc()
+  omit = False
+  try:
+    anno = node.annotation()
+    if anno.name() == IterKind.Distributed.name:
+      omit = True
+  except:
+    pass
+
+  if not omit:
+    printer.start_line()
+    print_python_style_items(printer, "for ", it, " in range(", init,
+                             ", ", cond.get_arg(1), " + 1", ", ", inc, "):\n")
+    printer = printer.indent(4)
+  printer = node.get_body().print(printer, options)
+  if not omit:
+    printer = printer.indent(-4)
+  return printer
+
+
+def print_python_style_if(printer: isl.printer, options: isl.ast_print_options, node: isl.ast_node_if):
+  printer.start_line()
+  print_python_style_items(printer, "if ", node.get_cond(), ":\n")
+  printer = printer.indent(4)
+  printer = node.get_then_node().print(printer, options)
+  printer = printer.indent(-4)
+  if node.has_else_node():
+    printer.start_line()
+    printer.print_str("else:\n")
+    printer = printer.indent(4)
+    printer = node.get_else_node().print(printer, options)
+    printer = printer.indent(-4)
+  return printer
+
+
+def print_python_style_block(printer: isl.printer, options: isl.ast_print_options, node: isl.ast_node_block):
+  children = node.get_children()
+  for i in range(children.size()):
+    printer = children.get_at(i).print(printer, options)
+  return printer
+
+
+COMM_RUNTIME = """
+CART_RANKS = {tuple(COMM_ALL.Get_coords(r)): r for r in range(COMM_ALL.Get_size())}
+
+
+class CommBroadcast:
+  # axes -> (sub communicator, sub coords -> sub rank). `Sub` is collective, so create it once per axes.
+  comms: dict = {}
+
+  def __init__(self, *axes: int):
+    self.axes: tuple[int] = axes
+    if axes not in CommBroadcast.comms:
+      comm = COMM_ALL.Sub([True if i in axes else False for i in range(len(PIDS))])
+      CommBroadcast.comms[axes] = (comm, {tuple(comm.Get_coords(r)): r for r in range(comm.Get_size())})
+    self.comm, self.ranks = CommBroadcast.comms[axes]
+    self.rank = self.comm.Get_rank()
+
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    src_rank = self.ranks[tuple(source)]
+    if self.rank == src_rank:
+      np.copyto(recvbuf, srcbuf)
+    self.comm.Bcast(recvbuf, root=src_rank)
+
+  def start(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    src_rank = self.ranks[tuple(source)]
+    if self.rank == src_rank:
+      np.copyto(recvbuf, srcbuf)
+    return self.comm.Ibcast(recvbuf, root=src_rank).Wait
+
+class CommShift:
+  # (axes, delta, dest) -> (source rank, dest rank) of the shift.
+  neighbors: dict = {}
+
+  def __init__(self, axes: tuple[int], delta: int):
+    self.axes: tuple[int] = axes
+    self.delta: int = delta
+    self.neighbor_ranks(PIDS)
+
+  def neighbor_ranks(self, dest: list[int]) -> tuple[int, int]:
+    key = (self.axes, self.delta, tuple(dest))
+    if key not in CommShift.neighbors:
+      CommShift.neighbors[key] = (
+          CART_RANKS[tuple((cord + self.delta) % MESH[i] if i in self.axes else cord for i, cord in enumerate(dest))],
+          CART_RANKS[tuple((cord - self.delta) % MESH[i] if i in self.axes else cord for i, cord in enumerate(dest))])
+    return CommShift.neighbors[key]
+
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    diffs = [p[0] - p[1] for p in zip(source, dest)]
+    if not all([diffs[axis] == 0 for axis in self.axes]):
+      src_rank, dest_rank = self.neighbor_ranks(dest)
+      COMM_ALL.Sendrecv_replace(srcbuf, dest=dest_rank, source=src_rank)
+    np.copyto(recvbuf, srcbuf)
+
+  def start(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    diffs = [p[0] - p[1] for p in zip(source, dest)]
+    if all([diffs[axis] == 0 for axis in self.axes]):
+      np.copyto(recvbuf, srcbuf)
+      return lambda: None
+    src_rank, dest_rank = self.neighbor_ranks(dest)
+    requests = [COMM_ALL.Isend(srcbuf, dest=dest_rank), COMM_ALL.Irecv(recvbuf, source=src_rank)]
+
+    def wait():
+      MPI.Request.Waitall(requests)
+      np.copyto(srcbuf, recvbuf)  # the shard keeps moving along the ring.
+    return wait
+
+
+class CommSendrecv:
+  def __call__(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    COMM_ALL.Sendrecv(srcbuf, CART_RANKS[tuple(dest)], 0,
+                      recvbuf, CART_RANKS[tuple(source)])
+
+  def start(self, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+    requests = [COMM_ALL.Isend(srcbuf, dest=CART_RANKS[tuple(dest)]),
+                COMM_ALL.Irecv(recvbuf, source=CART_RANKS[tuple(source)])]
+    return lambda: MPI.Request.Waitall(requests)
+
+def Trans(comm, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int]):
+  comm(srcbuf, source, recvbuf, dest)
+
+# (id(buffer), slot) -> wait function of the transfer in flight.
+PENDING = {}
+
+def ITrans(comm, srcbuf: np.ndarray, source: list[int], recvbuf: np.ndarray, dest: list[int], buffer: np.ndarray, slot: int):
+  PENDING[(id(buffer), slot)] = comm.start(srcbuf, source, recvbuf, dest)
+
+def Wait(buffer: np.ndarray, slot: int):
+  PENDING.pop((id(buffer), slot))()
+
+"""
+
+
+POOL_RUNTIME = """
+class BufferPool:
+  def __init__(self):
+    # (shape, dtype) -> released buffers.
+    self.free: dict = {}
+    self.nbytes = 0
+
+  def acquire(self, shape: list[int], dtype=np.float64) -> np.ndarray:
+    key = (tuple(shape), np.dtype(dtype))
+    if self.free.get(key):
+      return self.free[key].pop()
+    self.nbytes += np.dtype(dtype).itemsize * int(np.prod(shape))
+    return np.zeros(shape, dtype)
+
+  def release(self, buffer: np.ndarray):
+    self.free.setdefault((buffer.shape, buffer.dtype), []).append(buffer)
+
+POOL = BufferPool()
+
+"""
+
+
+KERNEL_RUNTIME = """
+# dtype -> blas gemm routine.
+BLAS_GEMM = {}
+
+def Gemm(c: np.ndarray, a: np.ndarray, b: np.ndarray, accumulate: bool):
+  beta = 1.0 if accumulate else 0.0
+  # gemm updates c in place only when it is contiguous and of a blas type, it would work on a copy otherwise.
+  if USE_BLAS and c.dtype.char in 'fdFD' and (c.flags.f_contiguous or c.flags.c_contiguous):
+    if c.dtype not in BLAS_GEMM:
+      BLAS_GEMM[c.dtype] = get_blas_funcs('gemm', dtype=c.dtype)
+    if c.flags.f_contiguous:
+      BLAS_GEMM[c.dtype](1.0, a, b, beta=beta, c=c, overwrite_c=True)
+    else:
+      # c.T is fortran ordered, so c.T = b.T @ a.T + beta * c.T updates c in place.
+      BLAS_GEMM[c.dtype](1.0, b.T, a.T, beta=beta, c=c.T, overwrite_c=True)
+  elif not accumulate:
+    np.matmul(a, b, out=c)
+  else:
+    # the product goes to a pooled buffer, so a leaf allocates nothing once the pool holds its shape.
+    product = POOL.acquire(c.shape, c.dtype)
+    np.matmul(a, b, out=product)
+    c += product
+    POOL.release(product)
+
+"""
+
+
+def codegen_comm_patterns(self: Computation, printer: isl.printer) -> isl.printer:
+  """ create the communicators of every transfer at startup, so the schedule loops only look them up. """
+  patterns = []
+  for info in get_schedule_info(self).trans_infos:
+    pattern = detect_communication_pattern(self, info)
+    if pattern not in patterns:
+      patterns.append(pattern)
+  for pattern in patterns:
+    match pattern:
+      case Broadcast():
+        printer.print_str(f"CommBroadcast({','.join(map(str, pattern.axes))})\n")
+      case Shift():
+        printer.print_str(f"CommShift(({','.join(map(str, pattern.axes))},),{pattern.direction})\n")
+  printer.print_str('\n')
+  return printer
+
+
+def codegen_setup(self: Computation, printer: isl.printer, blas: bool = False) -> isl.printer:
+  printer.print_str('import numpy as np\n')
+  printer.print_str('from mpi4py import MPI\n')
+  printer.print_str('from enum import IntEnum\n')
+  printer.print_str('import sys\n')
+  printer.print_str(f'USE_BLAS = {blas}\n')
+  if blas:
+    printer.print_str('try:\n')
+    printer.print_str('  from scipy.linalg.blas import get_blas_funcs\n')
+    printer.print_str('except ImportError:\n')
+    printer.print_str('  USE_BLAS = False\n')
+  printer.print_str('RANK = MPI.COMM_WORLD.Get_rank()\n')
+  printer.print_str(f'MESH = [{",".join(map(str, self.mesh.shape))}]\n')
+  printer.print_str(f'COMM_ALL = MPI.COMM_WORLD.Create_cart(MESH)\n')
+  printer.print_str(f"({','.join(map(str, self.mesh.dims))},) = PIDS = COMM_ALL.Get_coords(RANK)\n")
+  printer.print_str(COMM_RUNTIME)
+  printer.print_str(POOL_RUNTIME)
+  printer.print_str(KERNEL_RUNTIME)
+  printer = codegen_comm_patterns(self, printer)
+  return printer
+
+
+def codegen_computation(self: Computation, printer: isl.printer, ast_computation: isl.ast_node, print_options: isl.ast_print_options):
+  printer.print_str(f"def computation({', '.join([a.buffer.name for a in self.accesses])}):\n")
+  printer.set_indent(4)
+  printer = ast_computation.print(printer, print_options)
+  printer.set_indent(-4)
+  printer.end_line()
+  return printer
+
+
+def codegen_main(self: Computation, printer: isl.printer, ast_inputs: List[isl.ast_node], ast_outputs: List[isl.ast_node], print_options: isl.ast_print_options):
+  printer.print_str('if __name__ == "__main__":\n')
+  for i, access in enumerate(self.accesses):
+    printer.print_str(
+        f'    Global{access.buffer.name} = np.load(sys.argv[{i + 1}], mmap_mode="r")\n')
+
+  printer.set_indent(4)
+  for in_ast in ast_inputs:
+    printer = in_ast[0].print(printer, print_options)
+    printer = in_ast[1].print(printer, print_options)
+  for out_ast in ast_outputs:
+    printer = out_ast[0].print(printer, print_options)
+  printer.print_str(f"    computation({', '.join([a.buffer.name for a in self.accesses])})\n")
+  for out_ast in ast_outputs:
+    printer = out_ast[1].print(printer, print_options)
+  printer.print_str("    print(f\"rank [{','.join(map(str,PIDS))}] passed!\")")
+  printer.set_indent(-4)
+  printer.end_line()
+  return printer
+
+
+def python_style_print_options() -> isl.ast_print_options:
+  print_options = isl.ast_print_options.alloc()
+  print_options = print_options.set_print_for(print_python_style_for)
+  print_options = print_options.set_print_user(print_python_style_user)
+  print_options = print_options.set_print_block(print_python_style_block)
+  print_options = print_options.set_print_if(print_python_style_if)
+  return print_options
+
+
+def codegen_program(self: Computation, printer: isl.printer, ast_inputs: List[isl.ast_node], ast_outputs: List[Tuple[isl.ast_node, isl.ast_node]], ast_computation: isl.ast_node, blas: bool = False) -> isl.printer:
+  """ with `blas`, accumulating matmul leaves call the blas gemm of scipy (when it is installed) instead of numpy. """
+  print_options = python_style_print_options()
+  printer.set_output_format(isl.format.C)
+
+  printer = codegen_setup(self, printer, blas)
+  printer = codegen_computation(self, printer, ast_computation, print_options)
+  printer = codegen_main(self, printer, ast_inputs, ast_outputs, print_options)
+  return printer
+
+
+def codegen_full(self: Computation, f: FileIO, ast_inputs: List[isl.ast_node], ast_outputs: List[Tuple[isl.ast_node, isl.ast_node]], ast_computation: isl.ast_node, blas: bool = False):
+  printer = isl.printer.to_file(f)
+  printer = codegen_program(self, printer, ast_inputs, ast_outputs, ast_computation, blas)
+  printer.flush()
+
+
+def lower_program(self: Computation, overlap: bool = False, hoist: bool = False):
+  ast_shard_inputs = [lower_shard(self, access)
+                      for access in self.accesses if access.buffer.usage == UsageKind.Input]
+  ast_shard_outputs = [lower_shard(self, access)
+                       for access in self.accesses if access.buffer.usage == UsageKind.Output]
+  ast_computation = lower_computation(self, overlap, hoist)
+  return (ast_shard_inputs, ast_shard_outputs, ast_computation)
+
+
+def lower_and_codegen(self: Computation, f: FileIO, overlap: bool = False, blas: bool = False, hoist: bool = False):
+  codegen_full(self, f, *lower_program(self, overlap, hoist), blas=blas)
+
+
+def lower_and_codegen_str(self: Computation, overlap: bool = False, blas: bool = False, hoist: bool = False) -> str:
+  printer = isl.printer.to_str()
+  printer = codegen_program(self, printer, *lower_program(self, overlap, hoist), blas=blas)
+  return printer.get_str()
+
+
+def get_remote_transfers(self: Computation, info: TransferScheduleInfo) -> Tuple[isl.map, int]:
+  """ map the instances of one transfer that read data from another rank to their [dest rank, src rank],
+    and return it with the number of elements each instance moves. tensorized dims are folded into one instance.
+  """
+  sched_domain = self.schedule.range()
+  mesh_ndim = len(self.mesh.dims)
+  shard_ndim = info.access_shard_map.dim(isl.dim_type.OUT)
+  tensorized_dims = [i for i, v in enumerate(self.iter_vars)
+                     if self.iter_kinds.get(v) is IterKind.Tensorize]
+  instances = sched_domain
+  for i in info.redundancies:
+    instances = instances.fix_si(isl.dim_type.SET, i, 0)
+
+  src_map = info.access_schedule.apply_range(info.access_shard_map)
+  if info.access_adapt_schedule:
+    src_map = info.access_adapt_schedule.apply_range(src_map)
+  src_map = src_map.intersect_domain(instances)
+  src_rank = src_map.project_out(isl.dim_type.OUT, mesh_ndim, shard_ndim - mesh_ndim). \
+      reset_tuple_id(isl.dim_type.OUT)
+  dest_rank = info.access_schedule.intersect_domain(instances). \
+      project_out(isl.dim_type.OUT, mesh_ndim, sched_domain.n_dim() - mesh_ndim). \
+      reset_tuple_id(isl.dim_type.OUT)
+  remote = src_rank.subtract(src_rank.intersect(dest_rank)).domain()
+  links = dest_rank.flat_range_product(src_rank).intersect_domain(remote)
+  src_slice = src_map.intersect_domain(remote).project_out(isl.dim_type.OUT, 0, mesh_ndim)
+  for i in reversed(tensorized_dims):
+    links = links.project_out(isl.dim_type.IN, i, 1)
+    src_slice = src_slice.project_out(isl.dim_type.IN, i, 1)
+  if links.is_empty():
+    return (links, 0)
+  box_size = src_slice.range_simple_fixed_box_hull().size()
+  elements = reduce(lambda acc, i: acc * box_size.at(i).num_si(), range(box_size.size()), 1)
+  return (links, elements)
+
+
+def transfer_volume(self: Computation, info: TransferScheduleInfo) -> int:
+  """ number of elements received from a remote rank by all the instances of one transfer. """
+  links, elements = get_remote_transfers(self, info)
+  if elements == 0:
+    return 0
+  return links.domain().count_val().num_si() * elements
+
+
+def communication_volume(self: Computation) -> int:
+  schedule_info = get_schedule_info(self)
+  return sum(transfer_volume(self, info) for info in schedule_info.trans_infos)
+
+
+@dataclass(frozen=True)
+class LoweringResult:
+  name: str
+  mesh_shape: tuple[int, ...]
+  program: str | None
+  volume: int | None
+  error: str | None = None
+
+
+def lower_variant(name: str, schedule: Callable[[tuple[int, ...]], Computation], mesh_shape: tuple[int, ...]) -> LoweringResult:
+  try:
+    comp = schedule(mesh_shape)
+    return LoweringResult(name, mesh_shape, lower_and_codegen_str(comp), communication_volume(comp))
+  except Exception as e:
+    return LoweringResult(name, mesh_shape, None, None, f'{type(e).__name__}: {e}')
+
+
+def lower_variants(schedules: Dict[str, Callable[[tuple[int, ...]], Computation]],
+                   mesh_shapes: List[tuple[int, ...]],
+                   max_workers: int | None = None) -> List[LoweringResult]:
+  """ lower every (schedule, mesh shape) pair in a process pool.
+    each schedule builds the scheduled `Computation` for a given mesh shape,
+    e.g. `polyhedron_extract(matmul).distribute(..., Mesh(...)).shard(...)`.
+    it must be picklable, so define it as a top level function rather than a lambda.
+    results are sorted by the predicted communication volume, failed variants come last.
+  """
+  variants = [(name, schedule, tuple(shape))
+              for (name, schedule), shape in product(schedules.items(), mesh_shapes)]
+  # fork keeps the patched xdsl frontend and the kernels parsed in `__main__`.
+  with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+    results = list(executor.map(lower_variant, *zip(*variants)))
+  return sorted(results, key=lambda r: (r.volume is None, r.volume or 0))
@@ -0,0 +1,136 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+import math
+import isl
+from utils.distal import (Computation, CommPattern, Broadcast, Shift, TransferScheduleInfo,
+                          get_schedule_info, get_remote_transfers, detect_communication_pattern)
+
+Rank = Tuple[int, ...]
+Link = Tuple[Rank, Rank]  # (src, dest)
+
+
+@dataclass(frozen=True)
+class NetworkModel:
+  """ latency/bandwidth (alpha-beta) model of one point to point message.
+    the generated programs allocate float64 buffers, hence 8 bytes per element.
+  """
+  latency: float = 2e-6  # seconds
+  bandwidth: float = 10e9  # bytes per second
+  element_bytes: int = 8
+
+  def message_time(self, elements: int) -> float:
+    return self.latency + elements * self.element_bytes / self.bandwidth
+
+
+@dataclass(frozen=True)
+class TransferCost:
+  name: str
+  pattern: CommPattern
+  elements_per_message: int
+  steps: int  # serial iterations in which at least one rank receives remote data
+  rounds: int  # point to point rounds per step, log2(group) for a tree broadcast
+  messages: Dict[Link, int] = field(default_factory=dict)
+
+  @property
+  def volume(self) -> int:
+    return sum(self.messages.values()) * self.elements_per_message
+
+  @property
+  def sent(self) -> Dict[Rank, int]:
+    sent: Dict[Rank, int] = {}
+    for (src, _), n in self.messages.items():
+      sent[src] = sent.get(src, 0) + n * self.elements_per_message
+    return sent
+
+  @property
+  def received(self) -> Dict[Rank, int]:
+    received: Dict[Rank, int] = {}
+    for (_, dest), n in self.messages.items():
+      received[dest] = received.get(dest, 0) + n * self.elements_per_message
+    return received
+
+  def time(self, model: NetworkModel) -> float:
+    """ every rank receives at most one message per step, so a step costs one message per round. """
+    return self.steps * self.rounds * model.message_time(self.elements_per_message)
+
+
+@dataclass(frozen=True)
+class CommunicationCost:
+  transfers: Tuple[TransferCost, ...]
+
+  @property
+  def volume(self) -> int:
+    return sum(t.volume for t in self.transfers)
+
+  @property
+  def link_volume(self) -> Dict[Link, int]:
+    traffic: Dict[Link, int] = {}
+    for t in self.transfers:
+      for link, n in t.messages.items():
+        traffic[link] = traffic.get(link, 0) + n * t.elements_per_message
+    return traffic
+
+  @property
+  def link_messages(self) -> Dict[Link, int]:
+    messages: Dict[Link, int] = {}
+    for t in self.transfers:
+      for link, n in t.messages.items():
+        messages[link] = messages.get(link, 0) + n
+    return messages
+
+  @property
+  def sent(self) -> Dict[Rank, int]:
+    sent: Dict[Rank, int] = {}
+    for t in self.transfers:
+      for rank, n in t.sent.items():
+        sent[rank] = sent.get(rank, 0) + n
+    return sent
+
+  @property
+  def received(self) -> Dict[Rank, int]:
+    received: Dict[Rank, int] = {}
+    for t in self.transfers:
+      for rank, n in t.received.items():
+        received[rank] = received.get(rank, 0) + n
+    return received
+
+  def time(self, model: NetworkModel = NetworkModel()) -> float:
+    """ transfers are blocking in the generated programs, so their times add up. """
+    return sum(t.time(model) for t in self.transfers)
+
+
+def _point_coords(point: isl.point, n: int) -> Tuple[int, ...]:
+  return tuple(point.get_coordinate_val(isl.dim_type.SET, i).num_si() for i in range(n))
+
+
+def estimate_transfer(self: Computation, info: TransferScheduleInfo) -> TransferCost:
+  mesh_ndim = len(self.mesh.dims)
+  pattern = detect_communication_pattern(self, info)
+  links, elements = get_remote_transfers(self, info)
+  rounds = 1
+  if isinstance(pattern, Broadcast):
+    group = math.prod(self.mesh.shape[axis] for axis in pattern.axes)
+    rounds = max(1, math.ceil(math.log2(group)))
+  if elements == 0:
+    return TransferCost(info.trans_name, pattern, 0, 0, rounds)
+
+  steps = links.domain().project_out(isl.dim_type.SET, 0, mesh_ndim).count_val().num_si()
+  points: List[isl.point] = []
+  links.range().foreach_point(points.append)
+  messages: Dict[Link, int] = {}
+  for point in points:
+    coords = _point_coords(point, 2 * mesh_ndim)
+    count = links.intersect_range(isl.set(point)).domain().count_val().num_si()
+    dest, src = coords[:mesh_ndim], coords[mesh_ndim:]
+    if isinstance(pattern, Shift):
+      # the shard travels one hop per step, the same way `CommShift` forwards it.
+      src = tuple((c + pattern.direction) % self.mesh.shape[i] if i in pattern.axes else c
+                  for i, c in enumerate(dest))
+    messages[(src, dest)] = messages.get((src, dest), 0) + count
+  return TransferCost(info.trans_name, pattern, elements, steps, rounds, messages)
+
+
+def estimate_communication(self: Computation) -> CommunicationCost:
+  """ count per transfer, per link and per rank the elements moved by the lowered schedule of `self`. """
+  schedule_info = get_schedule_info(self)
+  return CommunicationCost(tuple(estimate_transfer(self, info) for info in schedule_info.trans_infos))
@@ -0,0 +1,264 @@
+import time
+from itertools import product
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import isl
+from utils.distal import (Computation, OpKind, UsageKind, POOL_RUNTIME, KERNEL_RUNTIME, is_matmul,
+                          lower_shard, lower_computation)
+
+Rank = Tuple[int, ...]
+Shards = Dict[Rank, Dict[str, np.ndarray]]
+
+_BINARY_OPS = {
+    isl.ast_expr_op_add: '+',
+    isl.ast_expr_op_sub: '-',
+    isl.ast_expr_op_mul: '*',
+    isl.ast_expr_op_div: '//',
+    isl.ast_expr_op_fdiv_q: '//',
+    isl.ast_expr_op_pdiv_q: '//',
+    isl.ast_expr_op_pdiv_r: '%',
+    isl.ast_expr_op_zdiv_r: '%',
+    isl.ast_expr_op_eq: '==',
+    isl.ast_expr_op_le: '<=',
+    isl.ast_expr_op_lt: '<',
+    isl.ast_expr_op_ge: '>=',
+    isl.ast_expr_op_gt: '>',
+    isl.ast_expr_op_and: 'and',
+    isl.ast_expr_op_and_then: 'and',
+    isl.ast_expr_op_or: 'or',
+    isl.ast_expr_op_or_else: 'or',
+}
+
+
+class AstCompiler:
+  """ translate a lowered distal `isl.ast_node` into python source.
+    the mesh loops are kept, so one function runs every rank in turn: the local buffers of a rank live in
+    `SHARDS[rank][name]`, and a transfer reads the slice straight from the shard of its source rank.
+    loops over `vector_iters` are replaced by broadcastable `np.arange`, which turns the element wise
+    scatter/gather of `lower_shard` into one fancy-indexed copy per rank.
+  """
+
+  def __init__(self, mesh_dims: List[str], local_buffers: List[str], vector_iters: List[str] = [], namespace: dict = None):
+    self.mesh_dims = mesh_dims
+    self.local_buffers = local_buffers
+    self.vector_iters = vector_iters
+    self.namespace = namespace or {'np': np}
+
+  def rank(self, coords: List[str] = None) -> str:
+    return f"({', '.join(coords or self.mesh_dims)},)"
+
+  def buffer(self, name: str, rank: str = None) -> str:
+    if name in self.local_buffers:
+      return f"SHARDS[{rank or self.rank()}][{name!r}]"
+    return name
+
+  def access(self, expr: isl.ast_expr_op_call, rank: str = None) -> str:
+    name = expr.get_op_arg(1).id().name()
+    indices = [self.expr(expr.get_op_arg(i)) for i in range(2, expr.op_n_arg())]
+    return f"{self.buffer(name, rank)}[{', '.join(indices)}]"
+
+  def source_rank(self, comm: isl.ast_expr_op_call, source: isl.ast_expr_op_call) -> str:
+    coords = [self.expr(source.get_op_arg(i)) for i in range(1, source.op_n_arg())]
+    if comm.get_op_arg(0).id().name() == OpKind.CommBroadcast.name:
+      # a broadcast only names the coordinates along its axes, the others are the receiver's.
+      axes = [comm.get_op_arg(i).get_val().num_si() for i in range(1, comm.op_n_arg())]
+      full = list(self.mesh_dims)
+      for axis, coord in zip(axes, coords):
+        full[axis] = coord
+      coords = full
+    return self.rank(coords)
+
+  def expr(self, expr: isl.ast_expr) -> str:
+    match expr:
+      case isl.ast_expr_id():
+        return expr.id().name()
+      case isl.ast_expr_int():
+        return str(expr.get_val().num_si())
+      case isl.ast_expr_op_call():
+        return self.call(expr)
+      case isl.ast_expr_op_minus():
+        return f"(-{self.expr(expr.get_op_arg(0))})"
+      case isl.ast_expr_op_min() | isl.ast_expr_op_max():
+        fn = 'np.minimum' if isinstance(expr, isl.ast_expr_op_min) else 'np.maximum'
+        res = self.expr(expr.get_op_arg(0))
+        for i in range(1, expr.op_n_arg()):
+          res = f"{fn}({res}, {self.expr(expr.get_op_arg(i))})"
+        return res
+      case isl.ast_expr_op_select() | isl.ast_expr_op_cond():
+        return f"np.where({', '.join(self.expr(expr.get_op_arg(i)) for i in range(3))})"
+      case isl.ast_expr_op() if type(expr) in _BINARY_OPS:
+        return f"({self.expr(expr.get_op_arg(0))} {_BINARY_OPS[type(expr)]} {self.expr(expr.get_op_arg(1))})"
+      case _:
+        raise NotImplementedError(f"Unsupported expression: {expr.to_C_str()}")
+
+  def call(self, expr: isl.ast_expr_op_call) -> str:
+    args = [expr.get_op_arg(i) for i in range(1, expr.op_n_arg())]
+    match expr.get_op_arg(0).id().name():
+      case OpKind.Access.name:
+        return self.access(expr)
+      case OpKind.Slice.name:
+        return ':'.join(self.expr(arg) for arg in args)
+      case OpKind.Rank.name:
+        return self.rank([self.expr(arg) for arg in args])
+      case OpKind.Mul.name:
+        return f"{self.expr(args[0])} * {self.expr(args[1])}"
+      case OpKind.MatMul.name:
+        return f"{self.expr(args[0])} @ {self.expr(args[1])}"
+      case OpKind.MatMulTransA.name:
+        return f"{self.expr(args[0])}.T @ {self.expr(args[1])}"
+      case name:
+        raise NotImplementedError(f"Unsupported call: {name}")
+
+  def stmt(self, expr: isl.ast_expr_op_call) -> str:
+    args = [expr.get_op_arg(i) for i in range(1, expr.op_n_arg())]
+    match expr.get_op_arg(0).id().name():
+      case OpKind.Assign.name | OpKind.AugAssign.name if is_matmul(args[1]):
+        a, b = self.expr(args[1].get_op_arg(1)), self.expr(args[1].get_op_arg(2))
+        if args[1].get_op_arg(0).id().name() == OpKind.MatMulTransA.name:
+          a += '.T'
+        return f"Gemm({self.expr(args[0])}, {a}, {b}, {expr.get_op_arg(0).id().name() == OpKind.AugAssign.name})"
+      case OpKind.Assign.name:
+        return f"{self.expr(args[0])} = {self.expr(args[1])}"
+      case OpKind.AugAssign.name:
+        return f"{self.expr(args[0])} += {self.expr(args[1])}"
+      case OpKind.AssertEqual.name:
+        # gather the local shard back into the global buffer.
+        return f"{self.expr(args[1])} = {self.expr(args[0])}"
+      case OpKind.Alloc.name:
+        return f"{args[0].id().name()} = np.zeros([{', '.join(self.expr(arg) for arg in args[1:])}], dtype=DTYPE)"
+      case OpKind.Acquire.name:
+        return f"{args[0].id().name()} = POOL.acquire([{', '.join(self.expr(arg) for arg in args[1:])}], DTYPE)"
+      case OpKind.Release.name:
+        return f"POOL.release({args[0].id().name()})"
+      case OpKind.Trans.name | OpKind.ITrans.name:
+        comm, src, source, dest = args[0], args[1], args[2], args[3]
+        return f"np.copyto({self.expr(dest)}, {self.access(src, self.source_rank(comm, source))})"
+      case OpKind.Wait.name:
+        return "pass"
+      case name:
+        raise NotImplementedError(f"Unsupported statement: {name}")
+
+  def vector_shape(self, it: str) -> str:
+    shape = [-1 if v == it else 1 for v in self.vector_iters]
+    return f"({', '.join(map(str, shape))},)"
+
+  def node(self, node: isl.ast_node, indent: int = 0) -> List[str]:
+    pad = '  ' * indent
+    match node:
+      case isl.ast_node_block():
+        children = node.get_children()
+        return [line for i in range(children.size()) for line in self.node(children.get_at(i), indent)]
+      case isl.ast_node_mark():
+        return self.node(node.get_node(), indent)
+      case isl.ast_node_user():
+        return [pad + self.stmt(node.get_expr())]
+      case isl.ast_node_if():
+        lines = [f"{pad}if {self.expr(node.get_cond())}:", *self.node(node.get_then_node(), indent + 1)]
+        if node.has_else_node():
+          lines += [f"{pad}else:", *self.node(node.get_else_node(), indent + 1)]
+        return lines
+      case isl.ast_node_for():
+        it = self.expr(node.get_iterator())
+        init, inc, cond = self.expr(node.get_init()), self.expr(node.get_inc()), node.get_cond()
+        bounded = isinstance(cond, (isl.ast_expr_op_le, isl.ast_expr_op_lt)) and \
+            self.expr(cond.get_op_arg(0)) == it
+        if bounded:
+          upper = self.expr(cond.get_op_arg(1))
+          if isinstance(cond, isl.ast_expr_op_le):
+            upper = f"{upper} + 1"
+          if it in self.vector_iters:
+            return [f"{pad}{it} = np.arange({init}, {upper}, {inc}).reshape({self.vector_shape(it)})",
+                    *self.node(node.get_body(), indent)]
+          return [f"{pad}for {it} in range({init}, {upper}, {inc}):", *self.node(node.get_body(), indent + 1)]
+        assert it not in self.vector_iters, "only rectangular loops can be vectorized"
+        return [f"{pad}{it} = {init}", f"{pad}while {self.expr(cond)}:",
+                *self.node(node.get_body(), indent + 1), f"{pad}  {it} += {inc}"]
+      case _:
+        raise NotImplementedError(f"Unsupported node: {type(node)}")
+
+  def compile(self, name: str, params: List[str], node: isl.ast_node) -> Tuple[Callable, str]:
+    body = self.node(node, 1) or ['  pass']
+    source = '\n'.join([f"def {name}({', '.join(params)}):", *body]) + '\n'
+    namespace = dict(self.namespace)
+    exec(compile(source, f'<distal {name}>', 'exec'), namespace)
+    return (namespace[name], source)
+
+
+def kernel_namespace(blas: bool = False) -> dict:
+  """ the `POOL` and `Gemm` of the generated programs, with the blas of scipy when `blas` is set and scipy is installed. """
+  namespace = {'np': np, 'USE_BLAS': False}
+  if blas:
+    try:
+      from scipy.linalg.blas import get_blas_funcs
+      namespace.update(USE_BLAS=True, get_blas_funcs=get_blas_funcs)
+    except ImportError:
+      pass
+  exec(POOL_RUNTIME, namespace)
+  exec(KERNEL_RUNTIME, namespace)
+  return namespace
+
+
+class NumpyExecutor:
+  """ execute a scheduled `Computation` without MPI, all the mesh ranks are simulated in this process.
+    the buffers are passed in the order of `Computation.accesses`, like the arguments of the generated program.
+  """
+
+  def __init__(self, comp: Computation, overlap: bool = False, blas: bool = False, hoist: bool = False):
+    self.comp = comp
+    self.ranks: List[Rank] = list(product(*[range(extent) for extent in comp.mesh.shape]))
+    mesh_dims = list(map(str, comp.mesh.dims))
+    names = [access.buffer.name for access in comp.accesses]
+    self.shapes: Dict[str, Tuple[int, ...]] = {}
+    self.scatters: Dict[str, Callable] = {}
+    self.gathers: Dict[str, Callable] = {}
+    self.sources: Dict[str, str] = {}
+    for access in comp.accesses:
+      name = access.buffer.name
+      alloc, ast_node = lower_shard(comp, access)
+      alloc_expr = alloc.get_expr()
+      self.shapes[name] = tuple(alloc_expr.get_op_arg(i).get_val().num_si()
+                                for i in range(2, alloc_expr.op_n_arg()))
+      compiler = AstCompiler(mesh_dims, names, list(map(str, access.buffer.dims)))
+      kind = 'scatter' if access.buffer.usage == UsageKind.Input else 'gather'
+      fn, self.sources[f'{kind}_{name}'] = compiler.compile(
+          f'{kind}_{name}', ['SHARDS', f'Global{name}'], ast_node)
+      (self.scatters if kind == 'scatter' else self.gathers)[name] = fn
+    self.computation, self.sources['computation'] = AstCompiler(mesh_dims, names, namespace=kernel_namespace(blas)).compile(
+        'computation', ['SHARDS', 'DTYPE'], lower_computation(comp, overlap, hoist))
+    self.timings: Dict[str, float] = {}
+
+  def scatter(self, *buffers: np.ndarray) -> Shards:
+    dtype = np.result_type(*[b for b in buffers if b is not None])
+    shards = {rank: {name: np.zeros(shape, dtype) for name, shape in self.shapes.items()}
+              for rank in self.ranks}
+    for access, buffer in zip(self.comp.accesses, buffers):
+      if access.buffer.name in self.scatters:
+        self.scatters[access.buffer.name](shards, buffer)
+    return shards
+
+  def compute(self, shards: Shards):
+    dtype = next(iter(shards[self.ranks[0]].values())).dtype
+    self.computation(shards, dtype)
+
+  def gather(self, shards: Shards, *buffers: np.ndarray) -> List[np.ndarray]:
+    outputs = []
+    for access, buffer in zip(self.comp.accesses, buffers):
+      if access.buffer.name in self.gathers:
+        if buffer is None:
+          dtype = shards[self.ranks[0]][access.buffer.name].dtype
+          buffer = np.zeros(tuple(dim.extent for dim in access.buffer.dims), dtype)
+        self.gathers[access.buffer.name](shards, buffer)
+        outputs.append(buffer)
+    return outputs
+
+  def __call__(self, *buffers: np.ndarray) -> List[np.ndarray]:
+    """ pass `None` for an output buffer to allocate it, returns the output buffers. """
+    start = time.perf_counter()
+    shards = self.scatter(*buffers)
+    scattered = time.perf_counter()
+    self.compute(shards)
+    computed = time.perf_counter()
+    outputs = self.gather(shards, *buffers)
+    self.timings = {'scatter': scattered - start, 'compute': computed - scattered,
+                    'gather': time.perf_counter() - computed}
+    return outputs
@@ -0,0 +1,107 @@
+import re
+from fractions import Fraction
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+from utils.distal import Computation, lower_and_codegen_str
+
+# an integer literal of the generated program, not a digit of a name (`s0`, `c1`) or of a float (`1.0`).
+_INT_LITERAL = re.compile(r'(?<![\w.])\d+(?![\w.])')
+
+
+@dataclass(frozen=True)
+class ProgramTemplate:
+  """ a lowered program whose integer literals are affine functions of the size parameters `params`.
+    `texts` are the pieces of the program between the literals, `literals[i]` holds the constant term
+    then one coefficient per parameter of the i-th literal.
+  """
+  params: Tuple[str, ...]
+  texts: Tuple[str, ...]
+  literals: Tuple[Tuple[Fraction, ...], ...]
+
+  def instantiate(self, **sizes: int) -> str:
+    assert set(sizes) == set(self.params), f"expected the sizes of {self.params}"
+    values = [sizes[p] for p in self.params]
+    pieces = [self.texts[0]]
+    for literal, text in zip(self.literals, self.texts[1:]):
+      value = literal[0] + sum(c * v for c, v in zip(literal[1:], values))
+      if value.denominator != 1 or value < 0:
+        raise ValueError(f"{sizes} do not divide the tiles of the template")
+      pieces.append(str(value.numerator))
+      pieces.append(text)
+    return ''.join(pieces)
+
+
+def _split_literals(program: str) -> Tuple[List[str], List[int]]:
+  return _INT_LITERAL.split(program), list(map(int, _INT_LITERAL.findall(program)))
+
+
+def _context(texts: List[str], i: int) -> str:
+  """ the program around the i-th literal, for the error messages. """
+  return f"{texts[i][-30:]}<literal {i}>{texts[i + 1][:30]}"
+
+
+def _render_literals(recipe: Callable[..., Computation], render: Callable[[Computation], str],
+                     texts: List[str], sizes: Dict[str, int]) -> List[int]:
+  probe_texts, probe = _split_literals(render(recipe(**sizes)))
+  if probe_texts != texts:
+    raise ValueError(f"the lowered program changes shape at the sizes {sizes}")
+  return probe
+
+
+def lower_template(recipe: Callable[..., Computation], sizes: Dict[str, int],
+                   render: Callable[[Computation], str] = lower_and_codegen_str) -> ProgramTemplate:
+  """ lower `recipe(**sizes)` once, then with each parameter doubled and tripled, and fit every literal of the
+    rendered programs as an affine function of the sizes. the mesh is part of the recipe: a tile size is
+    `size / extent`, which is affine in the size but not in the extent, see `MeshTemplates` for any mesh.
+    raises ValueError, naming the literal, when one is not a single affine function of the sizes (the two probes
+    of a parameter disagree, or a lowering with every size multiplied is not predicted).
+  """
+  params = tuple(sizes)
+  texts, base = _split_literals(render(recipe(**sizes)))
+  coefficients = []
+  for param in params:
+    doubled = _render_literals(recipe, render, texts, {**sizes, param: 2 * sizes[param]})
+    tripled = _render_literals(recipe, render, texts, {**sizes, param: 3 * sizes[param]})
+    coefficient = []
+    for i, (b, d, t) in enumerate(zip(base, doubled, tripled)):
+      if t - d != d - b:
+        raise ValueError(f"{_context(texts, i)} is {b}, {d}, {t} for {param} = {sizes[param]} * (1, 2, 3), "
+                         f"it is not affine in {param}")
+      coefficient.append(Fraction(d - b, sizes[param]))
+    coefficients.append(coefficient)
+  literals = tuple((Fraction(b) - sum(c[i] * sizes[p] for c, p in zip(coefficients, params)),
+                    *(c[i] for c in coefficients)) for i, b in enumerate(base))
+  template = ProgramTemplate(params, tuple(texts), literals)
+
+  # the literals may still depend on products of the sizes, which only a joint change shows.
+  check = {p: (k + 3) * v for k, (p, v) in enumerate(sizes.items())}
+  values = [check[p] for p in params]
+  for i, (literal, actual) in enumerate(zip(literals, _render_literals(recipe, render, texts, check))):
+    predicted = literal[0] + sum(c * v for c, v in zip(literal[1:], values))
+    if predicted != actual:
+      raise ValueError(f"{_context(texts, i)} is {actual} at the sizes {check}, the affine fit predicts "
+                       f"{predicted}, it is not affine in the sizes")
+  return template
+
+
+class MeshTemplates:
+  """ the templates of `recipe(mesh, **sizes)` per mesh shape, each lowered on the first instantiation with that
+    mesh, so a program of any size on any mesh costs one template per mesh and a formatting per size.
+    `sizes` are the sizes the templates are fitted at, they must be divisible by every mesh used.
+  """
+
+  def __init__(self, recipe: Callable[..., Computation], sizes: Dict[str, int],
+               render: Callable[[Computation], str] = lower_and_codegen_str):
+    self.recipe = recipe
+    self.sizes = sizes
+    self.render = render
+    self.templates: Dict[Tuple[int, ...], ProgramTemplate] = {}
+
+  def template(self, mesh: Tuple[int, ...]) -> ProgramTemplate:
+    mesh = tuple(mesh)
+    if mesh not in self.templates:
+      self.templates[mesh] = lower_template(lambda **sizes: self.recipe(mesh, **sizes), self.sizes, self.render)
+    return self.templates[mesh]
+
+  def instantiate(self, mesh: Tuple[int, ...], **sizes: int) -> str:
+    return self.template(mesh).instantiate(**sizes)
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Dict, List, Union
 import pandas
 import numpy as np
 import isl
@@ -106,6 +106,7 @@ def schedule_to_code(domain: isl.union_map, schedule: isl.map):
 
 
 def schedule_tree_to_code(isl_schedule: isl.schedule, i=0):
+  """ marks inserted by `insert_parallel_marks` are printed as openmp pragmas. """
   build = isl.ast_build.from_context(isl.set(" { : } "))
   ast_node = build.node_from(isl_schedule)
   printer = isl.printer.to_file_path(f'/tmp/{i}.c')
@@ -113,4 +114,197 @@ def schedule_tree_to_code(isl_schedule: isl.schedule, i=0):
   options = isl.ast_print_options.alloc()
   printer = ast_node.print(printer, options)
   printer = printer.flush()
+  source = CSource(f'/tmp/{i}.c')
+  source.context = parallel_pragmas(source.context)
+  return source
+
+
+PARALLEL_PRAGMAS = {
+    'parallel': '#pragma omp parallel for',
+    'simd': '#pragma omp simd',
+    'parallel_simd': '#pragma omp parallel for simd',
+}
+
+
+def is_stride_one(node: isl.schedule_node_band, accesses: isl.union_map) -> bool:
+  """ whether the innermost loop of `node`, a band right above the leaves, moves every access of `accesses`
+    (statement instances -> elements, possibly tagged) by at most one element of the last array dimension.
+  """
+  leaf = node.child(0)
+  schedule = leaf.get_prefix_schedule_union_map().intersect_domain(node.get_domain())
+  xs = [f'x{i}' for i in range(leaf.get_schedule_depth())]
+  shift = isl.union_map(f"{{ [{', '.join(xs)}] -> [{', '.join(xs[:-1] + [f'{xs[-1]} + 1'])}] }}")
+  successor = schedule.apply_range(shift).apply_range(schedule.reverse())
+
+  strides: List[isl.set] = []
+
+  def collect(access: isl.map):
+    if access.domain_is_wrapping():
+      access = access.domain_factor_domain()
+    access = isl.union_map(access)
+    access.reverse().apply_range(successor).apply_range(access).deltas().foreach_set(strides.append)
+  accesses.foreach_map(collect)
+
+  for stride in strides:
+    ndim = stride.dim(isl.dim_type.SET)
+    allowed = isl.set.universe(stride.get_space())
+    for i in range(ndim - 1):
+      allowed = allowed.fix_si(isl.dim_type.SET, i, 0)
+    if ndim:
+      allowed = allowed.lower_bound_si(isl.dim_type.SET, ndim - 1, -1).upper_bound_si(isl.dim_type.SET, ndim - 1, 1)
+    if not stride.is_subset(allowed):
+      return False
+  return True
+
+
+def insert_parallel_marks(schedule: isl.schedule, accesses: isl.union_map = None, nested: bool = False) -> isl.schedule:
+  """ mark the outermost coincident loops `parallel` and, when `accesses` is given, the innermost coincident
+    stride-1 loops `simd` (`parallel_simd` when they are the same loop). a marked band member is split into a
+    band of its own, so the mark sits right above its loop.
+    coincident loops nested in a parallel loop are left sequential unless `nested` is set, then every coincident
+    member is marked `parallel`.
+  """
+  def in_parallel(node: isl.schedule_node) -> bool:
+    # the traversal is bottom up, so the ancestors are still the original bands.
+    for generation in range(1, node.get_tree_depth() + 1):
+      ancestor = node.ancestor(generation)
+      if isinstance(ancestor, isl.schedule_node_band) and \
+              any(ancestor.member_get_coincident(i) for i in range(ancestor.n_member())):
+        return True
+    return False
+
+  def insert_marks(node: isl.schedule_node) -> isl.schedule_node:
+    if not isinstance(node, isl.schedule_node_band) or node.n_member() == 0:
+      return node
+    n = node.n_member()
+    coincident = [node.member_get_coincident(i) for i in range(n)]
+    marks: Dict[int, str] = {}
+    if nested:
+      marks = {i: 'parallel' for i in range(n) if coincident[i]}
+    elif any(coincident) and not in_parallel(node):
+      marks[coincident.index(True)] = 'parallel'
+    if accesses is not None and coincident[-1] and isinstance(node.child(0), isl.schedule_node_leaf) and \
+            is_stride_one(node, accesses):
+      marks[n - 1] = 'parallel_simd' if n - 1 in marks else 'simd'
+    if not marks:
+      return node
+
+    depth = node.get_tree_depth()
+    first = 0  # the band member `node` starts with
+    for member in sorted(marks):
+      if member > first:
+        node = node.split(member - first).child(0)
+      if node.n_member() > 1:
+        node = node.split(1)
+      node = node.insert_mark(isl.id(marks[member])).child(0)
+      first = member + 1
+      if first < n:
+        node = node.child(0)
+    while node.get_tree_depth() > depth:
+      node = node.parent()
+    return node
+
+  return schedule.map_schedule_node_bottom_up(insert_marks)
+
+
+def parallel_pragmas(code: str) -> str:
+  """ replace the `// parallel` like comments isl prints for the marks of `insert_parallel_marks` by their pragma. """
+  lines = []
+  for line in code.split('\n'):
+    indent, _, mark = line.partition('// ')
+    if not indent.strip() and mark in PARALLEL_PRAGMAS:
+      line = indent + PARALLEL_PRAGMAS[mark]
+    lines.append(line)
+  return '\n'.join(lines)
+
+
+TILE_MACROS = """#define floord(n, d) (((n) < 0) ? -((-(n) + (d) - 1) / (d)) : (n) / (d))
+#define ceild(n, d) (((n) < 0) ? -((-(n)) / (d)) : ((n) + (d) - 1) / (d))
+#define min(x, y) ((x) < (y) ? (x) : (y))
+#define max(x, y) ((x) > (y) ? (x) : (y))
+"""
+
+
+def parametric_tile_to_code(domain: isl.union_set, schedule: isl.union_map, sizes: List[str], i=0):
+  """ tile the band `schedule` with the symbolic tile sizes `sizes` (one isl parameter per band dimension, the
+    same name may be reused), so one generated kernel serves every tile size chosen at run time.
+    the tile loops step over the tile origins `o0, o1, ...` by the tile sizes. the point loops are built once with
+    the origins as parameters, and the full tiles are isolated (ast build option `isolate`), so their loops have
+    no bound checks, the boundary tiles are generated atomically.
+  """
+  n = len(sizes)
+  maps = schedule.get_map_list()
+  for k in range(maps.size()):
+    band = maps.at(k).dim(isl.dim_type.OUT)
+    assert band == n, f"{n} tile sizes {sizes} for the {band} dimensional band of {maps.at(k)}, give one per dimension"
+  params = ', '.join(dict.fromkeys(sizes))
+  origins = [f'o{k}' for k in range(n)]
+  points = [f'c{k}' for k in range(n)]
+  in_tile = ' and '.join(f'{o} <= {c} < {o} + {t}' for o, c, t in zip(origins, points, sizes))
+  context = isl.set(f"[{params}] -> {{ : {' and '.join(f'{t} > 0' for t in dict.fromkeys(sizes))} }}")
+  tiles = isl.map(f"[{params}] -> {{ tile[{', '.join(origins)}] -> [{', '.join(points)}] : {in_tile} }}")
+  box = isl.set(f"[{params}, {', '.join(origins)}] -> {{ [{', '.join(points)}] : {in_tile} }}")
+
+  # a tile is full when every statement runs on each of its points.
+  schedule = schedule.intersect_domain(domain)
+  partial = isl.set.empty(box.params().get_space())
+  maps = schedule.get_map_list()
+  for k in range(maps.size()):
+    partial = partial.union(box.subtract(maps.at(k).range()).params())
+  full = box.intersect_params(box.params().subtract(partial))
+
+  # the point loops, with the tile origins as parameters.
+  points_domain = schedule.intersect_range(isl.union_set(box)).domain()
+  point_tree = isl.schedule.from_domain(points_domain)
+  point_tree = point_tree.insert_partial_schedule(isl.multi_union_pw_aff.from_union_map(schedule.intersect_domain(points_domain)))
+  band = point_tree.get_root().child(0)
+  isolate = isl.union_set(isl.map.from_range(full).wrap().set_tuple_name('isolate'))
+  band = band.set_ast_build_options(isolate.union(isl.union_set("{ [isolate[] -> separate[x]]; atomic[x] }")))
+  point_ast = isl.ast_build.from_context(context).node_from(band.get_schedule())
+
+  # the tile loops, over the origins of the tiles that hold a point of the band.
+  origins_set = tiles.intersect_range(schedule.range().extract_set(tiles.get_space().range())).domain()
+  iterators = isl.id_list(isl.id(origins[0]))
+  for o in origins[1:]:
+    iterators = iterators.add(isl.id(o))
+  build = isl.ast_build.from_context(context).set_iterators(iterators)
+  tile_schedule = isl.union_map(f"{{ tile[{', '.join(origins)}] -> [{', '.join(origins)}] }}")
+  tile_ast = build.node_from_schedule_map(tile_schedule.intersect_domain(isl.union_set(origins_set)))
+  size_of = dict(zip(origins, sizes))
+
+  def print_tile_for(p: isl.printer, opt: isl.ast_print_options, node: isl.ast_node_for) -> isl.printer:
+    # the aligned tile origins: the first multiple of the tile size that is at least the lower bound.
+    it = node.get_iterator()
+    size = size_of[it.get_id().name()]
+    p = p.start_line()
+    p = p.print_str("for (int ")
+    p = p.print_ast_expr(it)
+    p = p.print_str(f" = {size} * ceild(")
+    p = p.print_ast_expr(node.get_init())
+    p = p.print_str(f", {size}); ")
+    p = p.print_ast_expr(node.get_cond())
+    p = p.print_str("; ")
+    p = p.print_ast_expr(it)
+    p = p.print_str(f" += {size}) {{")
+    p = p.end_line()
+    p = p.indent(2)
+    p = node.get_body().print(p, opt)
+    p = p.indent(-2)
+    p = p.start_line()
+    p = p.print_str("}")
+    p = p.end_line()
+    return p
+
+  def print_point_loops(p: isl.printer, opt: isl.ast_print_options, node: isl.ast_node_user) -> isl.printer:
+    return point_ast.print(p, isl.ast_print_options.alloc())
+
+  printer = isl.printer.to_str()
+  printer = printer.set_output_format(isl.format.C)
+  printer = printer.print_str(TILE_MACROS)
+  options = isl.ast_print_options.alloc()
+  options = options.set_print_for(print_tile_for)
+  options = options.set_print_user(print_point_loops)
+  printer = tile_ast.print(printer, options)
+  with open(f'/tmp/{i}.c', 'w') as f:
+    f.write(printer.get_str())
   return CSource(f'/tmp/{i}.c')
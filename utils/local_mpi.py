@@ -0,0 +1,424 @@
+import sys
+import os
+import time
+import types
+import runpy
+import queue
+import operator
+import traceback
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+ANY_SOURCE = -1
+ANY_TAG = -1
+# internal tags, user tags are non negative.
+_ACK_TAG = -2
+_BCAST_TAG = -3
+_OBJ_BCAST_TAG = -4
+_OBJ_GATHER_TAG = -5
+
+
+@dataclass
+class RankStats:
+  messages_sent: int = 0
+  messages_received: int = 0
+  bytes_sent: int = 0
+  bytes_received: int = 0
+  comm_time: float = 0.0  # seconds spent inside communication calls
+
+
+@dataclass(frozen=True)
+class _Message:
+  context: tuple
+  source: int  # world rank
+  tag: int
+  shm_name: Optional[str] = None
+  dtype: str = ''
+  shape: Tuple[int, ...] = ()
+  ack: bool = False  # the receiver acknowledges the copy, the sender unlinks the segment
+  obj: Any = None
+
+
+class Op:
+  def __init__(self, fn: Callable[[Any, Any], Any]):
+    self.fn = fn
+
+  def __call__(self, a, b):
+    return self.fn(a, b)
+
+
+MAX = Op(np.maximum)
+MIN = Op(np.minimum)
+SUM = Op(operator.add)
+PROD = Op(operator.mul)
+
+
+class _Endpoint:
+  """ the inboxes of every world rank, and the messages of this rank that arrived before they were expected. """
+
+  def __init__(self, rank: int, inboxes: Sequence[multiprocessing.SimpleQueue]):
+    self.rank = rank
+    self.inboxes = inboxes
+    self.unexpected: List[_Message] = []
+    self.stats = RankStats()
+
+  def post(self, dest: int, message: _Message):
+    self.inboxes[dest].put(message)
+
+  def match(self, context: tuple, source: int, tag: int) -> _Message:
+    def matches(m: _Message) -> bool:
+      return m.context == context and source in (ANY_SOURCE, m.source) and tag in (ANY_TAG, m.tag)
+    for i, message in enumerate(self.unexpected):
+      if matches(message):
+        return self.unexpected.pop(i)
+    while True:
+      message = self.inboxes[self.rank].get()
+      if matches(message):
+        return message
+      self.unexpected.append(message)
+
+
+def _timed(fn):
+  """ add the time spent in a communication call to the stats of the rank. """
+  def wrapper(self, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return fn(self, *args, **kwargs)
+    finally:
+      self.endpoint.stats.comm_time += time.perf_counter() - start
+  wrapper.__name__ = fn.__name__
+  return wrapper
+
+
+def _as_array(buf) -> np.ndarray:
+  if isinstance(buf, (list, tuple)):  # [buffer, datatype]
+    buf = buf[0]
+  return np.asarray(buf)
+
+
+class Request:
+  def __init__(self, wait: Callable[[], None] = None):
+    self._wait = wait
+
+  def Wait(self, status=None):
+    if self._wait:
+      wait, self._wait = self._wait, None
+      wait()
+
+  def Test(self, status=None) -> bool:
+    self.Wait()
+    return True
+
+  @staticmethod
+  def Waitall(requests: Sequence['Request'], statuses=None):
+    for request in requests:
+      request.Wait()
+
+
+class Comm:
+  """ a group of world ranks, addressed by their index in `ranks`. """
+
+  def __init__(self, endpoint: _Endpoint, ranks: Sequence[int], context: tuple):
+    self.endpoint = endpoint
+    self.ranks = list(ranks)
+    self.context = context
+    self.n_created = 0
+
+  def Get_rank(self) -> int:
+    return self.ranks.index(self.endpoint.rank)
+
+  def Get_size(self) -> int:
+    return len(self.ranks)
+
+  @property
+  def rank(self) -> int:
+    return self.Get_rank()
+
+  @property
+  def size(self) -> int:
+    return self.Get_size()
+
+  # buffers travel through a shared memory segment, the payload is never pickled.
+  def _send_buffer(self, buf, dests: Sequence[int], tag: int) -> SharedMemory:
+    """ stage `buf` once for all `dests`, with several receivers the segment is unlinked by `_release`. """
+    array = _as_array(buf)
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    staged = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+    np.copyto(staged, array)
+    del staged
+    for dest in dests:
+      self.endpoint.post(self.ranks[dest], _Message(self.context, self.endpoint.rank, tag,
+                                                    shm.name, array.dtype.str, array.shape, len(dests) > 1))
+    self.endpoint.stats.messages_sent += len(dests)
+    self.endpoint.stats.bytes_sent += len(dests) * array.nbytes
+    return shm
+
+  def _recv_buffer(self, buf, source: int, tag: int):
+    array = _as_array(buf)
+    message = self.endpoint.match(self.context, source if source == ANY_SOURCE else self.ranks[source], tag)
+    shm = SharedMemory(name=message.shm_name)
+    staged = np.ndarray(message.shape, np.dtype(message.dtype), buffer=shm.buf)
+    np.copyto(array, staged.reshape(array.shape))
+    nbytes = staged.nbytes
+    del staged
+    shm.close()
+    if message.ack:
+      self.endpoint.post(message.source, _Message(self.context, self.endpoint.rank, _ACK_TAG))
+    else:
+      shm.unlink()
+    self.endpoint.stats.messages_received += 1
+    self.endpoint.stats.bytes_received += nbytes
+
+  def _release(self, shm: SharedMemory, acks: Sequence[int] = ()):
+    """ close the staged segment of a send, waiting for the receivers to copy it out when it is shared. """
+    for rank in acks:
+      self.endpoint.match(self.context, self.ranks[rank], _ACK_TAG)
+    shm.close()
+    if acks:
+      shm.unlink()
+
+  @_timed
+  def Send(self, buf, dest: int, tag: int = 0):
+    self._release(self._send_buffer(buf, [dest], tag))
+
+  @_timed
+  def Recv(self, buf, source: int = ANY_SOURCE, tag: int = ANY_TAG, status=None):
+    self._recv_buffer(buf, source, tag)
+
+  @_timed
+  def Isend(self, buf, dest: int, tag: int = 0) -> Request:
+    self._release(self._send_buffer(buf, [dest], tag))
+    return Request()
+
+  def Irecv(self, buf, source: int = ANY_SOURCE, tag: int = ANY_TAG) -> Request:
+    return Request(lambda: self.Recv(buf, source, tag))
+
+  @_timed
+  def Sendrecv(self, sendbuf, dest: int, sendtag: int = 0, recvbuf=None,
+               source: int = ANY_SOURCE, recvtag: int = ANY_TAG, status=None):
+    self._release(self._send_buffer(sendbuf, [dest], sendtag))
+    self._recv_buffer(recvbuf, source, recvtag)
+
+  @_timed
+  def Sendrecv_replace(self, buf, dest: int, sendtag: int = 0,
+                       source: int = ANY_SOURCE, recvtag: int = ANY_TAG, status=None):
+    # sends are buffered in their own segment, so `buf` can be received in place right away.
+    self._release(self._send_buffer(buf, [dest], sendtag))
+    self._recv_buffer(buf, source, recvtag)
+
+  def _start_bcast(self, buf, root: int) -> Callable[[], None]:
+    # the root stages `buf` once, every other rank copies it out of the same segment.
+    if self.Get_rank() != root:
+      return lambda: self._recv_buffer(buf, root, _BCAST_TAG)
+    others = [r for r in range(self.Get_size()) if r != root]
+    if not others:
+      return lambda: None
+    shm = self._send_buffer(buf, others, _BCAST_TAG)
+    return lambda: self._release(shm, others if len(others) > 1 else ())
+
+  @_timed
+  def Bcast(self, buf, root: int = 0):
+    self._start_bcast(buf, root)()
+
+  @_timed
+  def Ibcast(self, buf, root: int = 0) -> Request:
+    return Request(self._timed_wait(self._start_bcast(buf, root)))
+
+  def _timed_wait(self, wait: Callable[[], None]) -> Callable[[], None]:
+    def timed():
+      start = time.perf_counter()
+      wait()
+      self.endpoint.stats.comm_time += time.perf_counter() - start
+    return timed
+
+  # pickled objects, for the small lowercase collectives.
+  def _send_obj(self, obj, dest: int, tag: int):
+    self.endpoint.post(self.ranks[dest], _Message(self.context, self.endpoint.rank, tag, obj=obj))
+
+  def _recv_obj(self, source: int, tag: int):
+    return self.endpoint.match(self.context, self.ranks[source], tag).obj
+
+  @_timed
+  def bcast(self, obj=None, root: int = 0):
+    if self.Get_rank() == root:
+      for rank in range(self.Get_size()):
+        if rank != root:
+          self._send_obj(obj, rank, _OBJ_BCAST_TAG)
+      return obj
+    return self._recv_obj(root, _OBJ_BCAST_TAG)
+
+  @_timed
+  def gather(self, obj, root: int = 0):
+    if self.Get_rank() != root:
+      self._send_obj(obj, root, _OBJ_GATHER_TAG)
+      return None
+    return [obj if rank == root else self._recv_obj(rank, _OBJ_GATHER_TAG) for rank in range(self.Get_size())]
+
+  def allgather(self, obj) -> list:
+    return self.bcast(self.gather(obj, 0), 0)
+
+  def allreduce(self, obj, op: Op = SUM):
+    values = self.gather(obj, 0)
+    if values is not None:
+      result = values[0]
+      for value in values[1:]:
+        result = op(result, value)
+      values = result
+    return self.bcast(values, 0)
+
+  def Barrier(self):
+    self.allreduce(0)
+
+  barrier = Barrier
+
+  def Create_cart(self, dims: Sequence[int], periods: Sequence[bool] = None, reorder: bool = False) -> 'Cartcomm':
+    assert np.prod(dims) <= self.Get_size(), "the mesh is larger than the communicator"
+    self.n_created += 1
+    return Cartcomm(self.endpoint, self.ranks[:int(np.prod(dims))], (*self.context, 'cart', self.n_created), dims)
+
+  def Free(self):
+    pass
+
+
+class Cartcomm(Comm):
+  """ ranks are laid out in row major order over `dims`, as `MPI_Cart_create` does without reordering. """
+
+  def __init__(self, endpoint: _Endpoint, ranks: Sequence[int], context: tuple, dims: Sequence[int]):
+    super().__init__(endpoint, ranks, context)
+    self.dims = list(dims)
+
+  @property
+  def ndim(self) -> int:
+    return len(self.dims)
+
+  def Get_dim(self) -> int:
+    return len(self.dims)
+
+  def Get_coords(self, rank: int) -> List[int]:
+    return [int(c) for c in np.unravel_index(rank, self.dims)]
+
+  def Get_cart_rank(self, coords: Sequence[int]) -> int:
+    return int(np.ravel_multi_index(tuple(coords), self.dims))
+
+  def Sub(self, remain_dims: Sequence[bool]) -> 'Cartcomm':
+    coords = self.Get_coords(self.Get_rank())
+    dims = [d for d, keep in zip(self.dims, remain_dims) if keep]
+    members = []
+    for sub_rank in range(int(np.prod(dims))):
+      sub_coords = iter(np.unravel_index(sub_rank, dims))
+      members.append(self.ranks[self.Get_cart_rank(
+          [next(sub_coords) if keep else c for c, keep in zip(coords, remain_dims)])])
+    fixed = tuple(c for c, keep in zip(coords, remain_dims) if not keep)
+    return Cartcomm(self.endpoint, members, (*self.context, 'sub', tuple(map(bool, remain_dims)), fixed), dims)
+
+
+def mpi_module(endpoint: _Endpoint, size: int) -> types.ModuleType:
+  """ a stand-in for `mpi4py.MPI`, with the surface used by the programs of `codegen_setup`. """
+  MPI = types.ModuleType('mpi4py.MPI')
+  MPI.COMM_WORLD = Comm(endpoint, range(size), ('world',))
+  MPI.Comm, MPI.Cartcomm, MPI.Intracomm, MPI.Request, MPI.Op = Comm, Cartcomm, Comm, Request, Op
+  MPI.MAX, MPI.MIN, MPI.SUM, MPI.PROD = MAX, MIN, SUM, PROD
+  MPI.ANY_SOURCE, MPI.ANY_TAG = ANY_SOURCE, ANY_TAG
+  MPI.Wtime = time.perf_counter
+  MPI.stats = endpoint.stats
+  return MPI
+
+
+def install(endpoint: _Endpoint, size: int) -> types.ModuleType:
+  """ make `from mpi4py import MPI` return the local stand-in in this process. """
+  MPI = mpi_module(endpoint, size)
+  package = types.ModuleType('mpi4py')
+  package.MPI = MPI
+  sys.modules['mpi4py'] = package
+  sys.modules['mpi4py.MPI'] = MPI
+  return MPI
+
+
+@dataclass
+class RankResult:
+  rank: int
+  wall_time: float = 0.0
+  stats: RankStats = field(default_factory=RankStats)
+  value: Any = None
+  error: Optional[str] = None
+
+
+def _rank_main(rank: int, size: int, inboxes, results, target: str | Callable, args: Sequence[str]):
+  install(_Endpoint(rank, inboxes), size)
+  MPI = sys.modules['mpi4py.MPI']
+  result = RankResult(rank, stats=MPI.stats)
+  start = time.perf_counter()
+  try:
+    if callable(target):
+      result.value = target(*args)
+    else:
+      sys.argv = [target, *args]
+      runpy.run_path(target, run_name='__main__')
+  except SystemExit as e:
+    if e.code not in (None, 0):
+      result.error = f"exit code {e.code}"
+  except BaseException:
+    result.error = traceback.format_exc()
+  result.wall_time = time.perf_counter() - start
+  sys.stdout.flush()
+  results.put(result)
+
+
+def run(target: str | Callable, nprocs: int, args: Sequence[Any] = (), timeout: Optional[float] = None) -> List[RankResult]:
+  """ run the program at path `target` (or call `target(*args)`) on `nprocs` forked ranks, like
+    `mpirun -n nprocs python target *args`. returns the result of every rank, ordered by rank.
+  """
+  ctx = multiprocessing.get_context('fork')
+  # share one tracker, so segments still staged when a rank dies are unlinked at exit.
+  resource_tracker.ensure_running()
+  inboxes = [ctx.SimpleQueue() for _ in range(nprocs)]
+  results = ctx.Queue()
+  procs = [ctx.Process(target=_rank_main, args=(rank, nprocs, inboxes, results, target, args))
+           for rank in range(nprocs)]
+  for proc in procs:
+    proc.start()
+  collected: Dict[int, RankResult] = {}
+  deadline = None if timeout is None else time.monotonic() + timeout
+  try:
+    while len(collected) < nprocs:
+      if deadline is not None and time.monotonic() > deadline:
+        break
+      try:
+        result = results.get(timeout=0.1)
+      except queue.Empty:
+        if not any(proc.is_alive() for proc in procs) and results.empty():
+          break  # a rank died without reporting.
+        continue
+      collected[result.rank] = result
+      if result.error:
+        break  # the other ranks may wait forever on this one.
+  finally:
+    for proc in procs:
+      if proc.is_alive() and len(collected) < nprocs:
+        proc.terminate()
+      proc.join()
+  return [collected.get(rank, RankResult(rank, error="terminated")) for rank in range(nprocs)]
+
+
+def main(argv: List[str]) -> int:
+  """ python -m utils.local_mpi -n 4 program.py [args...] """
+  nprocs = 1
+  if argv[:1] == ['-n']:
+    nprocs, argv = int(argv[1]), argv[2:]
+  results = run(argv[0], nprocs, argv[1:])
+  for result in results:
+    print(f"rank {result.rank}: {result.wall_time:.3f}s, comm {result.stats.comm_time:.3f}s, "
+          f"sent {result.stats.bytes_sent}B/{result.stats.messages_sent}, "
+          f"received {result.stats.bytes_received}B/{result.stats.messages_received}"
+          + (f"\n{result.error}" if result.error else ''), file=sys.stderr)
+  return 1 if any(result.error for result in results) else 0
+
+
+if __name__ == "__main__":
+  # the ranks run their program as `__main__`, so the messages must refer to the classes of the imported module.
+  from utils.local_mpi import main
+  sys.exit(main(sys.argv[1:]))
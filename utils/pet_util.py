@@ -2,6 +2,7 @@ import pet
 import isl
 from typing import Callable, Union
 from utils.common import CSource
+from utils.isl_util import parallel_pragmas
 
 
 class CodeGenerator:
@@ -60,7 +61,9 @@ class CodeGenerator:
     tree.print(printer, options)
     printer.flush()
 
-    return CSource('/tmp/generated.c')
+    source = CSource('/tmp/generated.c')
+    source.context = parallel_pragmas(source.context)
+    return source
 
 
 def parse_code(source: str, func_name: str) -> pet.scop:
@@ -0,0 +1,318 @@
+import math
+from fractions import Fraction
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import isl
+
+
+@dataclass
+class Statement:
+  """ the schedule unknowns of one statement, `dims` iterator coefficients then a constant shift.
+    the coefficients are stored innermost first from `offset`, so the lexmin prefers the outer iterators.
+  """
+  name: str
+  dims: int
+  offset: int
+  hyperplanes: List[List[int]] = field(default_factory=list)
+
+  def coefficient(self, i: int) -> int:
+    """ index of the unknown of the i-th iterator. """
+    return self.offset + self.dims - 1 - i
+
+  @property
+  def shift(self) -> int:
+    return self.offset + self.dims
+
+  def rank(self) -> int:
+    return len(self.hyperplanes)
+
+  def full_rank(self) -> bool:
+    return self.rank() == self.dims
+
+
+# an affine form over the dimensions of a dependence polyhedron (params, in, out, divs then the constant), whose
+# coefficients are linear in the schedule unknowns: `form[k][j]` is the factor of unknown j in the k-th coefficient.
+Form = List[List[int]]
+
+
+def constraint_rows(bmap: isl.basic_map) -> List[Tuple[List[int], bool]]:
+  """ the constraints of `bmap` as rows over (params, in, out, divs, constant), with whether they are equalities. """
+  types = [isl.dim_type.PARAM, isl.dim_type.IN, isl.dim_type.OUT, isl.dim_type.DIV]
+  constraints = bmap.get_constraint_list()
+  rows = []
+  for k in range(constraints.size()):
+    c = constraints.at(k)
+    row = [c.get_coefficient_val(t, i).get_num_si() for t in types for i in range(bmap.dim(t))]
+    rows.append((row + [c.get_constant_val().get_num_si()], c.is_equality()))
+  return rows
+
+
+def farkas_constraints(bmap: isl.basic_map, form: Form, n_unknowns: int) -> isl.basic_set:
+  """ the unknowns for which `form` is non negative on every point of `bmap`.
+    by the affine form of the farkas lemma, form(z) = l0 + sum_k l_k * c_k(z) with l >= 0 for the inequalities c_k
+    and free multipliers for the equalities. identifying the coefficients of z gives equalities between the
+    unknowns and the multipliers, which are then projected out.
+  """
+  rows = constraint_rows(bmap)
+  n = n_unknowns + 1 + len(rows)
+  bset = isl.basic_set.universe(isl.space.unit().add_unnamed_tuple(n))
+  space = bset.local_space()
+
+  for k, coefficients in enumerate(form):
+    c = isl.constraint.alloc_equality(space)
+    for j, a in enumerate(coefficients):
+      if a:
+        c = c.set_coefficient_si(isl.dim_type.SET, j, a)
+    if k == len(form) - 1:
+      c = c.set_coefficient_si(isl.dim_type.SET, n_unknowns, -1)
+    for m, (row, _) in enumerate(rows):
+      if row[k]:
+        c = c.set_coefficient_si(isl.dim_type.SET, n_unknowns + 1 + m, -row[k])
+    bset = bset.add_constraint(c)
+
+  for m, (_, is_equality) in enumerate([([], False)] + rows):
+    if not is_equality:
+      c = isl.constraint.alloc_inequality(space).set_coefficient_si(isl.dim_type.SET, n_unknowns + m, 1)
+      bset = bset.add_constraint(c)
+  # the multipliers are rational, so keep the rational shadow of the projection.
+  return bset.project_out(isl.dim_type.SET, n_unknowns, n - n_unknowns).remove_divs()
+
+
+def dependence_form(bmap: isl.basic_map, src: Statement, dst: Statement, n_unknowns: int) -> Form:
+  """ phi_dst(t) - phi_src(s) for the dependence `bmap` from s to t. """
+  n_params, n_in, n_out = bmap.dim(isl.dim_type.PARAM), bmap.dim(isl.dim_type.IN), bmap.dim(isl.dim_type.OUT)
+  form = [[0] * n_unknowns for _ in range(n_params + n_in + n_out + bmap.dim(isl.dim_type.DIV) + 1)]
+  for i in range(n_in):
+    form[n_params + i][src.coefficient(i)] -= 1
+  for i in range(n_out):
+    form[n_params + n_in + i][dst.coefficient(i)] += 1
+  form[-1][dst.shift] += 1
+  form[-1][src.shift] -= 1
+  return form
+
+
+def bounding_form(bmap: isl.basic_map, src: Statement, dst: Statement, n_unknowns: int) -> Form:
+  """ u.p + w - (phi_dst(t) - phi_src(s)), the distance bound minimized by the lexmin. """
+  form = [[-a for a in coefficients] for coefficients in dependence_form(bmap, src, dst, n_unknowns)]
+  for i in range(bmap.dim(isl.dim_type.PARAM)):
+    form[i][i] += 1
+  form[-1][bmap.dim(isl.dim_type.PARAM)] += 1
+  return form
+
+
+def orthogonal_subspace(hyperplanes: List[List[int]], dims: int) -> List[List[int]]:
+  """ an integer basis of the vectors orthogonal to `hyperplanes`. """
+  rows = [[Fraction(a) for a in h] for h in hyperplanes]
+  pivots: List[int] = []
+  for col in range(dims):
+    pivot = next((r for r in range(len(pivots), len(rows)) if rows[r][col] != 0), None)
+    if pivot is None:
+      continue
+    r = len(pivots)
+    rows[r], rows[pivot] = rows[pivot], rows[r]
+    rows[r] = [a / rows[r][col] for a in rows[r]]
+    for other in range(len(rows)):
+      if other != r and rows[other][col] != 0:
+        rows[other] = [a - rows[other][col] * b for a, b in zip(rows[other], rows[r])]
+    pivots.append(col)
+
+  basis = []
+  for free in (col for col in range(dims) if col not in pivots):
+    vector = [Fraction(0)] * dims
+    vector[free] = Fraction(1)
+    for r, col in enumerate(pivots):
+      vector[col] = -rows[r][free]
+    scale = math.lcm(*(a.denominator for a in vector))
+    basis.append([int(a * scale) for a in vector])
+  return basis
+
+
+def independence_constraints(statements: List[Statement], n_unknowns: int) -> isl.set:
+  """ the non negative hyperplanes linearly independent of the found ones: for every statement that is not full rank,
+    the coefficients are not orthogonal to some row of its orthogonal subspace. the pluto heuristic only keeps the
+    side where the row is positive, isl takes the union of both sides so no independent hyperplane is missed.
+  """
+  universe = isl.basic_set.universe(isl.space.unit().add_unnamed_tuple(n_unknowns))
+  space = universe.local_space()
+  for j in range(n_unknowns):
+    universe = universe.add_constraint(isl.constraint.alloc_inequality(space).set_coefficient_si(isl.dim_type.SET, j, 1))
+  independent = isl.set(universe)
+  for stmt in statements:
+    if stmt.full_rank():
+      continue
+    sides = isl.set.empty(universe.get_space())
+    for vector in orthogonal_subspace(stmt.hyperplanes, stmt.dims):
+      for sign in (1, -1):
+        c = isl.constraint.alloc_inequality(space).set_constant_si(-1)
+        for i, a in enumerate(vector):
+          c = c.set_coefficient_si(isl.dim_type.SET, stmt.coefficient(i), sign * a)
+        sides = sides.union(isl.set(universe.add_constraint(c)))
+    independent = independent.intersect(sides)
+  return independent
+
+
+def dependence_constraints(dependences: isl.union_map, statements: Dict[str, Statement], n_unknowns: int) -> isl.basic_set:
+  """ the hyperplanes that respect every dependence, with the bound u.p + w on their distances. """
+  bset = isl.basic_set.universe(isl.space.unit().add_unnamed_tuple(n_unknowns))
+  maps = dependences.get_map_list()
+  for k in range(maps.size()):
+    m = maps.at(k)
+    src, dst = statements[m.get_tuple_name(isl.dim_type.IN)], statements[m.get_tuple_name(isl.dim_type.OUT)]
+    bmaps = m.get_basic_map_list()
+    for b in range(bmaps.size()):
+      bmap = bmaps.at(b)
+      bset = bset.intersect(farkas_constraints(bmap, dependence_form(bmap, src, dst, n_unknowns), n_unknowns))
+      bset = bset.intersect(farkas_constraints(bmap, bounding_form(bmap, src, dst, n_unknowns), n_unknowns))
+  return bset
+
+
+# the hyperplane of each statement, its iterator coefficients then its shift.
+Hyperplane = Dict[str, Tuple[List[int], int]]
+
+
+def solve_hyperplane(statements: List[Statement], constraints: isl.basic_set, n_unknowns: int) -> Optional[Hyperplane]:
+  """ the lexmin of (u, w, coefficients) over the respecting hyperplanes that are independent of the found ones. """
+  solutions = independence_constraints(statements, n_unknowns).intersect(isl.set(constraints)).lexmin()
+  if solutions.is_empty():
+    return None
+  point = solutions.sample_point()
+  values = [point.get_coordinate_val(isl.dim_type.SET, j).get_num_si() for j in range(n_unknowns)]
+  return {stmt.name: ([values[stmt.coefficient(i)] for i in range(stmt.dims)], values[stmt.shift]) for stmt in statements}
+
+
+def hyperplanes_map(statements: List[Statement], hyperplanes: List[Hyperplane]) -> isl.union_map:
+  """ statement instances -> their values on `hyperplanes`. """
+  pieces = []
+  for stmt in statements:
+    its = [f'i{i}' for i in range(stmt.dims)]
+    values = []
+    for h in hyperplanes:
+      coefficients, shift = h[stmt.name]
+      values.append(' + '.join([f'{a}*{it}' for a, it in zip(coefficients, its) if a] + [str(shift)]))
+    pieces.append(f"{stmt.name}[{', '.join(its)}] -> [{', '.join(values)}]")
+  return isl.union_map('{ ' + '; '.join(pieces) + ' }')
+
+
+def weakly_satisfied(dependences: isl.union_map, statements: List[Statement], hyperplanes: List[Hyperplane]) -> isl.union_map:
+  """ the dependences with a zero distance on every hyperplane, the ones the hyperplanes do not carry. """
+  values = hyperplanes_map(statements, hyperplanes)
+  return dependences.intersect(values.apply_range(values.reverse()))
+
+
+def strongly_connected_components(statements: List[Statement], dependences: isl.union_map) -> List[List[Statement]]:
+  """ the components of the dependence graph, in a topological order. """
+  successors: Dict[str, set] = {stmt.name: set() for stmt in statements}
+  maps = dependences.get_map_list()
+  for k in range(maps.size()):
+    m = maps.at(k)
+    successors[m.get_tuple_name(isl.dim_type.IN)].add(m.get_tuple_name(isl.dim_type.OUT))
+
+  # tarjan, which finds the components in a reverse topological order.
+  index: Dict[str, int] = {}
+  low: Dict[str, int] = {}
+  stack: List[str] = []
+  components: List[List[str]] = []
+
+  def visit(v: str):
+    index[v] = low[v] = len(index)
+    stack.append(v)
+    for w in sorted(successors[v]):
+      if w not in index:
+        visit(w)
+        low[v] = min(low[v], low[w])
+      elif w in stack:
+        low[v] = min(low[v], index[w])
+    if low[v] == index[v]:
+      component = []
+      while True:
+        w = stack.pop()
+        component.append(w)
+        if w == v:
+          break
+      components.append(component)
+
+  for stmt in statements:
+    if stmt.name not in index:
+      visit(stmt.name)
+  return [[stmt for stmt in statements if stmt.name in component] for component in reversed(components)]
+
+
+def statements_filter(statements: List[Statement]) -> isl.union_set:
+  return isl.union_set('{ ' + '; '.join(f"{stmt.name}[{', '.join(f'i{i}' for i in range(stmt.dims))}]"
+                                        for stmt in statements) + ' }')
+
+
+def schedule_statements(domain: isl.union_set, dependences: isl.union_map, statements: List[Statement]) -> isl.schedule:
+  """ find hyperplanes level by level. a band grows while respecting hyperplanes exist, then the dependences it
+    carries are dropped and a new band starts. when no hyperplane respects the dependences left, the statements
+    are distributed over the strongly connected components of the dependence graph, each scheduled on its own.
+  """
+  n_params = dependences.get_space().dim(isl.dim_type.PARAM)
+  offset = n_params + 1
+  for stmt in statements:
+    stmt.offset = offset
+    offset += stmt.dims + 1
+  n_unknowns = offset
+  by_name = {stmt.name: stmt for stmt in statements}
+
+  bands: List[Tuple[List[Hyperplane], List[bool]]] = []
+  band: List[Hyperplane] = []
+  coincident: List[bool] = []
+  constraints = None
+  schedule = None
+  while True:
+    if constraints is None:
+      constraints = dependence_constraints(dependences, by_name, n_unknowns)
+    hyperplane = None
+    if not all(stmt.full_rank() for stmt in statements):
+      hyperplane = solve_hyperplane(statements, constraints, n_unknowns)
+    if hyperplane is not None:
+      # as in isl, a member is coincident when the dependences left by the outer bands have a zero distance on it,
+      # so it stays parallel once the band is tiled.
+      coincident.append(dependences.is_subset(weakly_satisfied(dependences, statements, [hyperplane])))
+      band.append(hyperplane)
+      for stmt in statements:
+        if not stmt.full_rank():
+          stmt.hyperplanes.append(hyperplane[stmt.name][0])
+      continue
+    if band:
+      bands.append((band, coincident))
+      dependences = weakly_satisfied(dependences, statements, band)
+      band, coincident, constraints = [], [], None
+      continue
+    if dependences.is_empty():
+      break
+    components = strongly_connected_components(statements, dependences)
+    if len(components) == 1:
+      raise ValueError(f"no hyperplane respects the dependences {dependences}")
+    for component in components:
+      component_filter = statements_filter(component)
+      component_schedule = schedule_statements(domain.intersect(component_filter),
+                                               dependences.intersect_domain(component_filter).intersect_range(component_filter),
+                                               component)
+      schedule = component_schedule if schedule is None else schedule.sequence(component_schedule)
+    break
+
+  if schedule is None:
+    schedule = isl.schedule.from_domain(domain)
+  for band, coincident in reversed(bands):
+    schedule = schedule.insert_partial_schedule(isl.multi_union_pw_aff.from_union_map(hyperplanes_map(statements, band)))
+    node = schedule.get_root().child(0).set_permutable(1)
+    for i, c in enumerate(coincident):
+      node = node.member_set_coincident(i, int(c))
+    schedule = node.get_schedule()
+  return schedule
+
+
+def pluto_schedule(domain: isl.union_set, dependences: isl.union_map) -> isl.schedule:
+  """ a pluto style schedule of the statements of `domain`: hyperplanes with non negative coefficients that respect
+    `dependences` and minimize the bound u.p + w of the dependence distances, grouped in permutable (tilable) bands.
+  """
+  # the union operations align the parameters of the dependences with those of the domain.
+  dependences = dependences.intersect_domain(domain).intersect_range(domain)
+  statements: List[Statement] = []
+  sets = domain.get_set_list()
+  for k in range(sets.size()):
+    s = sets.at(k)
+    statements.append(Statement(s.get_tuple_name(), s.dim(isl.dim_type.SET), 0))
+  return schedule_statements(domain, dependences, statements)
@@ -0,0 +1,193 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+import numpy as np
+import isl
+from utils.cache_sim import (ExecutionOrder, AddressTrace, ArrayLayout, execution_order, array_layout,
+                             address_trace, _maps)
+
+
+@dataclass
+class LevelFootprint:
+  """ the data touched by one iteration of the loop at `level`, that is by the instances sharing the first `level`
+    schedule dimensions. `iterations` is the number of such iterations, the footprints are over all of them.
+  """
+  level: int
+  iterations: int
+  max_bytes: int
+  mean_bytes: float
+  max_lines: int
+  per_array: Dict[str, int] = field(default_factory=dict)  # max bytes
+
+
+@dataclass
+class ReuseProfile:
+  """ the lru stack distance of every access of a trace, in distinct cache lines touched since the previous access
+    to the same line, -1 for the first (cold) access of a line.
+  """
+  distances: np.ndarray
+  line: int
+
+  @property
+  def cold(self) -> int:
+    return int((self.distances < 0).sum())
+
+  def histogram(self) -> tuple[np.ndarray, np.ndarray]:
+    """ the number of warm accesses per power of two bucket of distances, [0, 1), [1, 2), [2, 4), ...
+      returned as (bucket lower bounds in lines, counts).
+    """
+    warm = self.distances[self.distances >= 0]
+    buckets = np.zeros(len(warm), dtype=np.int64)
+    buckets[warm > 0] = np.floor(np.log2(warm[warm > 0])).astype(np.int64) + 1
+    counts = np.bincount(buckets) if len(warm) else np.zeros(1, dtype=np.int64)
+    bounds = np.concatenate([[0], 2 ** np.arange(len(counts) - 1)])
+    return bounds, counts
+
+  def hit_ratio(self, capacity: int) -> float:
+    """ the hit ratio of a fully associative lru cache of `capacity` bytes. """
+    if len(self.distances) == 0:
+      return 0.0
+    lines = capacity // self.line
+    return float(((self.distances >= 0) & (self.distances < lines)).sum()) / len(self.distances)
+
+  def __str__(self) -> str:
+    bounds, counts = self.histogram()
+    rows = [f"{'distance(lines)':>16} {'accesses':>10}"]
+    rows += [f"{'>= ' + str(b):>16} {c:>10}" for b, c in zip(bounds, counts)]
+    rows.append(f"{'cold':>16} {self.cold:>10}")
+    return '\n'.join(rows)
+
+
+def _prefix_groups(order: ExecutionOrder, level: int) -> np.ndarray:
+  """ number the iterations of the loop at `level`, the instances are sorted so each one is a contiguous run. """
+  if len(order) == 0:
+    return np.zeros(0, dtype=np.int64)
+  changes = np.zeros(len(order), dtype=np.int64)
+  if level:
+    changes[1:] = (order.times[1:, :level] != order.times[:-1, :level]).any(axis=1)
+  return np.cumsum(changes)
+
+
+def trace_footprints(order: ExecutionOrder, trace: AddressTrace, layout: ArrayLayout,
+                     line: int = 64) -> List[LevelFootprint]:
+  """ the footprint of every loop level of an execution order, from its address trace. """
+  element_bytes = np.array([layout.element_bytes[name] for name in trace.arrays], dtype=np.int64)
+  span = int(trace.address.max()) + 1 if len(trace) else 1
+  footprints = []
+  for level in range(order.times.shape[1] + 1):
+    group = _prefix_groups(order, level)[trace.instance]
+    iterations = int(group[-1]) + 1 if len(group) else 0
+    # distinct (iteration, element) pairs, and distinct (iteration, line) pairs.
+    keys, first = np.unique(group * span + trace.address, return_index=True)
+    owner = keys // span
+    weights = element_bytes[trace.array[first]]
+    total = np.bincount(owner, weights=weights, minlength=iterations)
+    lines = np.bincount(np.unique(group * span + trace.address // line * line) // span, minlength=iterations)
+    per_array = {}
+    for i, name in enumerate(trace.arrays):
+      mine = trace.array[first] == i
+      per_array[name] = int(np.bincount(owner[mine], weights=weights[mine], minlength=iterations).max()) \
+          if iterations else 0
+    footprints.append(LevelFootprint(level, iterations, int(total.max()) if iterations else 0,
+                                     float(total.mean()) if iterations else 0.0,
+                                     int(lines.max()) if iterations else 0, per_array))
+  return footprints
+
+
+def loop_footprints(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule], reads: isl.union_map,
+                    writes: Optional[isl.union_map] = None, element_bytes: Union[int, Dict[str, int]] = 8,
+                    line: int = 64) -> List[LevelFootprint]:
+  """ the data footprint of one iteration of each loop level of `schedule` on a concrete `domain`, by enumeration.
+    level 0 is the whole program, level d fixes the first d schedule dimensions (sequence dimensions included).
+  """
+  accesses = reads if writes is None else reads.union(writes)
+  layout = array_layout(domain, accesses, element_bytes, line)
+  order = execution_order(domain, schedule)
+  return trace_footprints(order, address_trace(order, reads, writes, layout, domain), layout, line)
+
+
+def symbolic_footprints(schedule: isl.union_map, accesses: isl.union_map) -> Optional[list]:
+  """ the number of distinct elements of each array accessed by one iteration of each loop level, as a quasi
+    polynomial of the outer schedule dimensions (and the parameters). this needs isl built with barvinok for
+    the `card` of a union map, None is returned without it; use `loop_footprints` on a concrete domain instead.
+  """
+  if not hasattr(isl.union_map, 'card'):
+    return None
+  maps = _maps(schedule)
+  n_out = max((m.dim(isl.dim_type.OUT) for m in maps), default=0)
+  footprints = []
+  for level in range(n_out + 1):
+    prefix = None
+    for m in maps:
+      m = m.project_out(isl.dim_type.OUT, level, m.dim(isl.dim_type.OUT) - level)
+      prefix = isl.union_map(m) if prefix is None else prefix.union(isl.union_map(m))
+    footprints.append(prefix.reverse().apply_range(accesses).card())
+  return footprints
+
+
+def reuse_distances(trace: AddressTrace, line: int = 64) -> ReuseProfile:
+  """ the lru stack distance of each access of `trace` at the granularity of cache lines. """
+  lines = trace.address // line
+  distances = np.zeros(len(lines), dtype=np.int64)
+  if len(lines) == 0:
+    return ReuseProfile(distances, line)
+
+  # an access to the line of the previous access is at distance 0, only the others go through the stack.
+  repeated = np.zeros(len(lines), dtype=bool)
+  repeated[1:] = lines[1:] == lines[:-1]
+  positions = np.nonzero(~repeated)[0]
+  compact = lines[positions].tolist()
+
+  # a fenwick tree marks the last access to every line, the distance is the number of marks since the previous one.
+  n = len(compact)
+  tree = [0] * (n + 1)
+  last: Dict[int, int] = {}
+  result = [0] * n
+  for t, key in enumerate(compact):
+    p = last.get(key)
+    if p is None:
+      result[t] = -1
+    else:
+      count, i = 0, t
+      while i > 0:
+        count += tree[i]
+        i -= i & -i
+      i = p + 1
+      while i > 0:
+        count -= tree[i]
+        i -= i & -i
+      result[t] = count
+      i = p + 1
+      while i <= n:
+        tree[i] -= 1
+        i += i & -i
+    last[key] = t
+    i = t + 1
+    while i <= n:
+      tree[i] += 1
+      i += i & -i
+  distances[positions] = result
+  return ReuseProfile(distances, line)
+
+
+def reuse_profile(domain: isl.union_set, schedule: Union[isl.union_map, isl.schedule], reads: isl.union_map,
+                  writes: Optional[isl.union_map] = None, element_bytes: Union[int, Dict[str, int]] = 8,
+                  line: int = 64) -> ReuseProfile:
+  """ the reuse distances of executing `domain` in the order of `schedule`. """
+  accesses = reads if writes is None else reads.union(writes)
+  layout = array_layout(domain, accesses, element_bytes, line)
+  order = execution_order(domain, schedule)
+  return reuse_distances(address_trace(order, reads, writes, layout, domain), line)
+
+
+def pick_tile_size(domain: isl.union_set, schedules: Dict[int, Union[isl.union_map, isl.schedule]], level: int,
+                   capacity: int, reads: isl.union_map, writes: Optional[isl.union_map] = None,
+                   element_bytes: Union[int, Dict[str, int]] = 8, line: int = 64) -> Optional[int]:
+  """ the largest tile size whose tiled schedule touches at most `capacity` bytes (in cache lines) per iteration
+    of the loop at `level`, the first loop inside a tile. `schedules` maps each candidate size to its schedule.
+  """
+  best = None
+  for size in sorted(schedules):
+    footprint = loop_footprints(domain, schedules[size], reads, writes, element_bytes, line)[level]
+    if footprint.max_lines * line <= capacity:
+      best = size
+  return best
@@ -0,0 +1,170 @@
+import time
+import traceback
+import multiprocessing
+from ctypes import c_ulong
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import isl
+from utils.pluto import Statement, strongly_connected_components
+
+# the bindings do not wrap the operation budget of the isl context.
+isl.isl.isl_ctx_set_max_operations.argtypes = [isl.Context, c_ulong]
+isl.isl.isl_ctx_reset_operations.argtypes = [isl.Context]
+
+
+def set_max_operations(n: int):
+  """ make isl give up (with a quota error) after `n` more operations on the default context, 0 for no budget. """
+  ctx = isl.Context.getDefaultInstance()
+  isl.isl.isl_ctx_reset_operations(ctx)
+  isl.isl.isl_ctx_set_max_operations(ctx, n)
+
+
+@dataclass(frozen=True)
+class SchedulerOptions:
+  """ the isl scheduler options a schedule depends on.
+    `fusion` is 'max' to schedule the strongly connected components of the dependence graph together when possible,
+    'min' to give each one its own band (serialize sccs). `max_coefficient` of -1 leaves the coefficients unbounded.
+  """
+  fusion: str = 'max'
+  outer_coincidence: bool = False
+  max_coefficient: int = -1
+
+  def apply(self):
+    assert self.fusion in ('max', 'min'), f"unknown fusion strategy {self.fusion}"
+    isl.options_set_schedule_serialize_sccs(int(self.fusion == 'min'))
+    isl.options_set_schedule_outer_coincidence(int(self.outer_coincidence))
+    isl.options_set_schedule_max_coefficient(self.max_coefficient)
+
+
+@dataclass
+class ScheduleResult:
+  schedule: isl.schedule
+  # 'computed', 'cached', 'timeout' (wall clock), 'budget' (isl operations) or 'error'.
+  status: str
+  seconds: float = 0.0
+  error: Optional[str] = None
+
+
+def _worker(conn, constraints: str, options: SchedulerOptions, max_operations: int):
+  try:
+    options.apply()
+    constraints = isl.schedule_constraints(constraints)
+    set_max_operations(max_operations)
+    schedule = constraints.compute_schedule()
+    conn.send(('computed', str(schedule)))
+  except isl.Error as e:
+    conn.send(('budget' if max_operations and 'operations' in str(e) else 'error', traceback.format_exc()))
+  except BaseException:
+    conn.send(('error', traceback.format_exc()))
+  finally:
+    conn.close()
+
+
+def respects(schedule: isl.schedule, validity: isl.union_map) -> bool:
+  """ whether every dependence of `validity` goes forward in time under `schedule`. """
+  schedule_map = schedule.get_map()
+  return validity.intersect(schedule_map.lex_ge_union_map(schedule_map)).is_empty()
+
+
+def identity_schedule(domain: isl.union_set, validity: Optional[isl.union_map] = None) -> isl.schedule:
+  """ every statement in its original loop order, the strongly connected components of the `validity` dependences
+    one after the other in a topological order. the statements of a component share their common outer loops
+    (then run in name order at each iteration), raises ValueError if that still violates `validity`.
+  """
+  sets: Dict[str, isl.set] = {}
+  set_list = domain.get_set_list()
+  for k in range(set_list.size()):
+    sets[set_list.at(k).get_tuple_name()] = set_list.at(k)
+  statements = [Statement(name, sets[name].dim(isl.dim_type.SET), 0) for name in sorted(sets)]
+  components = strongly_connected_components(statements, validity) if validity is not None else \
+      [[stmt] for stmt in statements]
+
+  schedule = None
+  for component in components:
+    component = sorted(component, key=lambda stmt: stmt.name)
+    component_domain = isl.union_set.empty()
+    for stmt in component:
+      component_domain = component_domain.union(isl.union_set(sets[stmt.name]))
+    part = isl.schedule.from_domain(component_domain)
+    if len(component) == 1 and component[0].dims:
+      s = sets[component[0].name]
+      part = part.insert_partial_schedule(isl.multi_union_pw_aff.from_union_map(isl.union_map(s.identity())))
+    elif len(component) > 1:
+      # { S[i] -> [i(shared), position of S, i(rest), 0...] }, padded to the deepest statement.
+      shared = min(stmt.dims for stmt in component)
+      depth = max(stmt.dims for stmt in component) + 1
+      partial = isl.union_map.empty()
+      for position, stmt in enumerate(component):
+        iterators = [f"i{k}" for k in range(stmt.dims)]
+        times = iterators[:shared] + [str(position)] + iterators[shared:]
+        times += ['0'] * (depth - len(times))
+        m = isl.map(f"{{ [{', '.join(iterators)}] -> [{', '.join(times)}] }}")
+        partial = partial.union(isl.union_map(m.set_tuple_id(isl.dim_type.IN, sets[stmt.name].get_tuple_id())
+                                              .intersect_domain(sets[stmt.name])))
+      part = part.insert_partial_schedule(isl.multi_union_pw_aff.from_union_map(partial))
+    schedule = part if schedule is None else schedule.sequence(part)
+  schedule = schedule if schedule is not None else isl.schedule.from_domain(domain)
+  if validity is not None and not respects(schedule, validity):
+    raise ValueError(f"the identity schedule violates the dependences {validity}, pass the original schedule")
+  return schedule
+
+
+class ScheduleService:
+  """ runs `compute_schedule` in a forked worker process, so a scheduling problem that is too hard cannot block the
+    session: the worker is killed after `timeout` seconds, or stopped by isl after `max_operations` (0 for no budget).
+    the schedules are cached per (constraints, options), a schedule that could not be computed is not.
+  """
+
+  def __init__(self, options: SchedulerOptions = SchedulerOptions(), timeout: float = 10.0, max_operations: int = 0):
+    self.options = options
+    self.timeout = timeout
+    self.max_operations = max_operations
+    self.cache: Dict[Tuple[str, SchedulerOptions], str] = {}
+
+  def compute(self, constraints: isl.schedule_constraints, options: Optional[SchedulerOptions] = None,
+              fallback: Optional[isl.schedule] = None) -> ScheduleResult:
+    """ the schedule of `constraints`, or `fallback` when it is not found. `fallback` should be the original
+      schedule of the program, `identity_schedule` otherwise. raises ValueError if it violates the validity
+      constraints.
+    """
+    options = options or self.options
+    key = (str(constraints), options)
+    if key in self.cache:
+      return ScheduleResult(isl.schedule(self.cache[key]), 'cached')
+
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context('fork')
+    receiver, sender = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_worker, args=(sender, key[0], options, self.max_operations))
+    proc.start()
+    sender.close()
+    status, payload = 'timeout', f"no schedule after {self.timeout}s"
+    try:
+      if receiver.poll(self.timeout):
+        status, payload = receiver.recv()
+    except EOFError:
+      status, payload = 'error', f"the worker died with exit code {proc.exitcode}"
+    finally:
+      if proc.is_alive():
+        proc.kill()
+      proc.join()
+      receiver.close()
+    seconds = time.perf_counter() - start
+
+    if status == 'computed':
+      self.cache[key] = payload
+      return ScheduleResult(isl.schedule(payload), status, seconds)
+    if fallback is None:
+      fallback = identity_schedule(constraints.get_domain(), constraints.get_validity())
+    elif not respects(fallback, constraints.get_validity()):
+      raise ValueError(f"the fallback schedule violates the dependences {constraints.get_validity()}")
+    return ScheduleResult(fallback, status, seconds, payload)
+
+
+DEFAULT_SERVICE = ScheduleService()
+
+
+def compute_schedule(constraints: isl.schedule_constraints, options: Optional[SchedulerOptions] = None,
+                     fallback: Optional[isl.schedule] = None) -> isl.schedule:
+  """ drop in replacement of `constraints.compute_schedule()` running on the default service. """
+  return DEFAULT_SERVICE.compute(constraints, options, fallback).schedule